@@ -1,12 +1,18 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Optional, Dict, Any
+from contextlib import contextmanager, asynccontextmanager
+from typing import Optional, Dict, Any, Tuple
+import asyncio
 import logging
+import threading
 import time
 import requests
 
 logger = logging.getLogger(__name__)
 
+# リトライ対象のHTTPステータスコード
+RETRYABLE_STATUS_CODES = [408, 429, 500, 502, 503, 504]
+
 @dataclass
 class AIConfig:
     """AI APIの設定"""
@@ -19,24 +25,132 @@ class AIConfig:
     timeout: int = 60  # タイムアウト値（秒）
     max_retries: int = 3  # 最大リトライ回数
     retry_delay: int = 10  # リトライ間の待機時間（秒）
+    max_concurrency: int = 1  # 同時リクエスト数の上限
+    input_cost_per_1m: Optional[float] = None  # 入力100万トークンあたりの料金（USD）
+    output_cost_per_1m: Optional[float] = None  # 出力100万トークンあたりの料金（USD）
+    daily_budget: Optional[float] = None  # このサービスの1日あたりの予算（USD）
     extra_params: Optional[Dict[str, Any]] = None
 
     def __post_init__(self):
         if self.extra_params is None:
             self.extra_params = {}
 
+class ConcurrencyLimiter:
+    """同時リクエスト数の上限（同期・非同期の両方で使い、モデル違いのインスタンス間でも共有できる）"""
+    
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.semaphore = threading.BoundedSemaphore(self.limit)
+        self._async_semaphore = None  # (イベントループ, asyncio.Semaphore)
+        self._lock = threading.Lock()
+    
+    def async_semaphore(self) -> asyncio.Semaphore:
+        """実行中のイベントループ用のセマフォを取得（ループが変わった場合は作り直す）"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._async_semaphore or self._async_semaphore[0] is not loop:
+                self._async_semaphore = (loop, asyncio.Semaphore(self.limit))
+            return self._async_semaphore[1]
+
 class AIServiceBase(ABC):
     """AI APIの基底クラス"""
     
     def __init__(self, config: AIConfig):
         self.config = config
         self.name = config.name
+        self._limiter = ConcurrencyLimiter(config.max_concurrency)
+        self._local = threading.local()  # 直近のトークン使用量（スレッドごと）
     
     @abstractmethod
-    def generate_summary(self, title: str, content: str, prompt_template: str) -> str:
-        """記事の要約を生成"""
+    def _build_request(self, title: str, content: str, prompt_template: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """要約リクエストのURL・ヘッダー・ボディを構築"""
+        pass
+    
+    @abstractmethod
+    def _parse_response(self, result: dict) -> str:
+        """APIレスポンスから要約を取り出す"""
         pass
     
+    def _describe_http_error(self, status_code: int, error_response: dict, error_text: str) -> str:
+        """リトライ対象外のHTTPエラーをメッセージに変換"""
+        return f"{self.name}: HTTPエラー {status_code}"
+    
+    def _describe_connection_error(self, error: Exception) -> Optional[str]:
+        """接続エラーをメッセージに変換（Noneの場合は元の例外をそのまま送出）"""
+        return None
+    
+    def _check_token_error(self, error_response: dict, status_code: int):
+        """トークン関連のエラーであれば例外を送出"""
+        token_error = self._detect_token_related_errors(error_response, status_code)
+        if token_error:
+            logger.error(f"{self.name}: {token_error}")
+            raise Exception(f"{self.name}: {token_error}")
+    
+    def generate_summary(self, title: str, content: str, prompt_template: str) -> str:
+        """記事の要約を生成（同期版）"""
+        url, headers, data = self._build_request(title, content, prompt_template)
+        
+        try:
+            response = self._make_request_with_retry("POST", url, headers=headers, json=data)
+            return self._parse_response(response.json())
+        
+        except requests.exceptions.HTTPError as e:
+            error_response = {}
+            try:
+                error_response = e.response.json() if e.response is not None else {}
+            except:
+                pass
+            
+            self._check_token_error(error_response, e.response.status_code)
+            raise Exception(self._describe_http_error(e.response.status_code, error_response, e.response.text))
+        except requests.exceptions.ConnectionError as e:
+            message = self._describe_connection_error(e)
+            if message:
+                raise Exception(message)
+            raise
+        except Exception as e:
+            logger.error(f"{self.name}でエラーが発生: {str(e)}")
+            raise
+    
+    async def agenerate_summary(self, title: str, content: str, prompt_template: str, session=None) -> str:
+        """記事の要約を生成（非同期版、sessionはaiohttp.ClientSession）"""
+        import aiohttp  # 非同期APIを使う場合のみ必要
+        
+        url, headers, data = self._build_request(title, content, prompt_template)
+        
+        if session is None:
+            async with aiohttp.ClientSession() as own_session:
+                return await self.agenerate_summary(title, content, prompt_template, own_session)
+        
+        try:
+            status, result, text = await self._amake_request_with_retry(session, "POST", url, headers=headers, json=data)
+            if status >= 400:
+                error_response = result if isinstance(result, dict) else {}
+                self._check_token_error(error_response, status)
+                raise Exception(self._describe_http_error(status, error_response, text))
+            return self._parse_response(result)
+        
+        except aiohttp.ClientConnectionError as e:
+            message = self._describe_connection_error(e)
+            if message:
+                raise Exception(message)
+            raise
+        except Exception as e:
+            logger.error(f"{self.name}でエラーが発生: {str(e)}")
+            raise
+    
+    @contextmanager
+    def concurrency_slot(self):
+        """同時リクエスト数の上限内で処理するためのスロットを確保"""
+        with self._limiter.semaphore:
+            yield
+    
+    @asynccontextmanager
+    async def async_concurrency_slot(self):
+        """同時リクエスト数の上限内で処理するためのスロットを確保（非同期版）"""
+        async with self._limiter.async_semaphore():
+            yield
+    
     def _make_request_with_retry(self, method: str, url: str, **kwargs) -> requests.Response:
         """リトライ機能付きHTTPリクエスト"""
         # タイムアウト設定
@@ -56,7 +170,7 @@ class AIServiceBase(ABC):
                 
             except requests.exceptions.HTTPError as e:
                 # HTTPエラーの場合、リトライするかどうか判断
-                if e.response.status_code in [408, 429, 500, 502, 503, 504]:
+                if e.response.status_code in RETRYABLE_STATUS_CODES:
                     last_exception = e
                     logger.warning(f"{self.name}: リトライ可能なHTTPエラー (試行 {attempt + 1}/{self.config.max_retries}) - {e.response.status_code}")
                 else:
@@ -80,6 +194,84 @@ class AIServiceBase(ABC):
         # 全ての試行が失敗した場合
         raise last_exception
     
+    async def _amake_request_with_retry(self, session, method: str, url: str, **kwargs) -> Tuple[int, Any, str]:
+        """リトライ機能付きHTTPリクエスト（非同期版）。(ステータス, JSON, 本文) を返す"""
+        import aiohttp
+        
+        timeout = aiohttp.ClientTimeout(total=self.config.timeout)
+        last_exception = None
+        
+        for attempt in range(self.config.max_retries):
+            try:
+                async with session.request(method, url, timeout=timeout, **kwargs) as response:
+                    text = await response.text()
+                    try:
+                        result = await response.json(content_type=None)
+                    except ValueError:
+                        result = None
+                    
+                    if response.status not in RETRYABLE_STATUS_CODES:
+                        # 成功、または認証エラーなどリトライしないエラー
+                        return response.status, result, text
+                    
+                    last_exception = Exception(f"{self.name}: HTTPエラー {response.status}")
+                    logger.warning(f"{self.name}: リトライ可能なHTTPエラー (試行 {attempt + 1}/{self.config.max_retries}) - {response.status}")
+            
+            except asyncio.TimeoutError as e:
+                last_exception = e
+                logger.warning(f"{self.name}: タイムアウト発生 (試行 {attempt + 1}/{self.config.max_retries})")
+            
+            except aiohttp.ClientConnectionError as e:
+                last_exception = e
+                logger.warning(f"{self.name}: 接続エラー (試行 {attempt + 1}/{self.config.max_retries}) - {str(e)}")
+            
+            # 最後の試行でなければ待機
+            if attempt < self.config.max_retries - 1:
+                wait_time = self.config.retry_delay * (2 ** attempt)  # 指数バックオフ
+                logger.info(f"{self.name}: {wait_time}秒後にリトライします...")
+                await asyncio.sleep(wait_time)
+        
+        # 全ての試行が失敗した場合
+        raise last_exception
+    
+    def _build_chat_messages(self, title: str, content: str, prompt_template: str) -> list:
+        """システムプロンプトとユーザープロンプトからメッセージ配列を構築"""
+        messages = []
+        
+        # システムプロンプトを設定から取得
+        system_prompt = self.config.extra_params.get("system_prompt")
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+            logger.debug(f"{self.name}: システムプロンプトを使用")
+        
+        # ユーザープロンプト
+        user_prompt = prompt_template.format(title=title, content=content)
+        messages.append({"role": "user", "content": user_prompt})
+        return messages
+    
+    def _parse_chat_completion(self, result: dict) -> str:
+        """OpenAI互換のChat Completionsレスポンスから要約を取り出す"""
+        if not ("choices" in result and result["choices"]):
+            raise ValueError(f"予期しないレスポンス形式: {result}")
+        
+        # トークン使用量を分析
+        usage_info = self._analyze_response_usage(result)
+        
+        # トークン使用量をログ出力
+        if usage_info["total_tokens"]:
+            logger.info(f"{self.name}: トークン使用量 - 入力: {usage_info['input_tokens']}, "
+                      f"出力: {usage_info['output_tokens']}, 合計: {usage_info['total_tokens']}")
+            
+            if usage_info["token_warning"]:
+                logger.warning(f"{self.name}: トークン使用量が制限の95%に達しました - {usage_info['total_tokens']}/{self.config.max_tokens}")
+            
+            if usage_info["token_limit_reached"]:
+                logger.error(f"{self.name}: トークン制限に達しました - {usage_info['total_tokens']}/{self.config.max_tokens}")
+        
+        summary = result["choices"][0]["message"]["content"].strip()
+        logger.debug(f"{self.name}: 要約生成成功 (文字数: {len(summary)})")
+        return summary
+    
     def _analyze_response_usage(self, response_data: dict) -> dict:
         """レスポンスからトークン使用量を分析"""
         usage_info = {
@@ -96,7 +288,13 @@ class AIServiceBase(ABC):
             usage_info["input_tokens"] = usage.get("prompt_tokens")
             usage_info["output_tokens"] = usage.get("completion_tokens")
             usage_info["total_tokens"] = usage.get("total_tokens")
-            
+        # Ollama形式のカウントフィールドをチェック
+        elif "prompt_eval_count" in response_data or "eval_count" in response_data:
+            usage_info["input_tokens"] = response_data.get("prompt_eval_count")
+            usage_info["output_tokens"] = response_data.get("eval_count")
+            usage_info["total_tokens"] = (usage_info["input_tokens"] or 0) + (usage_info["output_tokens"] or 0)
+        
+        if usage_info["total_tokens"]:
             # トークン制限チェック
             if self.config.max_tokens and usage_info["total_tokens"]:
                 if usage_info["total_tokens"] >= self.config.max_tokens * 0.95:  # 95%以上で警告
@@ -104,8 +302,28 @@ class AIServiceBase(ABC):
                 if usage_info["total_tokens"] >= self.config.max_tokens:
                     usage_info["token_limit_reached"] = True
         
+        # 使用量台帳に記録できるよう直近の使用量を保持
+        self._local.last_usage = usage_info
         return usage_info
     
+    def pop_last_usage(self) -> Optional[dict]:
+        """このスレッドで直近に解析したトークン使用量を取り出す"""
+        usage = getattr(self._local, "last_usage", None)
+        self._local.last_usage = None
+        return usage
+    
+    @property
+    def cost_per_1m(self) -> float:
+        """入出力を合算した100万トークンあたりの料金（未設定は0として扱う）"""
+        return (self.config.input_cost_per_1m or 0.0) + (self.config.output_cost_per_1m or 0.0)
+    
+    def estimate_cost(self, input_tokens: int, output_tokens: int) -> float:
+        """トークン数から推定コスト（USD）を計算"""
+        return (
+            input_tokens * (self.config.input_cost_per_1m or 0.0)
+            + output_tokens * (self.config.output_cost_per_1m or 0.0)
+        ) / 1_000_000
+    
     def _detect_token_related_errors(self, error_response: dict, status_code: int) -> Optional[str]:
         """エラーレスポンスからトークン関連のエラーを検出"""
         error_text = str(error_response).lower()
@@ -135,3 +353,7 @@ class AIServiceBase(ABC):
     def is_available(self) -> bool:
         """APIが利用可能かチェック"""
         return True
+    
+    def warm_up(self) -> bool:
+        """モデルを事前にロード（対応するサービスのみ実装）"""
+        return True
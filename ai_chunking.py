@@ -0,0 +1,172 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+from lease_manager import FileLock
+
+logger = logging.getLogger(__name__)
+
+# 段落区切りとして扱うパターン（空行・HTMLのブロック要素の終端）
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n|</p>|<br\s*/?>\s*<br\s*/?>|</h[1-6]>|</li>", re.IGNORECASE)
+
+
+def split_into_chunks(content: str, chunk_size: int, overlap: int = 0) -> List[str]:
+    """本文を段落単位でおおよそchunk_size文字以下のチャンクに分割"""
+    if len(content) <= chunk_size:
+        return [content]
+
+    # 段落に分割（区切り文字は前の段落に残す）
+    paragraphs = []
+    last = 0
+    for match in _PARAGRAPH_BREAK.finditer(content):
+        paragraphs.append(content[last:match.end()])
+        last = match.end()
+    paragraphs.append(content[last:])
+
+    chunks = []
+    current = ""
+    for paragraph in paragraphs:
+        # 1段落がチャンクサイズを超える場合は強制的に分割
+        while len(paragraph) > chunk_size:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(paragraph[:chunk_size])
+            paragraph = paragraph[chunk_size:]
+
+        if len(current) + len(paragraph) > chunk_size and current:
+            chunks.append(current)
+            # 文脈が途切れないように前チャンクの末尾を重ねる
+            current = current[-overlap:] if overlap > 0 else ""
+        current += paragraph
+
+    if current.strip():
+        chunks.append(current)
+
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+class ChunkSummaryCache:
+    """
+    チャンク要約の中間結果をJSON Lines形式のファイルにキャッシュするクラス
+
+    要約は1件ごとに1行追記するため、ワーカーモードで複数のプロセスが同じファイルに書いても互いの結果を上書きしない。
+    保持期間を過ぎたエントリは起動時と一定間隔ごとに除き、一時ファイル経由でファイルを書き直す
+    """
+
+    # 常時稼働中に保持期間切れのエントリを除いてファイルを詰める間隔（秒）
+    COMPACT_INTERVAL_SECONDS = 3600
+
+    def __init__(self, cache_file: str = "data/chunk_cache.jsonl", retention_days: int = 3):
+        self.cache_file = Path(cache_file)
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(self.cache_file.with_name(self.cache_file.name + ".lock"))
+        self._last_compacted = time.monotonic()
+        with self._file_lock:
+            self._entries: Dict[str, dict] = self._load()
+            self._compact()
+
+    @staticmethod
+    def make_key(prompt_template: str, title: str, chunk: str) -> str:
+        """プロンプトとチャンク内容からキャッシュキーを生成"""
+        source = f"{prompt_template}\0{title}\0{chunk}"
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """キャッシュ済みの要約を取得（保持期間を過ぎたものは返さない）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry or self._is_expired(entry, self._cutoff()):
+                return None
+            return entry["summary"]
+
+    def set(self, key: str, summary: str):
+        """要約をキャッシュに追加してファイルに1行追記（一定間隔ごとに保持期間切れのエントリを除いて詰める）"""
+        entry = {"key": key, "summary": summary, "created_at": datetime.now(timezone.utc).isoformat()}
+        with self._lock:
+            self._entries[key] = entry
+            compact = time.monotonic() - self._last_compacted >= self.COMPACT_INTERVAL_SECONDS
+            if compact:
+                self._last_compacted = time.monotonic()
+
+        try:
+            with self._file_lock:
+                self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.cache_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                if compact:
+                    # 他のワーカーが追記したエントリも含めて読み直してから詰める
+                    entries = self._load()
+                    with self._lock:
+                        self._entries = entries
+                    self._compact()
+        except Exception as e:
+            logger.warning(f"チャンクキャッシュ保存エラー: {e}")
+
+    def _cutoff(self) -> datetime:
+        return datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+
+    @staticmethod
+    def _is_expired(entry: dict, cutoff: datetime) -> bool:
+        try:
+            return datetime.fromisoformat(entry["created_at"]) < cutoff
+        except (KeyError, ValueError, TypeError):
+            return True
+
+    def _legacy_file(self) -> Path:
+        """以前のJSON形式（キー -> エントリの辞書）のキャッシュファイル"""
+        return self.cache_file.with_suffix(".json")
+
+    def _load(self) -> Dict[str, dict]:
+        """キャッシュを読み込み、保持期間を過ぎたエントリを除外（以前のJSON形式のファイルも取り込む）"""
+        cutoff = self._cutoff()
+        entries = {}
+
+        legacy_file = self._legacy_file()
+        if legacy_file != self.cache_file and legacy_file.exists():
+            try:
+                with open(legacy_file, 'r', encoding='utf-8') as f:
+                    for key, entry in json.load(f).items():
+                        entries[key] = {"key": key, **entry}
+            except Exception as e:
+                logger.warning(f"チャンクキャッシュ読み込みエラー: {e}")
+
+        if self.cache_file.exists():
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            entry = json.loads(line)
+                            entries[entry["key"]] = entry
+                        except (ValueError, KeyError, TypeError):
+                            continue
+            except Exception as e:
+                logger.warning(f"チャンクキャッシュ読み込みエラー: {e}")
+
+        return {key: entry for key, entry in entries.items() if not self._is_expired(entry, cutoff)}
+
+    def _compact(self):
+        """保持しているエントリだけでファイルを書き直す（ファイルロックを取得した状態で呼ぶ）"""
+        with self._lock:
+            lines = [json.dumps(entry, ensure_ascii=False) + "\n" for entry in self._entries.values()]
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = self.cache_file.with_name(f"{self.cache_file.name}.{os.getpid()}.tmp")
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            os.replace(temp_file, self.cache_file)
+
+            legacy_file = self._legacy_file()
+            if legacy_file != self.cache_file and legacy_file.exists():
+                legacy_file.unlink()
+        except Exception as e:
+            logger.warning(f"チャンクキャッシュ保存エラー: {e}")
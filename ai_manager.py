@@ -1,5 +1,15 @@
-from typing import List, Optional
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
 from ai_base import AIServiceBase, AIConfig
+from ai_chunking import split_into_chunks, ChunkSummaryCache
+from ai_router import AIRouter, RoutingRule
+from usage_ledger import UsageLedger, UsageRecord
+from metrics import AI_REQUEST_SECONDS, AI_TOKENS, AI_FALLBACKS, AI_FAILURES
+from tracing import span, current_span, propagate
 from ai_openrouter import OpenRouterService
 from ai_openai import OpenAIService
 from ai_ollama import OllamaService
@@ -7,20 +17,62 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+class BudgetExceededError(Exception):
+    """予算超過により利用できるAIサービスがない場合の例外"""
+    pass
+
 class AIServiceManager:
     """複数のAI APIを管理し、フォールバック機能を提供"""
     
-    def __init__(self, services: List[AIServiceBase]):
+    # 長文モードで部分要約をさらに分割要約する最大段数（超えたら部分要約をそのまま統合）
+    LONG_DOC_MAX_REDUCE_DEPTH = 2
+    
+    def __init__(self, services: List[AIServiceBase],
+                 long_doc_threshold: Optional[int] = None,
+                 long_doc_chunk_size: int = 6000,
+                 long_doc_chunk_overlap: int = 200,
+                 long_doc_max_workers: int = 4,
+                 long_doc_chunk_prompt: Optional[str] = None,
+                 chunk_cache: Optional[ChunkSummaryCache] = None,
+                 router: Optional[AIRouter] = None,
+                 usage_ledger: Optional[UsageLedger] = None,
+                 daily_budget: Optional[float] = None,
+                 budget_soft_limit_ratio: float = 0.8):
         """
         Args:
             services: 優先順位順のAIサービスリスト（最初が最優先）
+            long_doc_threshold: この文字数を超える本文は分割要約する（Noneで無効）
+            long_doc_chunk_size: 分割時の1チャンクあたりの最大文字数
+            long_doc_chunk_overlap: チャンク間で重ねる文字数
+            long_doc_max_workers: チャンク要約の最大並列数
+            long_doc_chunk_prompt: チャンク要約用のプロンプトテンプレート
+            chunk_cache: チャンク要約の中間結果キャッシュ
+            router: 記事の特徴量からサービスとモデルを選択するルーター
+            usage_ledger: AI呼び出しの使用量・コストを記録する台帳
+            daily_budget: 全サービス合計の1日の予算（USD、Noneで無制限）
+            budget_soft_limit_ratio: 予算のこの割合を超えたら安いサービスを優先
         """
         self.services = services
         if not services:
             raise ValueError("少なくとも1つのAIサービスが必要です")
+        
+        self.long_doc_threshold = long_doc_threshold
+        self.long_doc_chunk_size = long_doc_chunk_size
+        self.long_doc_chunk_overlap = long_doc_chunk_overlap
+        self.long_doc_max_workers = max(1, long_doc_max_workers)
+        self.long_doc_chunk_prompt = long_doc_chunk_prompt or (
+            "以下は記事「{title}」の一部です。重要な事実・数値・主張を簡潔に箇条書きで抽出してください：\n\n{content}"
+        )
+        self.chunk_cache = chunk_cache
+        self.router = router
+        # ルーティングでモデルを差し替えたサービスのキャッシュ
+        self._model_variants: Dict[Tuple[str, str], AIServiceBase] = {}
+        self.usage_ledger = usage_ledger
+        self.daily_budget = daily_budget
+        self.budget_soft_limit_ratio = budget_soft_limit_ratio
     
     @classmethod
-    def from_configs(cls, configs: List[AIConfig]) -> 'AIServiceManager':
+    def from_configs(cls, configs: List[AIConfig], **options) -> 'AIServiceManager':
         """設定リストからAIサービスマネージャーを作成"""
         services = []
         
@@ -37,45 +89,407 @@ class AIServiceManager:
                 
             services.append(service)
         
-        return cls(services)
+        return cls(services, **options)
     
-    def generate_summary(self, title: str, content: str, prompt_template: str) -> str:
+    def generate_summary(self, title: str, content: str, prompt_template: str,
+                         source_feed: Optional[str] = None) -> str:
         """
         要約を生成。プライマリAPIでエラーが発生した場合、
         セカンダリAPIにフォールバック
         """
+        with span("ai.summarize", feed=source_feed, chars=len(content)) as trace:
+            services = self._apply_budget(self._route_services(title, content, source_feed))
+            if not services:
+                raise BudgetExceededError("本日のAI予算を使い切ったため要約を延期します")
+        
+            if self.long_doc_threshold and len(content) > self.long_doc_threshold:
+                trace.set_attribute("mode", "long")
+                return self._generate_long_summary(title, content, prompt_template, services, source_feed)
+        
+            return self._generate_with_fallback(title, content, prompt_template, services, source_feed)
+    
+    def _apply_budget(self, services: List[AIServiceBase]) -> List[AIServiceBase]:
+        """本日の使用額に応じてサービスを並べ替え・除外"""
+        if not self.usage_ledger:
+            return services
+        
+        # サービス単位の予算を使い切ったサービスを除外
+        allowed = []
+        for service in services:
+            budget = service.config.daily_budget
+            if budget is not None and self.usage_ledger.cost_today(service.name) >= budget:
+                logger.warning(f"{service.name}: 本日の予算 ${budget:.2f} を使い切ったためスキップします")
+                continue
+            allowed.append(service)
+        
+        if self.daily_budget is None:
+            return allowed
+        
+        spent = self.usage_ledger.cost_today()
+        if spent >= self.daily_budget:
+            # 予算超過時は料金のかからないサービスのみ使用
+            free = [service for service in allowed if service.cost_per_1m == 0]
+            logger.warning(f"本日のAI予算 ${self.daily_budget:.2f} を超過 (使用額 ${spent:.4f}) - "
+                           f"無料サービスのみ使用: {[service.name for service in free]}")
+            return free
+        
+        if spent >= self.daily_budget * self.budget_soft_limit_ratio:
+            # 予算が残り少ない場合は安いサービスから試行（同額なら元の優先順位を維持）
+            logger.info(f"本日のAI予算の{self.budget_soft_limit_ratio:.0%}を超過 (使用額 ${spent:.4f}) - 安いサービスを優先します")
+            return sorted(allowed, key=lambda service: service.cost_per_1m)
+        
+        return allowed
+    
+    def _within_budget(self, service: AIServiceBase) -> bool:
+        """サービスを現時点の使用額で呼び出してよいか判定"""
+        return service in self._apply_budget([service])
+    
+    def is_budget_exhausted(self) -> bool:
+        """予算超過により利用できるサービスが残っていないか判定"""
+        return not self._apply_budget(self.services)
+    
+    def _route_services(self, title: str, content: str, source_feed: Optional[str]) -> List[AIServiceBase]:
+        """ルーティングルールに従って試行するサービスの順序を決定"""
+        if not self.router or not self.router.rules:
+            return self.services
+        
+        rule, features = self.router.route(title, content, source_feed)
+        if not rule:
+            logger.info(f"ルーティング: 一致ルールなし → 既定の優先順位 "
+                        f"(推定{features.estimated_tokens}トークン, フィード: {features.feed}, 言語: {features.language})")
+            return self.services
+        
+        routed = self._get_routed_service(rule)
+        if not routed:
+            logger.warning(f"ルーティング: ルール {rule.name} のサービス {rule.provider} が利用できないため既定の優先順位を使用")
+            return self.services
+        
+        logger.info(f"ルーティング: ルール {rule.name} → {routed.name}/{routed.config.model} "
+                    f"(推定{features.estimated_tokens}トークン, フィード: {features.feed}, 言語: {features.language})")
+        # 選択したサービスを先頭にし、残りはフォールバックとして既定の順序で続ける
+        return [routed] + [service for service in self.services if service is not routed]
+    
+    def _get_routed_service(self, rule: RoutingRule) -> Optional[AIServiceBase]:
+        """ルールが指すサービスを取得（モデル指定がある場合は差し替えたインスタンスを返す）"""
+        base = next((s for s in self.services if s.name.lower() == rule.provider.lower()), None)
+        if not base or not rule.model or rule.model == base.config.model:
+            return base
+        
+        key = (base.name, rule.model)
+        if key not in self._model_variants:
+            variant = type(base)(replace(base.config, model=rule.model))
+            # 同一プロバイダーの同時実行数上限は同期・非同期とも共有する
+            variant._limiter = base._limiter
+            self._model_variants[key] = variant
+        return self._model_variants[key]
+    
+    def _generate_long_summary(self, title: str, content: str, prompt_template: str,
+                               services: List[AIServiceBase], source_feed: Optional[str] = None,
+                               depth: int = 0) -> str:
+        """長文記事をチャンクごとに要約し、部分要約を統合して最終要約を生成（depthは再分割の段数）"""
+        chunks = split_into_chunks(content, self.long_doc_chunk_size, self.long_doc_chunk_overlap)
+        logger.info(f"長文モード: {title} を{len(chunks)}チャンクに分割 (本文{len(content)}文字)")
+        
+        # Map: 各チャンクを並列に要約（同時実行数は各サービスの上限で制御）
+        with ThreadPoolExecutor(max_workers=min(self.long_doc_max_workers, len(chunks))) as executor:
+            # スレッドプール内のチャンク要約も現在のスパンの子として記録
+            partials = list(executor.map(
+                propagate(lambda indexed: self._summarize_chunk(title, indexed[1], indexed[0], len(chunks), services, source_feed)),
+                enumerate(chunks, 1)
+            ))
+        
+        # Reduce: 部分要約を結合し、まだ長い場合は再度分割要約
+        combined = "\n\n".join(f"[パート{i}] {partial}" for i, partial in enumerate(partials, 1))
+        if self._needs_another_reduce(combined, partials, depth):
+            logger.info(f"長文モード: 部分要約が{len(combined)}文字のため再度分割要約します")
+            return self._generate_long_summary(title, combined, prompt_template, services, source_feed, depth + 1)
+        
+        logger.info(f"長文モード: {len(partials)}件の部分要約を統合中...")
+        return self._generate_with_fallback(title, combined, prompt_template, services, source_feed)
+    
+    def _needs_another_reduce(self, combined: str, partials: List[str], depth: int) -> bool:
+        """
+        部分要約をさらに分割要約するか判定
+        
+        部分要約が縮まらない場合（チャンクが小さい・モデルの出力が長い）に再分割を繰り返して
+        AIの費用がかさまないよう、LONG_DOC_MAX_REDUCE_DEPTH 段で打ち切って最終要約に進む
+        """
+        if len(combined) <= self.long_doc_threshold or len(partials) <= 1:
+            return False
+        if depth >= self.LONG_DOC_MAX_REDUCE_DEPTH:
+            logger.warning(f"長文モード: 再分割が{depth}段に達したため、部分要約{len(combined)}文字のまま統合します")
+            return False
+        return True
+    
+    def _summarize_chunk(self, title: str, chunk: str, index: int, total: int,
+                         services: List[AIServiceBase], source_feed: Optional[str] = None) -> str:
+        """1チャンク分の要約を生成（キャッシュ済みなら再利用）"""
+        cache_key = None
+        if self.chunk_cache:
+            cache_key = ChunkSummaryCache.make_key(self.long_doc_chunk_prompt, title, chunk)
+            cached = self.chunk_cache.get(cache_key)
+            if cached:
+                logger.info(f"長文モード: チャンク {index}/{total} はキャッシュを使用")
+                return cached
+        
+        logger.info(f"長文モード: チャンク {index}/{total} を要約中...")
+        with span("ai.chunk", index=index, total=total, chars=len(chunk)):
+            summary = self._generate_with_fallback(title, chunk, self.long_doc_chunk_prompt, services, source_feed)
+        
+        if self.chunk_cache:
+            self.chunk_cache.set(cache_key, summary)
+        return summary
+    
+    def _generate_with_fallback(self, title: str, content: str, prompt_template: str,
+                                services: Optional[List[AIServiceBase]] = None,
+                                source_feed: Optional[str] = None) -> str:
+        """優先順位順にサービスを試行して要約を生成"""
+        services = services or self.services
         errors = []
+        budget_skips = 0
         
-        for i, service in enumerate(self.services):
+        for i, service in enumerate(services):
             try:
-                # サービスが利用可能かチェック
-                if not service.is_available():
-                    logger.warning(f"{service.name}は利用できません。スキップします。")
-                    errors.append(f"{service.name}: 利用不可")
+                with span("ai.attempt", provider=service.name, model=service.config.model, attempt=i + 1) as attempt:
+                    # サービスが利用可能かチェック
+                    if not service.is_available():
+                        logger.warning(f"{service.name}は利用できません。スキップします。")
+                        errors.append(f"{service.name}: 利用不可")
+                        AI_FALLBACKS.inc(service.name, "unavailable")
+                        attempt.record_error("利用不可")
+                        continue
+                
+                    logger.info(f"{service.name}で要約生成を試行中...")
+                    with service.concurrency_slot():
+                        # 枠を待つ間に他の呼び出しが予算を使い切った場合は呼び出さない
+                        if not self._within_budget(service):
+                            errors.append(f"{service.name}: 予算超過")
+                            budget_skips += 1
+                            AI_FALLBACKS.inc(service.name, "budget")
+                            attempt.record_error("予算超過")
+                            continue
+                        service.pop_last_usage()  # 前回の使用量が残っていれば破棄
+                        started = time.monotonic()
+                        try:
+                            summary = service.generate_summary(title, content, prompt_template)
+                        except Exception:
+                            self._record_usage(service, source_feed, started, "error")
+                            raise
+                        self._record_usage(service, source_feed, started, "ok")
+                    logger.info(f"{service.name}で要約生成に成功")
+                    logger.debug(f"要約結果: {summary[:100]}...")
+                    return summary
+                
+            except Exception as e:
+                error_msg = str(e)
+                errors.append(f"{service.name}: {error_msg}")
+                logger.error(f"{service.name}でエラー: {error_msg}")
+                
+                # 最後のサービスでなければ次を試行
+                if i < len(services) - 1:
+                    AI_FALLBACKS.inc(service.name, "error")
+                    logger.info("次のサービスに切り替えます...")
                     continue
+        
+        if budget_skips and budget_skips == len(services):
+            raise BudgetExceededError("本日のAI予算を使い切ったため要約を延期します")
+        
+        # すべてのサービスで失敗
+        AI_FAILURES.inc()
+        error_summary = "\n".join(errors)
+        raise Exception(f"すべてのAIサービスで要約生成に失敗しました:\n{error_summary}")
+    
+    async def agenerate_summary(self, title: str, content: str, prompt_template: str,
+                                source_feed: Optional[str] = None, session=None) -> str:
+        """
+        要約を生成（非同期版）。フォールバック・リトライ・ルーティング・予算制御は同期版と同じ
+        sessionにはaiohttp.ClientSessionを渡すと接続を共有できる
+        """
+        if session is None:
+            import aiohttp  # 非同期APIを使う場合のみ必要
+            async with aiohttp.ClientSession() as own_session:
+                return await self.agenerate_summary(title, content, prompt_template, source_feed, own_session)
+        
+        with span("ai.summarize", feed=source_feed, chars=len(content)) as trace:
+            services = self._apply_budget(self._route_services(title, content, source_feed))
+            if not services:
+                raise BudgetExceededError("本日のAI予算を使い切ったため要約を延期します")
+        
+            if self.long_doc_threshold and len(content) > self.long_doc_threshold:
+                trace.set_attribute("mode", "long")
+                return await self._agenerate_long_summary(title, content, prompt_template, services, source_feed, session)
+        
+            return await self._agenerate_with_fallback(title, content, prompt_template, services, source_feed, session)
+    
+    async def agenerate_summaries(self, articles: List[Tuple[str, str, Optional[str]]], prompt_template: str,
+                                  max_in_flight: int = 32) -> List[Any]:
+        """
+        複数記事の要約を1つのイベントループで並行生成
+        
+        Args:
+            articles: (タイトル, 本文, フィード名) のリスト
+            max_in_flight: 同時に処理する記事数の上限（各サービスの同時実行数上限とは別）
+        
+        Returns:
+            記事ごとの要約。失敗した記事は例外オブジェクト
+        """
+        import aiohttp
+        
+        limiter = asyncio.Semaphore(max(1, max_in_flight))
+        
+        async with aiohttp.ClientSession() as session:
+            async def run(title: str, content: str, source_feed: Optional[str]) -> str:
+                async with limiter:
+                    return await self.agenerate_summary(title, content, prompt_template, source_feed, session)
+            
+            return await asyncio.gather(
+                *(run(title, content, source_feed) for title, content, source_feed in articles),
+                return_exceptions=True
+            )
+    
+    def generate_summaries(self, articles: List[Tuple[str, str, Optional[str]]], prompt_template: str,
+                           max_in_flight: int = 32) -> List[Any]:
+        """複数記事の要約を並行生成（agenerate_summariesの同期ラッパー）"""
+        return asyncio.run(self.agenerate_summaries(articles, prompt_template, max_in_flight))
+    
+    async def _agenerate_long_summary(self, title: str, content: str, prompt_template: str,
+                                      services: List[AIServiceBase], source_feed: Optional[str], session,
+                                      depth: int = 0) -> str:
+        """長文記事をチャンクごとに要約し、部分要約を統合（非同期版）"""
+        chunks = split_into_chunks(content, self.long_doc_chunk_size, self.long_doc_chunk_overlap)
+        logger.info(f"長文モード: {title} を{len(chunks)}チャンクに分割 (本文{len(content)}文字)")
+        
+        # Map: 各チャンクを並行に要約（同時実行数は各サービスの上限で制御）
+        partials = await asyncio.gather(*(
+            self._asummarize_chunk(title, chunk, index, len(chunks), services, source_feed, session)
+            for index, chunk in enumerate(chunks, 1)
+        ))
+        
+        # Reduce: 部分要約を結合し、まだ長い場合は再度分割要約
+        combined = "\n\n".join(f"[パート{i}] {partial}" for i, partial in enumerate(partials, 1))
+        if self._needs_another_reduce(combined, partials, depth):
+            logger.info(f"長文モード: 部分要約が{len(combined)}文字のため再度分割要約します")
+            return await self._agenerate_long_summary(title, combined, prompt_template, services, source_feed, session,
+                                                      depth + 1)
+        
+        logger.info(f"長文モード: {len(partials)}件の部分要約を統合中...")
+        return await self._agenerate_with_fallback(title, combined, prompt_template, services, source_feed, session)
+    
+    async def _asummarize_chunk(self, title: str, chunk: str, index: int, total: int,
+                                services: List[AIServiceBase], source_feed: Optional[str], session) -> str:
+        """1チャンク分の要約を生成（非同期版、キャッシュ済みなら再利用）"""
+        cache_key = None
+        if self.chunk_cache:
+            cache_key = ChunkSummaryCache.make_key(self.long_doc_chunk_prompt, title, chunk)
+            cached = self.chunk_cache.get(cache_key)
+            if cached:
+                logger.info(f"長文モード: チャンク {index}/{total} はキャッシュを使用")
+                return cached
+        
+        logger.info(f"長文モード: チャンク {index}/{total} を要約中...")
+        with span("ai.chunk", index=index, total=total, chars=len(chunk)):
+            summary = await self._agenerate_with_fallback(title, chunk, self.long_doc_chunk_prompt, services, source_feed, session)
+        
+        if self.chunk_cache:
+            # ファイルへの書き込みでイベントループを止めないようスレッドで実行
+            await asyncio.to_thread(self.chunk_cache.set, cache_key, summary)
+        return summary
+    
+    async def _agenerate_with_fallback(self, title: str, content: str, prompt_template: str,
+                                       services: List[AIServiceBase], source_feed: Optional[str], session) -> str:
+        """優先順位順にサービスを試行して要約を生成（非同期版）"""
+        errors = []
+        budget_skips = 0
+        
+        for i, service in enumerate(services):
+            try:
+                with span("ai.attempt", provider=service.name, model=service.config.model, attempt=i + 1) as attempt:
+                    # 利用可能チェックは同期HTTPのためスレッドで実行
+                    if not await asyncio.to_thread(service.is_available):
+                        logger.warning(f"{service.name}は利用できません。スキップします。")
+                        errors.append(f"{service.name}: 利用不可")
+                        AI_FALLBACKS.inc(service.name, "unavailable")
+                        attempt.record_error("利用不可")
+                        continue
                 
-                logger.info(f"{service.name}で要約生成を試行中...")
-                summary = service.generate_summary(title, content, prompt_template)
-                logger.info(f"{service.name}で要約生成に成功")
-                logger.debug(f"要約結果: {summary[:100]}...")
-                print(f"✅ {service.name}で要約生成完了: {title[:50]}...")
-                return summary
+                    logger.info(f"{service.name}で要約生成を試行中...")
+                    async with service.async_concurrency_slot():
+                        # 枠を待つ間に他の呼び出しが予算を使い切った場合は呼び出さない
+                        if not self._within_budget(service):
+                            errors.append(f"{service.name}: 予算超過")
+                            budget_skips += 1
+                            AI_FALLBACKS.inc(service.name, "budget")
+                            attempt.record_error("予算超過")
+                            continue
+                        service.pop_last_usage()  # 前回の使用量が残っていれば破棄
+                        started = time.monotonic()
+                        try:
+                            summary = await service.agenerate_summary(title, content, prompt_template, session)
+                        except Exception:
+                            self._record_usage(service, source_feed, started, "error")
+                            raise
+                        self._record_usage(service, source_feed, started, "ok")
+                    logger.info(f"{service.name}で要約生成に成功")
+                    logger.debug(f"要約結果: {summary[:100]}...")
+                    return summary
                 
             except Exception as e:
                 error_msg = str(e)
                 errors.append(f"{service.name}: {error_msg}")
                 logger.error(f"{service.name}でエラー: {error_msg}")
-                print(f"❌ {service.name}でエラー: {error_msg}")
                 
                 # 最後のサービスでなければ次を試行
-                if i < len(self.services) - 1:
-                    print(f"⏭️  次のサービスに切り替えます...")
+                if i < len(services) - 1:
+                    AI_FALLBACKS.inc(service.name, "error")
+                    logger.info("次のサービスに切り替えます...")
                     continue
         
+        if budget_skips and budget_skips == len(services):
+            raise BudgetExceededError("本日のAI予算を使い切ったため要約を延期します")
+        
         # すべてのサービスで失敗
+        AI_FAILURES.inc()
         error_summary = "\n".join(errors)
         raise Exception(f"すべてのAIサービスで要約生成に失敗しました:\n{error_summary}")
     
+    def _record_usage(self, service: AIServiceBase, source_feed: Optional[str], started: float, outcome: str):
+        """AI呼び出し1回分の使用量を台帳に記録"""
+        usage = service.pop_last_usage() or {}
+        input_tokens = usage.get("input_tokens") or 0
+        output_tokens = usage.get("output_tokens") or 0
+        AI_REQUEST_SECONDS.observe(service.name, outcome, value=time.monotonic() - started)
+        AI_TOKENS.inc(service.name, "input", amount=input_tokens)
+        AI_TOKENS.inc(service.name, "output", amount=output_tokens)
+        trace = current_span()
+        trace.set_attribute("outcome", outcome)
+        trace.set_attribute("input_tokens", input_tokens)
+        trace.set_attribute("output_tokens", output_tokens)
+        if not self.usage_ledger:
+            return
+        
+        self.usage_ledger.record(UsageRecord(
+            timestamp=datetime.now(timezone.utc),
+            provider=service.name,
+            model=service.config.model,
+            feed=source_feed,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            latency_ms=int((time.monotonic() - started) * 1000),
+            outcome=outcome,
+            cost=service.estimate_cost(input_tokens, output_tokens)
+        ))
+    
+    def warm_up(self):
+        """各サービスとルーティングルールが指定するモデルを事前にロード（初回リクエストのロード待ちを回避）"""
+        services = list(self.services)
+        if self.router:
+            for rule in self.router.rules:
+                routed = self._get_routed_service(rule) if rule.model else None
+                if routed and routed not in services:
+                    services.append(routed)
+        for service in services:
+            service.warm_up()
+    
     def get_status(self) -> dict:
         """各サービスの状態を取得"""
         status = {}
@@ -1,37 +1,38 @@
 import requests
-from typing import Optional
+import time
+from typing import Any, Dict, Tuple
 from ai_base import AIServiceBase, AIConfig
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Ollama固有のトップレベルパラメータ（optionsには含めない）
+_TOP_LEVEL_PARAMS = ("system_prompt", "keep_alive")
+
 class OllamaService(AIServiceBase):
     """Ollama API実装"""
     
+    # 利用可能チェック結果のキャッシュ時間（秒）
+    AVAILABILITY_CACHE_SECONDS = 30
+    
     def __init__(self, config: AIConfig):
         super().__init__(config)
         self.base_url = config.base_url or "http://localhost:11434/api/chat"
+        self.api_root = self.base_url.replace('/api/chat', '')
+        self.model = config.model or "llama2"
+        self.keep_alive = config.extra_params.get("keep_alive")
+        self._available_cache = None  # (判定結果, 判定時刻)
         
-    def generate_summary(self, title: str, content: str, prompt_template: str) -> str:
-        """Ollama APIで要約生成"""
+    def _build_request(self, title: str, content: str, prompt_template: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """Ollama APIの要約リクエストを構築"""
         # メッセージ配列を構築
-        messages = []
-        
-        # システムプロンプトを設定から取得
-        system_prompt = self.config.extra_params.get("system_prompt")
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-            logger.debug(f"{self.name}: システムプロンプトを使用")
+        messages = self._build_chat_messages(title, content, prompt_template)
         
-        # ユーザープロンプト
-        user_prompt = prompt_template.format(title=title, content=content)
-        messages.append({"role": "user", "content": user_prompt})
-        
-        # extra_paramsからsystem_promptを除外してoptionsに追加
-        extra_params = {k: v for k, v in self.config.extra_params.items() if k != "system_prompt"}
+        # extra_paramsからトップレベルのパラメータを除外してoptionsに追加
+        extra_params = {k: v for k, v in self.config.extra_params.items() if k not in _TOP_LEVEL_PARAMS}
         
         data = {
-            "model": self.config.model or "llama2",
+            "model": self.model,
             "messages": messages,
             "stream": False,
             "options": {
@@ -39,35 +40,76 @@ class OllamaService(AIServiceBase):
             }
         }
         
+        # keep_aliveが設定されている場合はモデルの常駐時間を指定
+        if self.keep_alive:
+            data["keep_alive"] = self.keep_alive
+        
         # temperatureがNoneでない場合のみoptionsに追加
         if self.config.temperature is not None:
             data["options"]["temperature"] = self.config.temperature
         
+        return self.base_url, {}, data
+    
+    def _parse_response(self, result: dict) -> str:
+        """Ollama APIのレスポンスから要約を取り出す"""
+        if "message" in result and "content" in result["message"]:
+            # トークン使用量を分析（使用量台帳への記録用）
+            self._analyze_response_usage(result)
+            summary = result["message"]["content"].strip()
+            logger.debug(f"{self.name}: 要約生成成功 (文字数: {len(summary)})")
+            return summary
+        raise ValueError(f"予期しないレスポンス形式: {result}")
+    
+    def _describe_connection_error(self, error: Exception) -> str:
+        """Ollamaサーバーへの接続エラーをメッセージに変換"""
+        return f"{self.name}: Ollamaサーバーに接続できません"
+    
+    def is_available(self) -> bool:
+        """Ollamaサーバーが起動しており、使用モデルがインストール済みかチェック"""
+        # 毎回問い合わせないよう直近の判定結果を再利用
+        if self._available_cache:
+            available, checked_at = self._available_cache
+            if time.monotonic() - checked_at < self.AVAILABILITY_CACHE_SECONDS:
+                return available
+        
+        available = self._probe_model()
+        self._available_cache = (available, time.monotonic())
+        return available
+    
+    def _probe_model(self) -> bool:
+        """/api/tags でインストール済みモデル一覧を取得し、使用モデルの有無を確認"""
         try:
-            response = self._make_request_with_retry(
-                "POST",
-                self.base_url,
-                json=data
-            )
+            response = requests.get(f"{self.api_root}/api/tags", timeout=5)
+            if response.status_code != 200:
+                return False
+            
+            installed = {model.get("name", "") for model in response.json().get("models", [])}
+            # タグ省略時は :latest として扱う
+            wanted = self.model if ":" in self.model else f"{self.model}:latest"
+            if self.model in installed or wanted in installed:
+                return True
             
-            result = response.json()
-            if "message" in result and "content" in result["message"]:
-                summary = result["message"]["content"].strip()
-                logger.debug(f"{self.name}: 要約生成成功 (文字数: {len(summary)})")
-                return summary
-            else:
-                raise ValueError(f"予期しないレスポンス形式: {result}")
-                
-        except requests.exceptions.ConnectionError:
-            raise Exception(f"{self.name}: Ollamaサーバーに接続できません")
+            logger.warning(f"{self.name}: モデル {self.model} がインストールされていません")
+            return False
         except Exception as e:
-            logger.error(f"{self.name}でエラーが発生: {str(e)}")
-            raise
+            logger.debug(f"{self.name}: 利用可能チェック失敗 - {e}")
+            return False
     
-    def is_available(self) -> bool:
-        """Ollamaサーバーが利用可能かチェック"""
+    def warm_up(self) -> bool:
+        """空のチャットリクエストでモデルをメモリにロード"""
+        data = {"model": self.model, "messages": []}
+        if self.keep_alive:
+            data["keep_alive"] = self.keep_alive
+        
+        started = time.monotonic()
         try:
-            response = requests.get(f"{self.base_url.replace('/api/chat', '')}/api/tags", timeout=5)
-            return response.status_code == 200
-        except:
+            response = requests.post(self.base_url, json=data, timeout=self.config.timeout)
+            response.raise_for_status()
+        except Exception as e:
+            logger.warning(f"{self.name}: モデル {self.model} のウォームアップに失敗 - {e}")
+            self._available_cache = (False, time.monotonic())
             return False
+        
+        self._available_cache = (True, time.monotonic())
+        logger.info(f"{self.name}: モデル {self.model} をロードしました ({time.monotonic() - started:.1f}秒)")
+        return True
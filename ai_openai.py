@@ -1,5 +1,4 @@
-import requests
-from typing import Optional
+from typing import Any, Dict, Tuple
 from ai_base import AIServiceBase, AIConfig
 import logging
 
@@ -12,8 +11,8 @@ class OpenAIService(AIServiceBase):
         super().__init__(config)
         self.base_url = config.base_url or "https://api.openai.com/v1/chat/completions"
         
-    def generate_summary(self, title: str, content: str, prompt_template: str) -> str:
-        """OpenAI APIで要約生成"""
+    def _build_request(self, title: str, content: str, prompt_template: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """OpenAI APIの要約リクエストを構築"""
         if not self.config.api_key:
             raise ValueError(f"{self.name}: APIキーが設定されていません")
         
@@ -23,17 +22,7 @@ class OpenAIService(AIServiceBase):
         }
         
         # メッセージ配列を構築
-        messages = []
-        
-        # システムプロンプトを設定から取得
-        system_prompt = self.config.extra_params.get("system_prompt")
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-            logger.debug(f"{self.name}: システムプロンプトを使用")
-        
-        # ユーザープロンプト
-        user_prompt = prompt_template.format(title=title, content=content)
-        messages.append({"role": "user", "content": user_prompt})
+        messages = self._build_chat_messages(title, content, prompt_template)
         
         # extra_paramsからsystem_promptを除外してdataに追加
         extra_params = {k: v for k, v in self.config.extra_params.items() if k != "system_prompt"}
@@ -51,56 +40,14 @@ class OpenAIService(AIServiceBase):
         if self.config.temperature is not None:
             data["temperature"] = self.config.temperature
         
-        try:
-            response = self._make_request_with_retry(
-                "POST", 
-                self.base_url, 
-                headers=headers, 
-                json=data
-            )
-            
-            result = response.json()
-            if "choices" in result and result["choices"]:
-                # トークン使用量を分析
-                usage_info = self._analyze_response_usage(result)
-                
-                # トークン使用量をログ出力
-                if usage_info["total_tokens"]:
-                    logger.info(f"{self.name}: トークン使用量 - 入力: {usage_info['input_tokens']}, "
-                              f"出力: {usage_info['output_tokens']}, 合計: {usage_info['total_tokens']}")
-                    
-                    if usage_info["token_warning"]:
-                        logger.warning(f"{self.name}: トークン使用量が制限の95%に達しました")
-                        print(f"⚠️  {self.name}: トークン使用量警告 - {usage_info['total_tokens']}/{self.config.max_tokens}")
-                    
-                    if usage_info["token_limit_reached"]:
-                        logger.error(f"{self.name}: トークン制限に達しました")
-                        print(f"🚫 {self.name}: トークン制限達成 - {usage_info['total_tokens']}/{self.config.max_tokens}")
-                
-                summary = result["choices"][0]["message"]["content"].strip()
-                logger.debug(f"{self.name}: 要約生成成功 (文字数: {len(summary)})")
-                return summary
-            else:
-                raise ValueError(f"予期しないレスポンス形式: {result}")
-                
-        except requests.exceptions.HTTPError as e:
-            error_response = {}
-            try:
-                error_response = e.response.json() if e.response else {}
-            except:
-                pass
-            
-            # トークン関連エラーをチェック
-            token_error = self._detect_token_related_errors(error_response, e.response.status_code)
-            if token_error:
-                logger.error(f"{self.name}: {token_error}")
-                print(f"🚫 {self.name}: {token_error}")
-                raise Exception(f"{self.name}: {token_error}")
-            
-            if e.response.status_code == 401 or e.response.status_code == 403:
-                raise Exception(f"{self.name}: 認証エラー")
-            else:
-                raise Exception(f"{self.name}: HTTPエラー {e.response.status_code}")
-        except Exception as e:
-            logger.error(f"{self.name}でエラーが発生: {str(e)}")
-            raise
+        return self.base_url, headers, data
+    
+    def _parse_response(self, result: dict) -> str:
+        """OpenAI APIのレスポンスから要約を取り出す"""
+        return self._parse_chat_completion(result)
+    
+    def _describe_http_error(self, status_code: int, error_response: dict, error_text: str) -> str:
+        """OpenAI APIのHTTPエラーをメッセージに変換"""
+        if status_code == 401 or status_code == 403:
+            return f"{self.name}: 認証エラー"
+        return f"{self.name}: HTTPエラー {status_code}"
@@ -0,0 +1,99 @@
+import re
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_HTML_TAG = re.compile(r"<[^>]+>")
+_JAPANESE_CHAR = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff]")
+_LATIN_CHAR = re.compile(r"[A-Za-z]")
+
+
+def estimate_tokens(text: str) -> int:
+    """本文のトークン数を概算（HTMLタグ除去後、ASCIIは4文字≒1トークン、それ以外は1文字≒1トークン）"""
+    plain = _HTML_TAG.sub("", text)
+    ascii_chars = sum(1 for ch in plain if ord(ch) < 128)
+    return ascii_chars // 4 + (len(plain) - ascii_chars)
+
+
+def detect_language(text: str) -> str:
+    """文字種の比率から言語を簡易判定（ja / en / other）"""
+    plain = _HTML_TAG.sub("", text)[:2000]
+    japanese = len(_JAPANESE_CHAR.findall(plain))
+    latin = len(_LATIN_CHAR.findall(plain))
+    if japanese and japanese >= latin * 0.2:
+        return "ja"
+    if latin:
+        return "en"
+    return "other"
+
+
+@dataclass
+class ArticleFeatures:
+    """ルーティング判定に使う記事の特徴量"""
+    estimated_tokens: int
+    feed: Optional[str]
+    language: str
+
+
+@dataclass
+class RoutingRule:
+    """記事の特徴量からAIサービスとモデルを選択するルール"""
+    provider: str
+    model: Optional[str] = None
+    name: Optional[str] = None
+    min_tokens: Optional[int] = None
+    max_tokens: Optional[int] = None
+    feeds: Optional[List[str]] = None
+    languages: Optional[List[str]] = None
+
+    def matches(self, features: ArticleFeatures) -> bool:
+        """特徴量がルールの条件をすべて満たすか判定"""
+        if self.min_tokens is not None and features.estimated_tokens < self.min_tokens:
+            return False
+        if self.max_tokens is not None and features.estimated_tokens > self.max_tokens:
+            return False
+        if self.feeds and features.feed not in self.feeds:
+            return False
+        if self.languages and features.language not in self.languages:
+            return False
+        return True
+
+
+class AIRouter:
+    """ルーティングルールを上から順に評価し、最初に一致したルールを返す"""
+
+    def __init__(self, rules: List[RoutingRule]):
+        self.rules = rules
+
+    @classmethod
+    def from_dicts(cls, rule_dicts: List[dict]) -> 'AIRouter':
+        """設定ファイルの辞書リストからルーターを作成"""
+        rules = []
+        for i, rule_dict in enumerate(rule_dicts, 1):
+            if not rule_dict.get("provider"):
+                logger.warning(f"ルーティングルール{i}にproviderがないためスキップします: {rule_dict}")
+                continue
+            rules.append(RoutingRule(
+                provider=rule_dict["provider"],
+                model=rule_dict.get("model"),
+                name=rule_dict.get("name", f"rule{i}"),
+                min_tokens=rule_dict.get("min_tokens"),
+                max_tokens=rule_dict.get("max_tokens"),
+                feeds=rule_dict.get("feeds"),
+                languages=rule_dict.get("languages")
+            ))
+        return cls(rules)
+
+    def route(self, title: str, content: str, feed: Optional[str] = None) -> Tuple[Optional[RoutingRule], ArticleFeatures]:
+        """記事に適用するルールと特徴量を返す（一致なしの場合ルールはNone）"""
+        features = ArticleFeatures(
+            estimated_tokens=estimate_tokens(title) + estimate_tokens(content),
+            feed=feed,
+            language=detect_language(f"{title}\n{content}")
+        )
+        for rule in self.rules:
+            if rule.matches(features):
+                return rule, features
+        return None, features
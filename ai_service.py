@@ -32,8 +32,8 @@ class AIService:
             print(f"要約生成エラー: {e}")
             return None
 
-def create_ai_service_manager(ai_configs: list) -> AIServiceManager:
-    """設定リストからAIServiceManagerを作成"""
+def create_ai_service_manager(ai_configs: list, **manager_options) -> AIServiceManager:
+    """設定リストからAIServiceManagerを作成（manager_optionsはAIServiceManagerに渡す）"""
     configs = []
     
     for config_dict in ai_configs:
@@ -57,6 +57,10 @@ def create_ai_service_manager(ai_configs: list) -> AIServiceManager:
             timeout=config_dict.get("timeout", 60),
             max_retries=config_dict.get("max_retries", 3),
             retry_delay=config_dict.get("retry_delay", 10),
+            max_concurrency=config_dict.get("max_concurrency", 1),
+            input_cost_per_1m=config_dict.get("input_cost_per_1m"),
+            output_cost_per_1m=config_dict.get("output_cost_per_1m"),
+            daily_budget=config_dict.get("daily_budget"),
             extra_params=config_dict.get("extra_params", {})
         )
         configs.append(ai_config)
@@ -64,4 +68,4 @@ def create_ai_service_manager(ai_configs: list) -> AIServiceManager:
     if not configs:
         raise ValueError("利用可能なAI APIサービスが設定されていません")
     
-    return AIServiceManager.from_configs(configs)
+    return AIServiceManager.from_configs(configs, **manager_options)
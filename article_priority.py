@@ -0,0 +1,64 @@
+import heapq
+import itertools
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+from models import FeedItem
+
+
+def article_age_hours(article: FeedItem, now: Optional[datetime] = None) -> float:
+    """記事の公開からの経過時間（時間）"""
+    now = now or datetime.now(timezone.utc)
+    published = article.published
+    if published.tzinfo is None:
+        published = published.replace(tzinfo=timezone.utc)
+    return max(0.0, (now - published).total_seconds() / 3600)
+
+
+class ArticleBacklog:
+    """
+    新着記事をスコアの高い順に取り出す優先度付きキュー
+
+    スコアは フィードの重み × 0.5^(経過時間 / 半減期)。全記事が同じ割合で減衰するため
+    追加時に計算したスコアの大小関係は時間が経っても変わらない
+    """
+
+    def __init__(self, feed_weights: Optional[Dict[str, float]] = None,
+                 half_life_hours: float = 24, max_age_hours: Optional[float] = None):
+        """
+        Args:
+            feed_weights: フィード名ごとの優先度の重み（未指定のフィードは1.0）
+            half_life_hours: 鮮度スコアが半分になる経過時間
+            max_age_hours: 投稿時点でこの経過時間を超えた記事は古すぎるとみなす（Noneで無制限）
+        """
+        self.feed_weights = feed_weights or {}
+        self.half_life_hours = half_life_hours
+        self.max_age_hours = max_age_hours
+        self._heap: List[Tuple[float, int, FeedItem]] = []
+        self._counter = itertools.count()  # 同スコアは追加順
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __iter__(self) -> Iterator[FeedItem]:
+        """スコアの高い順に記事を取り出す"""
+        while self._heap:
+            yield self.pop()
+
+    def score(self, article: FeedItem, now: Optional[datetime] = None) -> float:
+        """記事の優先度スコア"""
+        weight = self.feed_weights.get(article.source_feed, 1.0)
+        return weight * 0.5 ** (article_age_hours(article, now) / self.half_life_hours)
+
+    def push(self, article: FeedItem):
+        """記事を追加"""
+        heapq.heappush(self._heap, (-self.score(article), next(self._counter), article))
+
+    def pop(self) -> Optional[FeedItem]:
+        """最もスコアの高い記事を取り出す"""
+        if not self._heap:
+            return None
+        return heapq.heappop(self._heap)[2]
+
+    def is_stale(self, article: FeedItem, now: Optional[datetime] = None) -> bool:
+        """投稿するには古すぎる記事か判定"""
+        return self.max_age_hours is not None and article_age_hours(article, now) > self.max_age_hours
@@ -0,0 +1,330 @@
+"""
+フィードチェック全体（取得 → 要約 → 投稿 → 保存）のエンドツーエンドベンチマーク
+
+フィード・AI（OpenAI/OpenRouter互換）・Mastodon の代替サーバーをローカルで起動し、
+シナリオごとに別プロセスで FeedBot のフィードチェックを実行して、
+サイクルごとの所要時間・処理件数・CPU時間とプロセスの最大メモリ使用量（RSS）をJSONで出力する。
+外部のサービスには一切接続しないため、同じ環境なら何度でも同じ条件で計測できる。
+
+使い方:
+    python benchmarks/e2e_benchmark.py [--scenario NAME ...] [--quick] [--output FILE] [--compare FILE]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+
+# シナリオの既定値（latency は秒、entry_size は記事本文のおおよその文字数）
+DEFAULTS = {
+    "feeds": 10,
+    "entries": 20,
+    "entry_size": 2000,
+    "keep_latest": 0,  # FEED_BOOTSTRAP_KEEP_LATEST（初回のチェックで要約・投稿する1フィードあたりの記事数）
+    "feed_latency": 0.02,
+    "ai_latency": 0.05,
+    "ai_error_rate": 0.0,
+    "mastodon_latency": 0.01,
+    "cycles": 2,
+}
+
+# 1サイクル目は新規フィードの取り込み、2サイクル目以降は新着なしの定常状態を計測する
+SCENARIOS: Dict[str, dict] = {
+    "feeds-10": {
+        "description": "10フィード×20件をすべて要約・投稿",
+        "feeds": 10, "entries": 20, "keep_latest": 20,
+    },
+    "feeds-100": {
+        "description": "100フィード×20件（各フィード最新2件を要約・投稿）",
+        "feeds": 100, "entries": 20, "keep_latest": 2,
+    },
+    "feeds-1000": {
+        "description": "1000フィード×10件（既読化のみ、取得・解析・保存の負荷）",
+        "feeds": 1000, "entries": 10, "keep_latest": 0,
+    },
+    "backlog": {
+        "description": "5フィード×100件の大量の未処理記事をすべて要約・投稿",
+        "feeds": 5, "entries": 100, "keep_latest": 100,
+    },
+    "long-articles": {
+        "description": "本文3万字の記事（長文のチャンク要約）",
+        "feeds": 10, "entries": 10, "entry_size": 30000, "keep_latest": 2,
+    },
+    "ai-errors": {
+        "description": "AIの応答の30%がエラー（リトライとフォールバック）",
+        "feeds": 10, "entries": 10, "keep_latest": 10, "ai_error_rate": 0.3,
+    },
+}
+
+RESULT_FILE = "bench_result.json"
+
+
+def scenario_params(name: str, quick: bool) -> dict:
+    params = dict(DEFAULTS)
+    params.update(SCENARIOS[name])
+    if quick:
+        # 動作確認用に規模を1/10にする
+        params["feeds"] = max(2, params["feeds"] // 10)
+        params["entries"] = max(2, params["entries"] // 10)
+        params["keep_latest"] = min(params["keep_latest"], params["entries"])
+    return params
+
+
+def child_env(params: dict, feed_server, chat_server, mastodon_server) -> Dict[str, str]:
+    """計測用プロセスの環境変数（外部サービスの接続先をすべて代替サーバーに向け、待機時間をなくす）"""
+    env = dict(os.environ)
+    env.update({
+        "CHECK_INTERVAL_MINUTES": "60",
+        "ARTICLE_RETENTION_DAYS": "7",
+        "READ_RECORD_RETENTION_DAYS": "3",
+        "MASTODON_INSTANCE_URL": mastodon_server.url,
+        "MASTODON_ACCESS_TOKEN": "bench",
+        "OPENROUTER_API_KEY": "bench",
+        "OPENROUTER_BASE_URL": chat_server.endpoint,
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": chat_server.endpoint,
+        # Ollamaは代替サーバーが404を返すため利用不可として扱われる
+        "OLLAMA_BASE_URL": f"{chat_server.url}/api/chat",
+        "AI_RETRY_DELAY": "0",
+        "AI_TIMEOUT": "30",
+        "POST_PACING": "ratelimit",
+        "POST_MIN_INTERVAL": "0",
+        "POST_WAIT": "0",
+        "FEED_INITIAL_DELAY_MINUTES": "0",
+        "FEED_BOOTSTRAP": "true",
+        "FEED_BOOTSTRAP_KEEP_LATEST": str(params["keep_latest"]),
+        "FEED_FETCH_TIMEOUT": "30",
+        "ENABLE_QUIET_HOURS": "false",
+        "DIGEST_THRESHOLD": "",
+        "WORKER_MODE": "false",
+        "CONFIG_RELOAD": "false",
+        "METRICS_PORT": "",
+        "TRACE_FILE": "",
+        "LOG_LEVEL": "WARNING",
+        "LOG_TO_FILE": "false",
+        "NO_PROXY": "127.0.0.1,localhost",
+        "no_proxy": "127.0.0.1,localhost",
+        "PYTHONUNBUFFERED": "1",
+    })
+    return env
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """このプロセスの最大RSS（取得できない環境ではNone）"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト、macOSはバイト単位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_child(workdir: str, cycles: int) -> int:
+    """計測用プロセス本体: 作業ディレクトリの feeds.json でフィードチェックを繰り返し、結果をJSONに書き出す"""
+    sys.path.insert(0, str(REPO_ROOT))
+    os.chdir(workdir)
+
+    import main
+    from metrics import FEED_ENTRIES_SEEN, FEED_ENTRIES_NEW, POST_RESULTS, AI_FALLBACKS, AI_FAILURES
+
+    main.setup_logging()
+    started = time.perf_counter()
+    bot = main.FeedBot(data_dir="data")
+    startup_seconds = time.perf_counter() - started
+
+    def counters() -> dict:
+        return {
+            "entries_seen": FEED_ENTRIES_SEEN.total(),
+            "entries_new": FEED_ENTRIES_NEW.total(),
+            "posts": POST_RESULTS.total(outcome="posted"),
+            "post_failures": POST_RESULTS.total(outcome="failed"),
+            "ai_fallbacks": AI_FALLBACKS.total(),
+            "ai_failures": AI_FAILURES.total(),
+        }
+
+    results = []
+    try:
+        for number in range(1, cycles + 1):
+            before = counters()
+            wall_started = time.perf_counter()
+            cpu_started = time.process_time()
+            bot._run_cycle()
+            wall = time.perf_counter() - wall_started
+            cpu = time.process_time() - cpu_started
+            after = counters()
+            cycle = {"cycle": number, "wall_seconds": round(wall, 4), "cpu_seconds": round(cpu, 4)}
+            cycle.update({key: int(after[key] - before[key]) for key in after})
+            cycle["entries_per_second"] = round(cycle["entries_seen"] / wall, 2) if wall else None
+            cycle["new_articles_per_second"] = round(cycle["entries_new"] / wall, 2) if wall else None
+            results.append(cycle)
+    finally:
+        bot.close()
+
+    data_bytes = sum(path.stat().st_size for path in Path("data").rglob("*") if path.is_file())
+    with open(RESULT_FILE, "w", encoding="utf-8") as f:
+        json.dump({
+            "startup_seconds": round(startup_seconds, 4),
+            "cycles": results,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "data_bytes": data_bytes,
+        }, f)
+    return 0
+
+
+def run_scenario(name: str, params: dict, servers, keep_workdir: bool) -> dict:
+    """代替サーバーをシナリオの設定にして計測用プロセスを実行し、結果をまとめる"""
+    feed_server, chat_server, mastodon_server = servers
+    feed_server.configure(entries=params["entries"], entry_size=params["entry_size"], latency=params["feed_latency"])
+    chat_server.configure(latency=params["ai_latency"], error_rate=params["ai_error_rate"])
+    mastodon_server.latency = params["mastodon_latency"]
+    for server in servers:
+        server.reset()
+
+    workdir = tempfile.mkdtemp(prefix=f"feedbot_bench_{name}_")
+    try:
+        feeds = [{"url": feed_server.feed_url(index), "name": f"bench-{index}"} for index in range(params["feeds"])]
+        with open(os.path.join(workdir, "feeds.json"), "w", encoding="utf-8") as f:
+            json.dump(feeds, f)
+
+        log_path = os.path.join(workdir, "child.log")
+        with open(log_path, "w", encoding="utf-8") as log:
+            process = subprocess.run(
+                [sys.executable, str(Path(__file__).resolve()), "--child", workdir, "--cycles", str(params["cycles"])],
+                env=child_env(params, feed_server, chat_server, mastodon_server),
+                stdout=log, stderr=subprocess.STDOUT,
+            )
+        result_path = os.path.join(workdir, RESULT_FILE)
+        if process.returncode != 0 or not os.path.exists(result_path):
+            with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+                tail = f.read()[-2000:]
+            raise RuntimeError(f"シナリオ {name} の実行に失敗しました (終了コード {process.returncode})\n{tail}")
+        with open(result_path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+    finally:
+        if keep_workdir:
+            print(f"  作業ディレクトリ: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "name": name,
+        "description": params.pop("description", ""),
+        "params": params,
+        **result,
+        "servers": {
+            "feed": feed_server.stats(),
+            "ai": chat_server.stats(),
+            "mastodon": mastodon_server.stats(),
+        },
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(report: dict):
+    print(f"\n{'シナリオ':<16}{'サイクル':>8}{'時間(s)':>10}{'CPU(s)':>10}{'取得':>8}{'新着':>7}{'投稿':>7}{'件/s':>10}{'最大RSS(MB)':>13}")
+    for scenario in report["scenarios"]:
+        rss = scenario.get("peak_rss_bytes")
+        rss_text = f"{rss / 1024 / 1024:.1f}" if rss else "-"
+        for cycle in scenario["cycles"]:
+            print(f"{scenario['name']:<16}{cycle['cycle']:>8}{cycle['wall_seconds']:>10.2f}{cycle['cpu_seconds']:>10.2f}"
+                  f"{cycle['entries_seen']:>8}{cycle['entries_new']:>7}{cycle['posts']:>7}"
+                  f"{cycle['entries_per_second'] or 0:>10.1f}{rss_text:>13}")
+
+
+def print_comparison(report: dict, baseline_path: str):
+    """以前の結果と比べたサイクルごとの所要時間の変化を表示"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {scenario["name"]: scenario for scenario in baseline.get("scenarios", [])}
+    print(f"\n■ 比較: {baseline_path} ({baseline.get('revision') or '-'}) → {report.get('revision') or '-'}")
+    for scenario in report["scenarios"]:
+        old = previous.get(scenario["name"])
+        if not old:
+            continue
+        if old.get("params") != scenario["params"]:
+            print(f"  {scenario['name']}: 条件が異なるため比較できません")
+            continue
+        for cycle, old_cycle in zip(scenario["cycles"], old["cycles"]):
+            ratio = cycle["wall_seconds"] / old_cycle["wall_seconds"] if old_cycle["wall_seconds"] else 0
+            print(f"  {scenario['name']:<16} サイクル{cycle['cycle']}: {old_cycle['wall_seconds']:.2f}s → "
+                  f"{cycle['wall_seconds']:.2f}s ({ratio - 1:+.1%})")
+        if old.get("peak_rss_bytes") and scenario.get("peak_rss_bytes"):
+            ratio = scenario["peak_rss_bytes"] / old["peak_rss_bytes"]
+            print(f"  {scenario['name']:<16} 最大RSS: {ratio - 1:+.1%}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="代替サーバーを使ったフィードチェック全体のベンチマーク")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="実行するシナリオ（複数指定可、既定: すべて）")
+    parser.add_argument("--quick", action="store_true", help="規模を1/10にした動作確認用の実行")
+    parser.add_argument("--cycles", type=int, default=None, help="シナリオごとのチェック回数（既定: 2）")
+    parser.add_argument("--output", default=None,
+                        help="結果のJSONファイル（既定: benchmarks/results/e2e_<日時>.json）")
+    parser.add_argument("--compare", default=None, help="比較する以前の結果のJSONファイル")
+    parser.add_argument("--keep-workdir", action="store_true", help="シナリオの作業ディレクトリを削除せず残す")
+    parser.add_argument("--child", metavar="WORKDIR", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        return run_child(args.child, args.cycles or DEFAULTS["cycles"])
+
+    from standin_servers import ChatServer, FeedServer, MastodonServer
+
+    servers = (FeedServer().start(), ChatServer().start(), MastodonServer().start())
+    report = {
+        "revision": git_revision(),
+        "started_at": datetime.now().astimezone().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "quick": args.quick,
+        "scenarios": [],
+    }
+    try:
+        for name in args.scenario or list(SCENARIOS):
+            params = scenario_params(name, args.quick)
+            if args.cycles:
+                params["cycles"] = args.cycles
+            print(f"▶ {name}: {params['description']} (フィード{params['feeds']}件×{params['entries']}件, "
+                  f"{params['cycles']}サイクル)")
+            scenario = run_scenario(name, params, servers, args.keep_workdir)
+            report["scenarios"].append(scenario)
+            total = sum(cycle["wall_seconds"] for cycle in scenario["cycles"])
+            print(f"  完了: {total:.2f}s")
+    finally:
+        for server in servers:
+            server.stop()
+
+    output = Path(args.output) if args.output else BENCH_DIR / "results" / f"e2e_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print_summary(report)
+    if args.compare:
+        print_comparison(report, args.compare)
+    print(f"\n結果を保存しました: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
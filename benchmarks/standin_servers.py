@@ -0,0 +1,359 @@
+"""
+ベンチマーク用にローカルで起動する代替HTTPサーバー
+
+- フィードサーバー: 件数・本文サイズ・応答遅延を指定した合成RSS/Atomフィードを返す
+- AIサーバー: OpenAI/OpenRouter互換のチャットAPI（応答遅延とエラー注入を指定可能）
+- Mastodonサーバー: 投稿・認証確認・予約投稿一覧などのAPIを最小限に模倣する
+
+いずれも 127.0.0.1 の空きポートで起動し、受け付けたリクエスト数などを stats() で返す
+"""
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from xml.sax.saxutils import escape
+
+# 合成記事の本文に使う語彙（重複記事の判定に引っかからないよう記事ごとに乱数で並べる）
+WORDS = (
+    "feed article summary server network latency cache storage python queue worker thread process "
+    "release update security patch kernel compiler database index memory disk cloud region cluster "
+    "container image build deploy monitor metric trace log alert incident review design api client "
+    "protocol parser token model prompt budget schedule retry timeout backoff shard lease digest"
+).split()
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    """アクセスログを出さず、本文の読み捨てとJSON応答を共通化したハンドラー"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data, headers: Optional[Dict[str, str]] = None):
+        self._send(status, json.dumps(data).encode("utf-8"), "application/json; charset=utf-8", headers)
+
+
+class StandinServer:
+    """ThreadingHTTPServer をバックグラウンドのスレッドで動かす共通部分"""
+
+    handler_class = _QuietHandler
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self.reset()
+
+    def reset(self):
+        """集計値を初期化（シナリオごとに呼ぶ）"""
+        with self._lock:
+            self._stats = {"requests": 0}
+
+    def count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] = self._stats.get(key, 0) + amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        owner = self
+
+        class Handler(self.handler_class):
+            server_owner = owner
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class _FeedHandler(_QuietHandler):
+    def do_GET(self):
+        owner: FeedServer = self.server_owner
+        owner.count("requests")
+        # /feed/<番号>.xml
+        name = self.path.split("?", 1)[0].rsplit("/", 1)[-1]
+        try:
+            index = int(name.split(".", 1)[0])
+        except ValueError:
+            self._send(404, b"not found", "text/plain")
+            return
+        if owner.latency:
+            time.sleep(owner.latency)
+        body, content_type = owner.render(index)
+        owner.count("bytes", len(body))
+        self._send(200, body, content_type)
+
+
+class FeedServer(StandinServer):
+    """
+    合成フィードを返すサーバー
+
+    偶数番はRSS 2.0、奇数番はAtom形式。内容は番号と乱数シードで決まり、何度取得しても同じ
+    （2回目以降のチェックは新着なしの定常状態になる）
+    """
+
+    handler_class = _FeedHandler
+
+    def __init__(self):
+        super().__init__()
+        self.configure()
+
+    def configure(self, entries: int = 20, entry_size: int = 2000, latency: float = 0.0, seed: int = 0):
+        """1フィードあたりの記事数・記事本文のおおよその文字数・応答遅延（秒）を設定"""
+        self.entries = entries
+        self.entry_size = entry_size
+        self.latency = latency
+        self.seed = seed
+        self._now = datetime.now(timezone.utc).replace(microsecond=0)
+        self._cache: Dict[int, tuple] = {}
+
+    def feed_url(self, index: int) -> str:
+        return f"{self.url}/feed/{index}.xml"
+
+    def render(self, index: int):
+        with self._lock:
+            cached = self._cache.get(index)
+        if cached:
+            return cached
+
+        rng = random.Random(f"{self.seed}-{index}")
+        items = []
+        for number in range(self.entries):
+            words = []
+            length = 0
+            while length < self.entry_size:
+                word = rng.choice(WORDS)
+                words.append(word)
+                length += len(word) + 1
+            # 新しい順に並べ、最新の記事でも取得時点から10分以上前にする
+            published = self._now - timedelta(minutes=10 + number * 7)
+            items.append({
+                "title": f"Feed {index} article {number}: {' '.join(words[:6])}",
+                "link": f"{self.url}/articles/{index}/{number}?utm_source=bench",
+                "published": published,
+                "content": f"<p>{' '.join(words)}</p>",
+            })
+
+        if index % 2 == 0:
+            body = self._render_rss(index, items)
+            content_type = "application/rss+xml; charset=utf-8"
+        else:
+            body = self._render_atom(index, items)
+            content_type = "application/atom+xml; charset=utf-8"
+        result = (body.encode("utf-8"), content_type)
+        with self._lock:
+            self._cache[index] = result
+        return result
+
+    def _render_rss(self, index: int, items) -> str:
+        parts = [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            '<rss version="2.0"><channel>',
+            f"<title>Benchmark feed {index}</title><link>{self.url}/</link><description>synthetic</description>",
+        ]
+        for item in items:
+            parts.append(
+                f"<item><title>{escape(item['title'])}</title><link>{escape(item['link'])}</link>"
+                f"<guid>{escape(item['link'])}</guid><pubDate>{format_datetime(item['published'])}</pubDate>"
+                f"<description>{escape(item['content'])}</description></item>"
+            )
+        parts.append("</channel></rss>")
+        return "\n".join(parts)
+
+    def _render_atom(self, index: int, items) -> str:
+        parts = [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            '<feed xmlns="http://www.w3.org/2005/Atom">',
+            f"<title>Benchmark feed {index}</title><id>urn:bench:{index}</id>"
+            f"<updated>{self._now.isoformat()}</updated>",
+        ]
+        for item in items:
+            parts.append(
+                f"<entry><title>{escape(item['title'])}</title><link href=\"{escape(item['link'])}\"/>"
+                f"<id>{escape(item['link'])}</id><published>{item['published'].isoformat()}</published>"
+                f"<updated>{item['published'].isoformat()}</updated>"
+                f"<content type=\"html\">{escape(item['content'])}</content></entry>"
+            )
+        parts.append("</feed>")
+        return "\n".join(parts)
+
+
+class _ChatHandler(_QuietHandler):
+    def do_POST(self):
+        owner: ChatServer = self.server_owner
+        body = self._read_body()
+        owner.count("requests")
+        if owner.latency:
+            time.sleep(owner.latency)
+
+        error_status = owner.pick_error()
+        if error_status:
+            owner.count(f"errors_{error_status}")
+            self._send_json(error_status, {"error": {"message": "injected error", "code": error_status}},
+                            {"Retry-After": "0"} if error_status == 429 else None)
+            return
+
+        try:
+            prompt_chars = sum(len(m.get("content") or "") for m in json.loads(body or b"{}").get("messages", []))
+        except ValueError:
+            prompt_chars = len(body)
+        summary = owner.summary_text
+        self._send_json(200, {
+            "id": f"chatcmpl-bench-{owner.stats()['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "bench",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": summary}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_chars // 4,
+                "completion_tokens": len(summary) // 4,
+                "total_tokens": prompt_chars // 4 + len(summary) // 4,
+            },
+        })
+
+    def do_GET(self):
+        self.server_owner.count("requests")
+        self._send(404, b"not found", "text/plain")
+
+
+class ChatServer(StandinServer):
+    """OpenAI/OpenRouter互換の /v1/chat/completions を返すサーバー"""
+
+    handler_class = _ChatHandler
+
+    def __init__(self):
+        super().__init__()
+        self.configure()
+
+    def configure(self, latency: float = 0.0, error_rate: float = 0.0, rate_limit_share: float = 0.5,
+                  summary_chars: int = 200, seed: int = 0):
+        """
+        応答遅延（秒）・エラーを返す割合・そのうち429（レート制限）にする割合・要約文の文字数を設定
+
+        エラーは乱数シードで決まるため、同じ設定なら同じ順番で発生する
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_share = rate_limit_share
+        self.summary_text = ("ベンチマーク用の要約です。" * (summary_chars // 12 + 1))[:summary_chars]
+        self._rng = random.Random(seed)
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.url}/v1/chat/completions"
+
+    def pick_error(self) -> Optional[int]:
+        with self._lock:
+            if self._rng.random() >= self.error_rate:
+                return None
+            return 429 if self._rng.random() < self.rate_limit_share else 500
+
+
+class _MastodonHandler(_QuietHandler):
+    def _rate_limit_headers(self) -> Dict[str, str]:
+        reset = datetime.now(timezone.utc) + timedelta(minutes=5)
+        return {
+            "X-RateLimit-Limit": "300",
+            "X-RateLimit-Remaining": "299",
+            "X-RateLimit-Reset": reset.isoformat(),
+        }
+
+    def do_GET(self):
+        owner: MastodonServer = self.server_owner
+        owner.count("requests")
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path in ("/api/v1/instance", "/api/v2/instance"):
+            data = {"uri": "127.0.0.1", "domain": "127.0.0.1", "title": "bench", "version": "4.2.0",
+                    "configuration": {"statuses": {"max_characters": 500}}}
+        elif path == "/api/v1/accounts/verify_credentials":
+            data = owner.account()
+        elif path in ("/api/v1/scheduled_statuses", "/api/v1/custom_emojis"):
+            data = []
+        else:
+            self._send_json(404, {"error": "Record not found"})
+            return
+        self._send_json(200, data, self._rate_limit_headers())
+
+    def do_POST(self):
+        owner: MastodonServer = self.server_owner
+        self._read_body()
+        owner.count("requests")
+        if self.path.split("?", 1)[0].rstrip("/") != "/api/v1/statuses":
+            self._send_json(404, {"error": "Record not found"})
+            return
+        if owner.latency:
+            time.sleep(owner.latency)
+        owner.count("statuses")
+        status_id = str(owner.stats()["statuses"])
+        now = datetime.now(timezone.utc).isoformat()
+        self._send_json(200, {
+            "id": status_id,
+            "created_at": now,
+            "uri": f"{owner.url}/statuses/{status_id}",
+            "url": f"{owner.url}/@bench/{status_id}",
+            "visibility": "public",
+            "content": "",
+            "account": owner.account(),
+            "media_attachments": [],
+            "mentions": [],
+            "tags": [],
+            "emojis": [],
+        }, self._rate_limit_headers())
+
+    def do_PUT(self):
+        self.do_POST()
+
+
+class MastodonServer(StandinServer):
+    """投稿を数えるだけのMastodon APIの代替（レート制限ヘッダーは常に余裕がある状態を返す）"""
+
+    handler_class = _MastodonHandler
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+
+    def account(self) -> dict:
+        return {
+            "id": "1",
+            "username": "bench",
+            "acct": "bench",
+            "display_name": "bench",
+            "created_at": "2024-01-01T00:00:00+00:00",
+            "url": f"{self.url}/@bench",
+            "emojis": [],
+            "fields": [],
+        }
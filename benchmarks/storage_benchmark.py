@@ -0,0 +1,343 @@
+"""
+データ永続化（storage.py）のマイクロベンチマーク
+
+乱数シードから合成した1千・1万・10万件の記事（FeedItem）を使い、記事の読み込み・保存・
+2種類のクリーンアップと、フィードチェック冒頭の既存IDの集合の作成について、
+所要時間・最大メモリ（tracemalloc）・書き込んだバイト数を計測する。
+結果を保存済みのベースラインと比べ、しきい値を超えて悪化した項目があれば終了コード1を返す。
+
+同じシードとフィクスチャのバージョンなら同じ記事が生成されるため、将来ほかの保存方式を追加した場合も
+BACKENDS に登録（または --backend モジュール:関数 で指定）すれば同じ条件で比べられる。
+
+使い方:
+    python benchmarks/storage_benchmark.py [--sizes 1000 10000 100000] [--backend NAME ...]
+                                           [--baseline FILE] [--save-baseline] [--threshold 0.2]
+                                           [--time-threshold 0.5] [--min-delta-ms 50]
+
+ベースラインは計測するマシンごとに --save-baseline で作成する（リポジトリには含めない）。
+"""
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from models import FeedItem  # noqa: E402
+from storage import DataStorage  # noqa: E402
+
+# 記事の生成方法を変えた場合は上げる（バージョンが異なる結果とは比較しない）
+FIXTURE_VERSION = 1
+DEFAULT_SEED = 20240101
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_BASELINE = BENCH_DIR / "baselines" / "storage_baseline.json"
+
+# クリーンアップの保持日数（config の ARTICLE_RETENTION_DAYS / READ_RECORD_RETENTION_DAYS の既定値）
+ARTICLE_RETENTION_DAYS = 7
+READ_RECORD_RETENTION_DAYS = 3
+
+# 計測する保存方式（データディレクトリを受け取り DataStorage と同じメソッドを持つオブジェクトを返す）
+BACKENDS: Dict[str, Callable[[str], object]] = {
+    "json": lambda data_dir: DataStorage(data_dir),
+    # ワーカーモード（ファイルロックの下で変更した記事だけを保存済みの一覧にマージ）
+    "json-shared": lambda data_dir: DataStorage(data_dir, worker_id="bench"),
+}
+
+# 本文の材料（日本語と英語の技術記事を模した段落）
+_PHRASES = (
+    "新しいバージョンがリリースされました", "パフォーマンスが大幅に改善されています", "既存の設定はそのまま利用できます",
+    "詳細は公式ドキュメントを参照してください", "セキュリティ上の問題が修正されました", "開発者向けのAPIが追加されました",
+    "移行手順を順を追って説明します", "ベンチマークの結果を比較しました", "クラウド環境での運用例を紹介します",
+    "the release improves startup time", "memory usage was reduced significantly", "see the changelog for details",
+    "a new configuration option was added", "this patch fixes a race condition", "deployment is now fully automated",
+)
+_FEEDS = [f"feed-{number:02d}" for number in range(50)]
+
+
+def _paragraph_pool(rng: random.Random, count: int = 2000) -> List[str]:
+    pool = []
+    for _ in range(count):
+        sentences = [rng.choice(_PHRASES) for _ in range(rng.randint(3, 8))]
+        pool.append("<p>" + "。".join(sentences) + "。</p>")
+    return pool
+
+
+def generate_articles(count: int, seed: int = DEFAULT_SEED, now: Optional[datetime] = None) -> List[FeedItem]:
+    """
+    合成記事を生成（本文は中央値約1,800文字・最大3万文字、公開日は直近14日に分散）
+
+    記事の85%は処理済み（うち2割は初回取り込みで要約せず既読化）、残りは未処理。
+    日時は now からの相対値のため、実行日が違ってもクリーンアップで削除される件数は変わらない
+    """
+    rng = random.Random(f"{seed}-{count}")
+    now = (now or datetime.now(timezone.utc)).replace(microsecond=0)
+    pool = _paragraph_pool(rng)
+    articles = []
+    for number in range(count):
+        target = min(max(int(rng.lognormvariate(7.5, 0.8)), 200), 30000)
+        parts = []
+        length = 0
+        while length < target:
+            paragraph = rng.choice(pool)
+            parts.append(paragraph)
+            length += len(paragraph)
+        source_feed = rng.choice(_FEEDS)
+        published = now - timedelta(seconds=rng.randint(0, 14 * 24 * 3600))
+        processed = rng.random() < 0.85
+        skipped = processed and rng.random() < 0.2
+        posted = processed and not skipped
+        status_id = str(110000000000000000 + number) if posted else None
+        articles.append(FeedItem(
+            id=f"{rng.getrandbits(128):032x}",
+            title=f"{rng.choice(_PHRASES)} ({source_feed} #{number})",
+            content="".join(parts),
+            url=f"https://example.com/{source_feed}/articles/{number}",
+            published=published,
+            source_feed=source_feed,
+            processed=processed,
+            summary=("".join(rng.choice(_PHRASES) + "。" for _ in range(6)) if posted else None),
+            posted_to_mastodon=posted,
+            read_at=published + timedelta(seconds=rng.randint(300, 7200)) if processed else None,
+            status_id=status_id,
+            account_status_ids={"default": status_id} if status_id else {},
+            skip_reason="bootstrap" if skipped else None,
+            fingerprint=f"{rng.getrandbits(64):016x}",
+        ))
+    return articles
+
+
+def _snapshot(directory: Path) -> Dict[str, tuple]:
+    return {
+        str(path): (stat.st_ino, stat.st_ctime_ns, stat.st_mtime_ns, stat.st_size)
+        for path in directory.rglob("*") if path.is_file()
+        for stat in [path.stat()]
+    }
+
+
+def _bytes_written(before: Dict[str, tuple], after: Dict[str, tuple]) -> int:
+    """計測中に作成・変更されたファイルのサイズの合計（バックアップや一時ファイルからの置き換えも含む）"""
+    return sum(state[3] for path, state in after.items() if before.get(path) != state)
+
+
+def measure(data_dir: Path, setup: Callable[[], object], operation: Callable[[object], object], repeat: int) -> dict:
+    """
+    setup の後に operation を repeat 回計測（所要時間は中央値）し、最大メモリは tracemalloc を有効にした
+    別の1回で計測（tracemalloc は確保のたびに記録するため時間の計測とは分ける）
+    """
+    times = []
+    bytes_written = 0
+    for _ in range(repeat):
+        state = setup()
+        gc.collect()
+        before = _snapshot(data_dir)
+        started = time.perf_counter()
+        operation(state)
+        times.append(time.perf_counter() - started)
+        bytes_written = _bytes_written(before, _snapshot(data_dir))
+        del state
+
+    state = setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        operation(state)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del state
+
+    return {
+        "seconds": round(statistics.median(times), 6),
+        "min_seconds": round(min(times), 6),
+        "peak_memory_bytes": peak,
+        "bytes_written": bytes_written,
+    }
+
+
+def build_existing_ids(articles: List[FeedItem]):
+    """check_feeds の冒頭で既存記事から作る集合と辞書（main.py と同じ処理）"""
+    existing_ids = {article.id for article in articles}
+    existing_by_id = {article.id: article for article in articles}
+    return existing_ids, existing_by_id
+
+
+def run_backend(factory: Callable[[str], object], articles: List[FeedItem], repeat: int) -> Dict[str, dict]:
+    """1つの保存方式について各操作を計測"""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="feedbot_storage_bench_") as temp_dir:
+        data_dir = Path(temp_dir) / "data"
+        storage = factory(str(data_dir))
+
+        def write_fixture():
+            storage.save_articles(articles, replace=True)
+            return storage
+
+        # 既存のファイルがある状態での保存（通常の運用と同じくバックアップも作られる）
+        results["save_articles"] = measure(data_dir, write_fixture, lambda s: s.save_articles(articles), repeat)
+
+        write_fixture()
+        results["load_articles"] = measure(data_dir, lambda: storage, lambda s: s.load_articles(), repeat)
+        results["build_existing_ids"] = measure(data_dir, storage.load_articles, build_existing_ids, repeat)
+        results["cleanup_old_articles"] = measure(
+            data_dir, write_fixture, lambda s: s.cleanup_old_articles(ARTICLE_RETENTION_DAYS), repeat)
+        results["cleanup_old_read_records"] = measure(
+            data_dir, write_fixture, lambda s: s.cleanup_old_read_records(READ_RECORD_RETENTION_DAYS), repeat)
+    return results
+
+
+def resolve_backend(name: str) -> Callable[[str], object]:
+    """登録済みの名前、または モジュール:関数 形式で保存方式を取得"""
+    if name in BACKENDS:
+        return BACKENDS[name]
+    if ":" not in name:
+        raise SystemExit(f"未知の保存方式です: {name}（登録済み: {', '.join(BACKENDS)}、または モジュール:関数）")
+    module_name, attribute = name.split(":", 1)
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(report: dict):
+    print(f"\n{'保存方式':<14}{'件数':>8}  {'操作':<26}{'時間(ms)':>11}{'最大メモリ(MB)':>15}{'書き込み(MB)':>14}")
+    for backend, sizes in report["results"].items():
+        for size, operations in sizes.items():
+            for operation, result in operations.items():
+                print(f"{backend:<14}{size:>8}  {operation:<26}{result['seconds'] * 1000:>11.1f}"
+                      f"{result['peak_memory_bytes'] / 1024 / 1024:>15.1f}{result['bytes_written'] / 1024 / 1024:>14.1f}")
+
+
+def compare(report: dict, baseline: dict, threshold: float, min_delta_seconds: float,
+            time_threshold: float) -> List[str]:
+    """
+    ベースラインと比べて悪化した項目を返す
+
+    所要時間は揺らぎの小さい最短値で比べ、time_threshold の割合に加えて min_delta_seconds 以上遅くなった場合のみ、
+    最大メモリと書き込みバイト数（実行ごとにほぼ一定）は threshold の割合を超えて増えた場合に悪化とする
+    """
+    if baseline.get("fixture_version") != report["fixture_version"] or baseline.get("seed") != report["seed"]:
+        print("ベースラインとフィクスチャのバージョンまたはシードが異なるため比較しません")
+        return []
+
+    regressions = []
+    print(f"\n■ ベースラインとの比較 ({baseline.get('revision') or '-'} → {report.get('revision') or '-'}, "
+          f"しきい値 {threshold:.0%}、所要時間 {time_threshold:.0%})")
+    for backend, sizes in report["results"].items():
+        for size, operations in sizes.items():
+            for operation, result in operations.items():
+                old = baseline.get("results", {}).get(backend, {}).get(size, {}).get(operation)
+                if not old:
+                    continue
+                changes = []
+                for metric in ("min_seconds", "peak_memory_bytes", "bytes_written"):
+                    before, after = old[metric], result[metric]
+                    ratio = after / before - 1 if before else 0.0
+                    if metric == "min_seconds":
+                        worse = ratio > time_threshold and after - before >= min_delta_seconds
+                    else:
+                        worse = ratio > threshold
+                    changes.append(f"{metric} {ratio:+.1%}{' ⚠' if worse else ''}")
+                    if worse:
+                        regressions.append(f"{backend} {size}件 {operation}: {metric} {before} → {after} ({ratio:+.1%})")
+                print(f"  {backend:<14}{size:>8}  {operation:<26}" + "  ".join(changes))
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="storage.py の読み込み・保存・クリーンアップのベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="記事数（既定: 1000 10000 100000）")
+    parser.add_argument("--backend", action="append",
+                        help=f"計測する保存方式（複数指定可、既定: {', '.join(BACKENDS)}、モジュール:関数 も指定可）")
+    parser.add_argument("--repeat", type=int, default=None,
+                        help="時間を計測する回数（中央値を採用、既定: 10万件以上は1回、1万件以上は3回、それ未満は5回）")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="記事を生成する乱数シード")
+    parser.add_argument("--output", default=None,
+                        help="結果のJSONファイル（既定: benchmarks/results/storage_<日時>.json）")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="比較するベースラインのJSONファイル")
+    parser.add_argument("--save-baseline", action="store_true", help="今回の結果をベースラインとして保存")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="最大メモリ・書き込みバイト数を悪化とみなす増加の割合（既定: 0.2 = 20%%）")
+    parser.add_argument("--time-threshold", type=float, default=0.5,
+                        help="所要時間を悪化とみなす増加の割合（既定: 0.5 = 50%%）")
+    parser.add_argument("--min-delta-ms", type=float, default=50.0,
+                        help="所要時間を悪化とみなす最小の差（ミリ秒、既定: 50）")
+    args = parser.parse_args(argv)
+
+    backends = args.backend or list(BACKENDS)
+    report = {
+        "fixture_version": FIXTURE_VERSION,
+        "seed": args.seed,
+        "revision": git_revision(),
+        "started_at": datetime.now().astimezone().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "fixtures": {},
+        "results": {backend: {} for backend in backends},
+    }
+
+    for size in args.sizes:
+        started = time.perf_counter()
+        articles = generate_articles(size, args.seed)
+        content_chars = sum(len(article.content) for article in articles)
+        report["fixtures"][str(size)] = {"articles": size, "content_chars": content_chars}
+        print(f"▶ {size}件の記事を生成 ({time.perf_counter() - started:.1f}s, 本文 平均{content_chars // size}文字)")
+
+        repeat = args.repeat or (1 if size >= 100000 else 3 if size >= 10000 else 5)
+        for backend in backends:
+            started = time.perf_counter()
+            report["results"][backend][str(size)] = run_backend(resolve_backend(backend), articles, repeat)
+            print(f"  {backend}: 完了 ({time.perf_counter() - started:.1f}s)")
+        del articles
+        gc.collect()
+
+    output = Path(args.output) if args.output else BENCH_DIR / "results" / f"storage_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_results(report)
+    print(f"\n結果を保存しました: {output}")
+
+    if args.save_baseline:
+        baseline_path = Path(args.baseline)
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"ベースラインを保存しました: {baseline_path}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"ベースラインがありません（--save-baseline で作成）: {args.baseline}")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, args.threshold, args.min_delta_ms / 1000, args.time_threshold)
+    if regressions:
+        print(f"\n⚠ ベースラインより悪化した項目が{len(regressions)}件あります:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1
+    print("\nベースラインからの悪化はありません")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,21 @@
 # 環境変数から設定を読み込みます
 
 import os
+import re
 import json
+import socket
+
+# 任意のJSON設定ファイルを読み込み（存在しない場合は既定値）
+def load_optional_json(path: str, default=None):
+    """任意のJSON設定ファイルを読み込む"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except json.JSONDecodeError as e:
+        print(f"エラー: {path} の形式が正しくありません: {e}")
+        return default
 
 # フィード設定をJSONファイルから読み込み
 def load_feed_urls():
@@ -20,6 +34,11 @@ def load_feed_urls():
 
 FEED_URLS = load_feed_urls()
 
+# 記事IDを生成する前のURL正規化（トラッキングパラメータ・http/https・末尾スラッシュ・AMP版の表記ゆれを統一）
+URL_CANONICALIZATION = os.getenv("URL_CANONICALIZATION", "true").lower() == "true"
+URL_CANONICALIZATION_RULES_FILE = os.getenv("URL_CANONICALIZATION_RULES_FILE", "url_rules.json")
+URL_CANONICALIZATION_RULES = load_optional_json(URL_CANONICALIZATION_RULES_FILE, {})  # {"default": {...}, "feeds": {フィード名: {...}}}
+
 def get_optional_int(env_var: str, default: str = None) -> int:
     """環境変数から整数を取得。空文字の場合はNoneを返す"""
     value = os.getenv(env_var, default or "")
@@ -66,12 +85,17 @@ AI_CONFIGS = [
     {
         "name": "OpenRouter",
         "api_key": None,  # .envファイルで設定
+        "base_url": os.getenv("OPENROUTER_BASE_URL") or None,  # 互換APIのエンドポイント（空で既定）
         "model": os.getenv("OPENROUTER_MODEL", "openai/gpt-oss-20b"),
         "max_tokens": get_optional_int("AI_MAX_TOKENS", "8000"),  # モデル仕様に合わせて大幅増加
         "temperature": get_optional_float("AI_TEMPERATURE", "0.3"),
         "timeout": int(os.getenv("AI_TIMEOUT", "120")),  # 処理時間も延長
         "max_retries": int(os.getenv("AI_MAX_RETRIES", "3")),
         "retry_delay": int(os.getenv("AI_RETRY_DELAY", "10")),
+        "max_concurrency": int(os.getenv("AI_MAX_CONCURRENCY", "4")),  # 同時リクエスト数の上限
+        "input_cost_per_1m": get_optional_float("OPENROUTER_INPUT_COST_PER_1M"),  # 入力100万トークンあたりの料金（USD）
+        "output_cost_per_1m": get_optional_float("OPENROUTER_OUTPUT_COST_PER_1M"),  # 出力100万トークンあたりの料金（USD）
+        "daily_budget": get_optional_float("OPENROUTER_DAILY_BUDGET"),  # サービス単位の1日の予算（USD）
         "extra_params": {
             "system_prompt": AI_SYSTEM_PROMPT_TEMPLATE  # 統合システムプロンプト使用
         }
@@ -79,12 +103,17 @@ AI_CONFIGS = [
     {
         "name": "OpenAI",
         "api_key": None,  # .envファイルで設定
+        "base_url": os.getenv("OPENAI_BASE_URL") or None,  # 互換APIのエンドポイント（空で既定）
         "model": os.getenv("OPENAI_MODEL", "gpt-5-nano"),
         "max_tokens": get_optional_int("AI_MAX_TOKENS", "8000"),  # モデル仕様に合わせて大幅増加
         "temperature": get_optional_float("AI_TEMPERATURE", "0.3"),
         "timeout": int(os.getenv("AI_TIMEOUT", "120")),  # 処理時間も延長
         "max_retries": int(os.getenv("AI_MAX_RETRIES", "3")),
         "retry_delay": int(os.getenv("AI_RETRY_DELAY", "10")),
+        "max_concurrency": int(os.getenv("AI_MAX_CONCURRENCY", "4")),  # 同時リクエスト数の上限
+        "input_cost_per_1m": get_optional_float("OPENAI_INPUT_COST_PER_1M"),  # 入力100万トークンあたりの料金（USD）
+        "output_cost_per_1m": get_optional_float("OPENAI_OUTPUT_COST_PER_1M"),  # 出力100万トークンあたりの料金（USD）
+        "daily_budget": get_optional_float("OPENAI_DAILY_BUDGET"),  # サービス単位の1日の予算（USD）
         "extra_params": {
             "system_prompt": AI_SYSTEM_PROMPT_TEMPLATE  # 統合システムプロンプト使用
         }
@@ -98,12 +127,37 @@ AI_CONFIGS = [
         "timeout": int(os.getenv("AI_TIMEOUT", "180")),  # Ollamaはさらに長めに調整
         "max_retries": int(os.getenv("AI_MAX_RETRIES", "3")),
         "retry_delay": int(os.getenv("AI_RETRY_DELAY", "10")),
+        "max_concurrency": int(os.getenv("OLLAMA_MAX_CONCURRENCY", "1")),  # ローカルLLMは直列実行を基本とする
         "extra_params": {
-            "system_prompt": AI_SYSTEM_PROMPT_TEMPLATE  # 統合システムプロンプト使用
+            "system_prompt": AI_SYSTEM_PROMPT_TEMPLATE,  # 統合システムプロンプト使用
+            "keep_alive": os.getenv("OLLAMA_KEEP_ALIVE") or None  # モデルの常駐時間（例: 30m, -1で常駐）
         }
     }
 ]
 
+# Ollamaのウォームアップ（起動時と新着記事の処理前にモデルをロード）
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "false").lower() == "true"
+
+# 長文記事の分割要約設定（map-reduce方式）
+LONG_DOC_THRESHOLD_CHARS = get_optional_int("LONG_DOC_THRESHOLD_CHARS", "12000")  # この文字数を超えると分割要約（空で無効）
+LONG_DOC_CHUNK_CHARS = int(os.getenv("LONG_DOC_CHUNK_CHARS", "6000"))  # 1チャンクの最大文字数
+LONG_DOC_CHUNK_OVERLAP = int(os.getenv("LONG_DOC_CHUNK_OVERLAP", "200"))  # チャンク間の重複文字数
+LONG_DOC_MAX_WORKERS = int(os.getenv("LONG_DOC_MAX_WORKERS", "4"))  # チャンク要約の最大並列数
+LONG_DOC_CHUNK_PROMPT_TEMPLATE = os.getenv(
+    "LONG_DOC_CHUNK_PROMPT_TEMPLATE",
+    "以下は記事「{title}」の一部です。重要な事実・数値・主張を簡潔に箇条書きで抽出してください：\n\n{content}"
+).replace("\\n", "\n")
+LONG_DOC_CACHE_DAYS = int(os.getenv("LONG_DOC_CACHE_DAYS", "3"))  # チャンク要約キャッシュの保持日数
+
+# AI使用量台帳と予算設定
+AI_DAILY_BUDGET = get_optional_float("AI_DAILY_BUDGET")  # 全サービス合計の1日の予算（USD、空で無制限）
+AI_BUDGET_SOFT_LIMIT_RATIO = float(os.getenv("AI_BUDGET_SOFT_LIMIT_RATIO", "0.8"))  # この割合を超えたら安いサービスを優先
+USAGE_LEDGER_RETENTION_DAYS = int(os.getenv("USAGE_LEDGER_RETENTION_DAYS", "30"))  # 使用量台帳の保持日数
+
+# AIルーティング設定（記事の推定トークン数・フィード・言語でサービスとモデルを選択）
+AI_ROUTING_FILE = os.getenv("AI_ROUTING_FILE", "routing.json")
+AI_ROUTING_RULES = load_optional_json(AI_ROUTING_FILE, [])
+
 # Mastodon設定
 MASTODON_INSTANCE_URL = os.getenv("MASTODON_INSTANCE_URL")
 MASTODON_ACCESS_TOKEN = os.getenv("MASTODON_ACCESS_TOKEN")
@@ -113,25 +167,152 @@ CHECK_INTERVAL_MINUTES = int(os.getenv("CHECK_INTERVAL_MINUTES"))
 ARTICLE_RETENTION_DAYS = int(os.getenv("ARTICLE_RETENTION_DAYS"))
 READ_RECORD_RETENTION_DAYS = int(os.getenv("READ_RECORD_RETENTION_DAYS"))
 
+# 定期実行の揺らぎ（複数インスタンスの実行時刻の集中を避ける、秒）
+CHECK_JITTER_SECONDS = int(os.getenv("CHECK_JITTER_SECONDS", "0"))
+
 # 時間帯制限設定
 ENABLE_QUIET_HOURS = os.getenv("ENABLE_QUIET_HOURS", "false").lower() == "true"
 QUIET_HOURS_START = int(os.getenv("QUIET_HOURS_START", "23"))
 QUIET_HOURS_END = int(os.getenv("QUIET_HOURS_END", "7"))
+# 投稿禁止時間帯も取得と要約を続けて投稿キューに貯め、終了時刻から投稿する（falseで時間帯中は何もしない）
+QUIET_HOURS_PREFETCH = os.getenv("QUIET_HOURS_PREFETCH", "true").lower() == "true"
+# 投稿禁止時間帯のチェック間隔（分）と1回のチェックで要約する最大件数
+QUIET_HOURS_CHECK_INTERVAL_MINUTES = int(os.getenv("QUIET_HOURS_CHECK_INTERVAL_MINUTES", "60"))
+QUIET_HOURS_PREFETCH_LIMIT = int(os.getenv("QUIET_HOURS_PREFETCH_LIMIT", "5"))
 
 # Mastodon投稿設定
 POST_TEMPLATE = os.getenv("POST_TEMPLATE", "").replace("\\n", "\n")
 POST_VISIBILITY = os.getenv("POST_VISIBILITY", "direct")  # public, unlisted, private, direct
 
+# 複数アカウントへの投稿設定（フィードごとに投稿先・公開範囲・テンプレートを指定）
+def load_mastodon_accounts():
+    """accounts.jsonから投稿先アカウントを読み込む（ない場合はMASTODON_*の単一アカウント）"""
+    accounts = load_optional_json(MASTODON_ACCOUNTS_FILE, None)
+    if not accounts:
+        return [{
+            "name": "default",
+            "instance_url": MASTODON_INSTANCE_URL,
+            "access_token": MASTODON_ACCESS_TOKEN,
+            "visibility": POST_VISIBILITY,
+            "template": POST_TEMPLATE
+        }]
+    
+    for account in accounts:
+        # トークンはファイルに直接書かず環境変数で渡せるようにする
+        if not account.get("access_token") and account.get("access_token_env"):
+            account["access_token"] = os.getenv(account["access_token_env"])
+        account.setdefault("visibility", POST_VISIBILITY)
+        account.setdefault("template", POST_TEMPLATE)
+        account["template"] = account["template"].replace("\\n", "\n")
+    return accounts
+
+MASTODON_ACCOUNTS_FILE = os.getenv("MASTODON_ACCOUNTS_FILE", "accounts.json")
+MASTODON_ACCOUNTS = load_mastodon_accounts()
+
 # ウェイト設定（秒）
 POST_WAIT = int(os.getenv("POST_WAIT", "60"))  # 投稿処理間の待機時間
 
+# 投稿ペース設定
+# fixed: POST_WAIT秒ごとに投稿、ratelimit: POST_MIN_INTERVAL秒ごとに投稿しサーバーのレート制限に従って待機
+POST_PACING = os.getenv("POST_PACING", "fixed").lower()
+POST_MIN_INTERVAL = int(os.getenv("POST_MIN_INTERVAL", "5"))  # ratelimit時の投稿間の最小間隔（秒）
+POST_RATE_LIMIT_RESERVE = int(os.getenv("POST_RATE_LIMIT_RESERVE", "5"))  # 残り回数がこの値以下でリセットまで待機
+
+# 投稿方式
+# immediate: 投稿間隔に合わせて待機しながら投稿、scheduled: Mastodonの予約投稿として登録し待機せずに終了
+POST_MODE = os.getenv("POST_MODE", "immediate").lower()
+POST_SCHEDULE_SPACING_MINUTES = int(os.getenv("POST_SCHEDULE_SPACING_MINUTES", "10"))  # 予約枠の間隔（分）
+
+# 投稿の再試行設定（一時的な失敗のみ。冪等キーにより再送時の重複投稿は発生しない）
+POST_MAX_ATTEMPTS = int(os.getenv("POST_MAX_ATTEMPTS", "5"))  # 最大試行回数
+POST_RETRY_BASE_DELAY = int(os.getenv("POST_RETRY_BASE_DELAY", "60"))  # 再試行の初回待機秒数（以降は倍々）
+
+# まとめ投稿設定（新着記事が多いときにフィードごとにまとめて要約・投稿）
+DIGEST_THRESHOLD = get_optional_int("DIGEST_THRESHOLD")  # 新着記事がこの件数を超えたらまとめ投稿（空で無効）
+DIGEST_POST_STYLE = os.getenv("DIGEST_POST_STYLE", "single").lower()  # single: 1件の投稿、thread: 要約＋各記事の返信スレッド
+DIGEST_MAX_ARTICLES = int(os.getenv("DIGEST_MAX_ARTICLES", "10"))  # 1つのまとめに含める最大記事数
+DIGEST_ARTICLE_CHARS = int(os.getenv("DIGEST_ARTICLE_CHARS", "1500"))  # まとめ要約に渡す各記事本文の最大文字数
+DIGEST_MAX_POST_CHARS = int(os.getenv("DIGEST_MAX_POST_CHARS", "500"))  # まとめ投稿の最大文字数（超える分のリンクは省略）
+DIGEST_PROMPT_TEMPLATE = os.getenv(
+    "DIGEST_PROMPT_TEMPLATE",
+    "以下は「{title}」です。全体の傾向と主なトピックを140文字以内でまとめてください：\n\n{content}"
+).replace("\\n", "\n")
+DIGEST_POST_TEMPLATE = os.getenv(
+    "DIGEST_POST_TEMPLATE",
+    "【{feed}】新着{count}件のまとめ\n{summary}\n\n{links}"
+).replace("\\n", "\n")
+
 # 記事完全性チェック設定
 MIN_TITLE_LENGTH = int(os.getenv("MIN_TITLE_LENGTH", "3"))  # 最小タイトル長
 MIN_CONTENT_LENGTH = int(os.getenv("MIN_CONTENT_LENGTH", "10"))  # 最小本文長
 
+# フィード追加時の初期化設定
+FEED_BOOTSTRAP = os.getenv("FEED_BOOTSTRAP", "true").lower() == "true"  # 追加したフィードの既存エントリを要約せず既読化
+FEED_BOOTSTRAP_KEEP_LATEST = int(os.getenv("FEED_BOOTSTRAP_KEEP_LATEST", "0"))  # 初期化時に通常処理へ回す最新エントリ数
+
+# 新着記事の優先度設定（フィードごとの重みは feeds.json の priority で指定）
+PRIORITY_HALF_LIFE_HOURS = float(os.getenv("PRIORITY_HALF_LIFE_HOURS", "24"))  # 鮮度スコアが半分になる経過時間
+MAX_ARTICLE_AGE_AT_POST_HOURS = get_optional_float("MAX_ARTICLE_AGE_AT_POST_HOURS")  # 公開からこの時間を超えた記事は要約せずスキップ（空で無制限）
+
+# フィード横断のほぼ重複記事の検出（タイトル＋本文のSimHash）
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "4"))  # 重複とみなす指紋のハミング距離（64bit中）
+DEDUP_RETENTION_DAYS = int(os.getenv("DEDUP_RETENTION_DAYS", "7"))  # 指紋の保持日数
+DEDUP_LINK_TO_ORIGINAL = os.getenv("DEDUP_LINK_TO_ORIGINAL", "false").lower() == "true"  # 重複記事を元記事の投稿への返信で紹介
+DEDUP_LINK_TEMPLATE = os.getenv("DEDUP_LINK_TEMPLATE", "関連記事（{feed}）: {title}\n{url}").replace("\\n", "\n")
+
+# 既存記事が更新された場合の扱い（feeds.json の update_policy でフィードごとに上書き可能）
+# ignore: 何もしない、resummarize: 要約し直して新たに投稿、edit: 要約し直して投稿済みのステータスを編集
+ARTICLE_UPDATE_POLICY = os.getenv("ARTICLE_UPDATE_POLICY", "ignore").lower()
+
+# 設定の再読み込み（デーモン実行中に feeds.json・URL正規化ルール・環境変数ファイルの変更をチェックの合間に反映、SIGHUPで即時反映）
+CONFIG_RELOAD = os.getenv("CONFIG_RELOAD", "true").lower() == "true"
+CONFIG_RELOAD_ENV_FILE = os.getenv("CONFIG_RELOAD_ENV_FILE", ".env")
+# 再起動せずに反映できる環境変数（それ以外の変更は再起動が必要）
+RELOADABLE_SETTINGS = (
+    "CHECK_INTERVAL_MINUTES", "CHECK_JITTER_SECONDS", "ARTICLE_RETENTION_DAYS", "READ_RECORD_RETENTION_DAYS",
+    "ENABLE_QUIET_HOURS", "QUIET_HOURS_START", "QUIET_HOURS_END", "QUIET_HOURS_PREFETCH",
+    "QUIET_HOURS_CHECK_INTERVAL_MINUTES", "QUIET_HOURS_PREFETCH_LIMIT",
+    "POST_PACING", "POST_WAIT", "POST_MIN_INTERVAL", "POST_RATE_LIMIT_RESERVE",
+    "POST_MAX_ATTEMPTS", "POST_RETRY_BASE_DELAY", "POST_SCHEDULE_SPACING_MINUTES",
+    "DIGEST_THRESHOLD", "DIGEST_POST_STYLE", "DIGEST_MAX_ARTICLES", "DIGEST_ARTICLE_CHARS",
+    "DIGEST_MAX_POST_CHARS", "DIGEST_PROMPT_TEMPLATE", "DIGEST_POST_TEMPLATE",
+    "PRIORITY_HALF_LIFE_HOURS", "MAX_ARTICLE_AGE_AT_POST_HOURS", "DEDUP_LINK_TO_ORIGINAL", "DEDUP_LINK_TEMPLATE",
+    "ARTICLE_UPDATE_POLICY", "FEED_BOOTSTRAP", "FEED_BOOTSTRAP_KEEP_LATEST",
+    "URL_CANONICALIZATION", "URL_CANONICALIZATION_RULES_FILE",
+)
+
+# 複数ワーカーでの分散処理（同じ data/ を共有する複数のプロセス・ノードでフィードと記事をリースで分担）
+WORKER_MODE = os.getenv("WORKER_MODE", "false").lower() == "true"
+# ワーカーID（投稿キューのファイル名に使う、未指定時はホスト名とプロセスID）
+WORKER_ID = re.sub(r"[^A-Za-z0-9_-]", "-", os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}")
+LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", "120"))  # ハートビートが途絶えてから他のワーカーが引き継ぐまでの秒数
+LEASE_HEARTBEAT_SECONDS = int(os.getenv("LEASE_HEARTBEAT_SECONDS", "30"))  # リースを延長する間隔（秒）
+
 # 記事遅延処理設定
 FEED_INITIAL_DELAY_MINUTES = int(os.getenv("FEED_INITIAL_DELAY_MINUTES", "5"))  # 新着記事の初期遅延時間（分）
+FEED_FETCH_TIMEOUT = int(os.getenv("FEED_FETCH_TIMEOUT", "30"))  # フィード取得のタイムアウト（秒）
+
+# メトリクス（デーモン実行中に http://<host>:<METRICS_PORT>/metrics でPrometheus形式のテキストを公開、空で無効）
+METRICS_PORT = get_optional_int("METRICS_PORT")
+METRICS_BIND = os.getenv("METRICS_BIND", "0.0.0.0")
+
+# トレース（チェックごとのフィード取得・要約・投稿・保存の処理区間をJSON Lines形式で追記、空で無効）
+TRACE_FILE = os.getenv("TRACE_FILE") or None
+
+# プロファイル（RUN_MODE=profile: data/ のコピーに対してフィードチェックを1回実行し、cProfile・メモリ・処理ごとの時間を出力）
+PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", "profiles")  # 結果の出力先（profile_<日時>/report.txt など）
+PROFILE_STUB_AI = os.getenv("PROFILE_STUB_AI", "true").lower() == "true"  # AIサービスを呼ばずにその場で要約を返す
+PROFILE_STUB_MASTODON = os.getenv("PROFILE_STUB_MASTODON", "true").lower() == "true"  # falseにすると実際に投稿される
+PROFILE_STUB_AI_LATENCY_SECONDS = float(os.getenv("PROFILE_STUB_AI_LATENCY_SECONDS", "0"))  # AIスタブの応答時間（秒）
+PROFILE_FEED_CACHE_DIR = os.getenv("PROFILE_FEED_CACHE_DIR") or None  # 指定時はフィードの応答を保存して次回以降再利用
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "30"))  # レポートに載せる関数・確保箇所の件数
+PROFILE_MEMORY_SAMPLE_SECONDS = float(os.getenv("PROFILE_MEMORY_SAMPLE_SECONDS", "1"))  # メモリのスナップショット間隔（秒）
+PROFILE_MEMORY_FRAMES = int(os.getenv("PROFILE_MEMORY_FRAMES", "1"))  # 確保箇所として記録する呼び出し履歴の深さ
 
 # ログ設定
 LOG_LEVEL = os.getenv("LOG_LEVEL")
 LOG_TO_FILE = os.getenv("LOG_TO_FILE", "false").lower() == "true"
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # ログファイルを切り替えるサイズ（バイト）
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "7"))  # 保持する切り替え済みログファイルの数
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "true").lower() == "true"  # 切り替え済みログファイルをgzip圧縮
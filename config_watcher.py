@@ -0,0 +1,60 @@
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def read_env_file(path: str) -> Dict[str, str]:
+    """KEY=VALUE 形式の環境変数ファイルを読み込む（コメント行・空行は無視し、値を囲む引用符は外す）"""
+    values = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            key = key.strip()
+            if key.startswith("export "):
+                key = key[len("export "):].strip()
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in ("'", '"'):
+                value = value[1:-1]
+            values[key] = value
+    return values
+
+
+class ConfigWatcher:
+    """
+    設定ファイルの更新を更新日時とサイズで検出するクラス
+
+    チェックの合間に poll() を呼び出して使う（inotify等に依存しないため、Dockerのバインドマウントでも動作する）
+    """
+
+    def __init__(self, paths: List[str]):
+        """
+        Args:
+            paths: 監視するファイルのパス（存在しないファイルは作成されたときに変更として検出）
+        """
+        self.paths = [Path(path) for path in paths]
+        self._stamps: Dict[Path, Optional[Tuple[int, int]]] = {path: self._stamp(path) for path in self.paths}
+
+    @staticmethod
+    def _stamp(path: Path) -> Optional[Tuple[int, int]]:
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def poll(self) -> List[Path]:
+        """前回の確認以降に変更・作成・削除されたファイルを返す"""
+        changed = []
+        for path in self.paths:
+            stamp = self._stamp(path)
+            if stamp != self._stamps[path]:
+                self._stamps[path] = stamp
+                changed.append(path)
+        if changed:
+            logger.debug(f"設定ファイルの変更を検出: {', '.join(str(path) for path in changed)}")
+        return changed
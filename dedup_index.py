@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+_HTML_TAG = re.compile(r"<[^>]+>")
+_NON_WORD = re.compile(r"[\W_]+")
+
+SIMHASH_BITS = 64
+
+
+def normalize_text(text: str) -> str:
+    """HTMLタグ・記号・空白を除去して小文字化"""
+    return _NON_WORD.sub("", _HTML_TAG.sub(" ", text)).lower()
+
+
+def simhash(title: str, content: str, shingle_size: int = 3, max_chars: int = 3000,
+            min_shingles: int = 20) -> Optional[int]:
+    """
+    タイトルと本文の文字n-gramから64bitのSimHashを計算
+
+    言語に依存しないよう文字単位のシングルを使う。シングルが少なすぎる短文はNone
+    """
+    text = normalize_text(f"{title} {content}")[:max_chars]
+    shingles = {text[i:i + shingle_size] for i in range(len(text) - shingle_size + 1)}
+    if len(shingles) < min_shingles:
+        return None
+
+    counts = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            counts[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, count in enumerate(counts):
+        if count > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+class NearDuplicateIndex:
+    """
+    SimHashとLSHバケットによるほぼ重複記事のインデックス
+
+    指紋を max_distance + 1 個の帯に分割して帯ごとにバケット化する。ハミング距離が
+    max_distance 以下の指紋は鳩の巣原理によりどれかの帯が一致するため、候補はバケット参照だけで得られる
+    """
+
+    def __init__(self, index_file: str = "data/dedup_index.json", retention_days: int = 7, max_distance: int = 3,
+                 file_lock=None):
+        """
+        Args:
+            file_lock: 複数のワーカーでファイルを共有する場合のプロセス間ロック（指定時は保存時に他のワーカーの登録とマージ）
+        """
+        self.index_file = Path(index_file)
+        self.file_lock = file_lock
+        self.retention_days = retention_days
+        self.max_distance = max_distance
+        self._bands = self._band_layout(max_distance + 1)
+        self._lock = threading.Lock()
+        # 記事ID -> {"h": 指紋, "t": 登録日時}
+        self._entries: Dict[str, dict] = self._load()
+        self._buckets: Dict[Tuple[int, int], Set[str]] = defaultdict(set)
+        self._build_buckets()
+
+    @staticmethod
+    def _band_layout(band_count: int) -> List[Tuple[int, int]]:
+        """64bitを帯に分割した (開始bit, マスク) の一覧"""
+        layout = []
+        start = 0
+        for i in range(band_count):
+            width = SIMHASH_BITS // band_count + (1 if i < SIMHASH_BITS % band_count else 0)
+            layout.append((start, (1 << width) - 1))
+            start += width
+        return layout
+
+    def _band_keys(self, fingerprint: int) -> List[Tuple[int, int]]:
+        return [(i, fingerprint >> start & mask) for i, (start, mask) in enumerate(self._bands)]
+
+    def _build_buckets(self):
+        """登録済みの指紋からバケットを構築"""
+        self._buckets.clear()
+        for article_id, entry in self._entries.items():
+            for key in self._band_keys(entry["h"]):
+                self._buckets[key].add(article_id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def find_duplicate(self, fingerprint: Optional[int], exclude_id: Optional[str] = None) -> Optional[str]:
+        """ほぼ重複する登録済み記事のIDを返す（最も距離が近いもの、exclude_idの記事自身は除く）"""
+        if fingerprint is None:
+            return None
+        with self._lock:
+            candidates = set()
+            for key in self._band_keys(fingerprint):
+                candidates |= self._buckets.get(key, set())
+
+            best_id, best_distance = None, self.max_distance + 1
+            for article_id in candidates:
+                if article_id == exclude_id:
+                    continue
+                distance = bin(self._entries[article_id]["h"] ^ fingerprint).count("1")
+                if distance < best_distance:
+                    best_id, best_distance = article_id, distance
+            return best_id
+
+    def add(self, article_id: str, fingerprint: Optional[int]):
+        """記事の指紋を登録"""
+        if fingerprint is None:
+            return
+        with self._lock:
+            if article_id in self._entries:
+                return
+            self._entries[article_id] = {"h": fingerprint, "t": datetime.now(timezone.utc).isoformat()}
+            for key in self._band_keys(fingerprint):
+                self._buckets[key].add(article_id)
+
+    def rekey(self, id_map: Dict[str, str]):
+        """記事IDの変更を反映（URL正規化の移行用）"""
+        with self._lock:
+            for old_id, new_id in id_map.items():
+                entry = self._entries.pop(old_id, None)
+                if entry and new_id not in self._entries:
+                    self._entries[new_id] = entry
+            self._build_buckets()
+
+    def refresh(self):
+        """他のワーカーが登録した指紋をファイルから取り込む"""
+        entries = self._load()
+        with self._lock:
+            added = {article_id: entry for article_id, entry in entries.items() if article_id not in self._entries}
+            for article_id, entry in added.items():
+                self._entries[article_id] = entry
+                for key in self._band_keys(entry["h"]):
+                    self._buckets[key].add(article_id)
+
+    def save(self):
+        """インデックスをファイルに保存"""
+        if self.file_lock is None:
+            self._write()
+            return
+        with self.file_lock:
+            self.refresh()
+            self._write()
+
+    def _write(self):
+        with self._lock:
+            data = {article_id: {"h": format(entry["h"], "x"), "t": entry["t"]} for article_id, entry in self._entries.items()}
+        try:
+            self.index_file.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = self.index_file.with_name(f"{self.index_file.name}.{os.getpid()}.tmp")
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(temp_file, self.index_file)
+        except Exception as e:
+            logger.warning(f"重複検出インデックス保存エラー: {e}")
+
+    def _load(self) -> Dict[str, dict]:
+        """インデックスを読み込み、保持期間を過ぎたエントリを除外"""
+        if not self.index_file.exists():
+            return {}
+
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"重複検出インデックス読み込みエラー: {e}")
+            return {}
+
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+        entries = {}
+        for article_id, entry in data.items():
+            try:
+                if datetime.fromisoformat(entry["t"]) >= cutoff:
+                    entries[article_id] = {"h": int(entry["h"], 16), "t": entry["t"]}
+            except (KeyError, ValueError, TypeError):
+                continue
+        return entries
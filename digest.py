@@ -0,0 +1,46 @@
+import hashlib
+from collections import OrderedDict
+from typing import List, Tuple
+from models import FeedItem
+
+
+def group_articles(articles: List[FeedItem], max_per_group: int = 10) -> List[Tuple[str, List[FeedItem]]]:
+    """記事をフィードごとにまとめ、max_per_group件ずつのグループに分割（フィードの出現順を維持）"""
+    by_feed: "OrderedDict[str, List[FeedItem]]" = OrderedDict()
+    for article in articles:
+        by_feed.setdefault(article.source_feed, []).append(article)
+
+    groups = []
+    for feed, feed_articles in by_feed.items():
+        for start in range(0, len(feed_articles), max_per_group):
+            groups.append((feed, feed_articles[start:start + max_per_group]))
+    return groups
+
+
+def make_digest_id(articles: List[FeedItem]) -> str:
+    """グループの記事IDから決まるダイジェストID（冪等キーの元になるため再実行でも同じ値）"""
+    source = "\0".join(article.id for article in articles)
+    return "digest-" + hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+
+def build_digest_content(articles: List[FeedItem], per_article_chars: int = 1500) -> str:
+    """まとめ要約用に各記事のタイトルと本文の冒頭を連結"""
+    sections = []
+    for i, article in enumerate(articles, 1):
+        sections.append(f"[{i}] {article.title}\n{article.content[:per_article_chars]}")
+    return "\n\n".join(sections)
+
+
+def format_digest_post(template: str, feed: str, summary: str, articles: List[FeedItem],
+                       max_chars: int = 500, include_links: bool = True) -> str:
+    """まとめ投稿の本文を作成（文字数上限を超える場合はリンクを末尾から省略）"""
+    links = [f"・{article.title}\n{article.url}" for article in articles] if include_links else []
+    for shown in range(len(links), -1, -1):
+        omitted = len(links) - shown
+        link_text = "\n".join(links[:shown])
+        if omitted:
+            link_text += f"\nほか{omitted}件"
+        content = template.format(feed=feed, count=len(articles), summary=summary, links=link_text.strip()).strip()
+        if len(content) <= max_chars:
+            return content
+    return content[:max_chars]
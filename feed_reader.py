@@ -1,14 +1,39 @@
+import time
+import logging
 import feedparser
+import requests
 from datetime import datetime, timedelta, timezone
-from typing import List
+from typing import List, Optional
 from models import FeedItem, FeedSource
 import hashlib
-from config import MIN_TITLE_LENGTH, MIN_CONTENT_LENGTH, FEED_INITIAL_DELAY_MINUTES
+from config import MIN_TITLE_LENGTH, MIN_CONTENT_LENGTH, FEED_INITIAL_DELAY_MINUTES, FEED_FETCH_TIMEOUT
+from url_canonicalizer import UrlCanonicalizer
+from dedup_index import normalize_text
+from metrics import FEED_FETCH_SECONDS, FEED_FETCH_BYTES, FEED_FETCH_ERRORS
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+def content_fingerprint(title: str, content: str) -> str:
+    """正規化したタイトルと本文のハッシュ（HTMLや空白だけの変更では変わらない）"""
+    source = normalize_text(title) + "\0" + normalize_text(content)
+    return hashlib.blake2b(source.encode("utf-8"), digest_size=8).hexdigest()
 
 
 class FeedReader:
     """RSSフィードを読み取り、記事を取得するクラス"""
     
+    def __init__(self, canonicalizer: Optional[UrlCanonicalizer] = None):
+        # 指定時は正規化したURLから記事IDを生成（トラッキングパラメータ等の表記ゆれで重複しない）
+        self.canonicalizer = canonicalizer
+    
+    def make_article_id(self, url: str, feed_name: Optional[str] = None) -> str:
+        """記事URLから一意IDを生成"""
+        if self.canonicalizer:
+            return self.canonicalizer.article_id(url, feed_name)
+        return hashlib.md5(url.encode()).hexdigest()
+    
     def _is_article_too_new(self, published_time: datetime, delay_minutes: int = None) -> bool:
         """記事が新しすぎるかチェック（遅延処理が必要か）"""
         if delay_minutes is None:
@@ -49,17 +74,40 @@ class FeedReader:
     
     def fetch_feed_items(self, feed_source: FeedSource) -> List[FeedItem]:
         """指定されたフィードから記事を取得"""
+        with span("feed.fetch", feed=feed_source.name, url=feed_source.url) as trace:
+            return self._fetch_feed_items(feed_source, trace)
+    
+    def _fetch_feed_items(self, feed_source: FeedSource, trace) -> List[FeedItem]:
+        started = time.perf_counter()
         try:
-            feed = feedparser.parse(feed_source.url)
+            # 取得バイト数を計測するためHTTPは requests で取得し、解析だけを feedparser で行う
+            response = requests.get(
+                feed_source.url,
+                timeout=FEED_FETCH_TIMEOUT,
+                headers={"User-Agent": "tsukino-feedbot (+https://github.com/ahera1/tsukino_feedbot)"}
+            )
+            response.raise_for_status()
+            FEED_FETCH_BYTES.inc(feed_source.name, amount=len(response.content))
+            trace.set_attribute("bytes", len(response.content))
+            trace.set_attribute("http_status", response.status_code)
+            feed = feedparser.parse(
+                response.content,
+                response_headers={**response.headers, "content-location": response.url}
+            )
             
             if feed.bozo:
-                print(f"フィード解析警告 ({feed_source.name}): {feed.bozo_exception}")
+                logger.warning(f"フィード解析警告 ({feed_source.name}): {feed.bozo_exception}")
             
+            # エントリごとの判定は DEBUG で出力し、件数だけをまとめて INFO で出力
+            debug_enabled = logger.isEnabledFor(logging.DEBUG)
+            incomplete = delayed = 0
             items = []
             for entry in feed.entries:
                 # 完全性チェック
                 if not self._is_article_complete(entry):
-                    print(f"不完全な記事をスキップ: {getattr(entry, 'link', 'URL不明')}")
+                    incomplete += 1
+                    if debug_enabled:
+                        logger.debug("不完全な記事をスキップ: %s", getattr(entry, 'link', 'URL不明'))
                     continue
                 
                 # 公開日時の取得
@@ -67,11 +115,13 @@ class FeedReader:
                 
                 # 新しすぎる記事の遅延処理チェック
                 if self._is_article_too_new(published):
-                    print(f"新しすぎる記事を遅延: {getattr(entry, 'title', 'タイトル不明')} (公開: {published})")
+                    delayed += 1
+                    if debug_enabled:
+                        logger.debug("新しすぎる記事を遅延: %s (公開: %s)", getattr(entry, 'title', 'タイトル不明'), published)
                     continue
                 
                 # 記事の一意IDを生成（URLベース）
-                article_id = hashlib.md5(entry.link.encode()).hexdigest()
+                article_id = self.make_article_id(entry.link, feed_source.name)
                 
                 # 内容の取得
                 content = self._extract_content(entry)
@@ -82,16 +132,23 @@ class FeedReader:
                     content=content,
                     url=entry.link,
                     published=published,
-                    source_feed=feed_source.name
+                    source_feed=feed_source.name,
+                    fingerprint=content_fingerprint(entry.title, content)
                 )
                 items.append(feed_item)
             
-            print(f"{feed_source.name}: {len(items)}件の記事を取得")
+            logger.info(f"{feed_source.name}: {len(items)}件の記事を取得 (不完全{incomplete}件, 遅延{delayed}件)")
+            trace.set_attribute("entries", len(feed.entries))
+            trace.set_attribute("items", len(items))
             return items
             
         except Exception as e:
-            print(f"フィード取得エラー ({feed_source.name}): {e}")
+            logger.error(f"フィード取得エラー ({feed_source.name}): {e}")
+            FEED_FETCH_ERRORS.inc(feed_source.name)
+            trace.record_error(e)
             return []
+        finally:
+            FEED_FETCH_SECONDS.observe(feed_source.name, value=time.perf_counter() - started)
     
     def _parse_published_date(self, entry) -> datetime:
         """記事の公開日時を解析"""
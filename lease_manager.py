@@ -0,0 +1,243 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+
+class FileLock:
+    """
+    プロセス間で共有するファイルロック（同じプロセス内では再入可能）
+
+    ロックはファイル記述子に結び付くため、プロセスが異常終了しても自動的に解放される
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                if fcntl:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+                else:
+                    while True:
+                        try:
+                            msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            continue
+            except Exception:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                if fcntl:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+        self._thread_lock.release()
+        return False
+
+
+class LeaseManager:
+    """
+    複数のワーカーで作業を分担するための期限付きリース
+
+    リースは共有データディレクトリの leases.json に {キー: {"owner": ワーカーID, "expires_at": UNIX時刻}} で保存する。
+    保持中のリースはハートビートで延長し、ワーカーが停止すると期限切れで他のワーカーが引き継げる。
+    期限はノード間で比較するため、各ノードの時計のずれはTTLより十分小さいこと
+    """
+
+    WORKER_PREFIX = "worker:"
+
+    def __init__(self, lease_file: str, lock: FileLock, worker_id: str, ttl_seconds: float = 120):
+        self.lease_file = Path(lease_file)
+        self.lock = lock
+        self.worker_id = worker_id
+        self.ttl_seconds = ttl_seconds
+        self._held: Set[str] = set()
+        self._held_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    @property
+    def worker_key(self) -> str:
+        return f"{self.WORKER_PREFIX}{self.worker_id}"
+
+    def _read(self) -> Dict[str, dict]:
+        """期限切れを除いたリース一覧を読み込む（ロック取得中に呼び出す）"""
+        if not self.lease_file.exists():
+            return {}
+        try:
+            with open(self.lease_file, 'r', encoding='utf-8') as f:
+                leases = json.load(f)
+        except Exception as e:
+            logger.warning(f"リースファイル読み込みエラー: {e}")
+            return {}
+        now = time.time()
+        return {key: lease for key, lease in leases.items() if lease.get("expires_at", 0) > now}
+
+    def _write(self, leases: Dict[str, dict]):
+        """リース一覧を保存（ロック取得中に呼び出す）"""
+        temp_file = self.lease_file.with_name(f"{self.lease_file.name}.{os.getpid()}.tmp")
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(leases, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.lease_file)
+
+    def _grant(self, leases: Dict[str, dict], key: str):
+        leases[key] = {"owner": self.worker_id, "expires_at": time.time() + self.ttl_seconds}
+        with self._held_lock:
+            self._held.add(key)
+
+    def acquire(self, key: str) -> bool:
+        """リースを取得（他のワーカーが有効なリースを持つ場合はFalse、自分が持つ場合は延長）"""
+        with self.lock:
+            leases = self._read()
+            lease = leases.get(key)
+            if lease and lease["owner"] != self.worker_id:
+                return False
+            self._grant(leases, key)
+            self._write(leases)
+            return True
+
+    def release(self, key: str):
+        """保持しているリースを解放"""
+        self.release_many([key])
+
+    def release_many(self, keys: Iterable[str]):
+        """保持しているリースをまとめて解放"""
+        keys = set(keys)
+        with self._held_lock:
+            self._held -= keys
+        with self.lock:
+            leases = self._read()
+            for key in keys:
+                if key in leases and leases[key]["owner"] == self.worker_id:
+                    del leases[key]
+            self._write(leases)
+
+    def is_held(self, key: str) -> bool:
+        """いずれかのワーカーが有効なリースを持っているか"""
+        with self.lock:
+            return key in self._read()
+
+    def live_workers(self) -> List[str]:
+        """ハートビートが途絶えていないワーカーのID"""
+        with self.lock:
+            leases = self._read()
+        return sorted(lease["owner"] for key, lease in leases.items() if key.startswith(self.WORKER_PREFIX))
+
+    def claim_shard(self, prefix: str, names: List[str]) -> Set[str]:
+        """
+        作業単位を生存ワーカー数で均等に分担し、自分の担当分のリースを取得・延長
+
+        担当数を超えて保持している分は解放し、新しく参加したワーカーが引き継げるようにする
+
+        Returns:
+            自分が担当する作業単位の名前
+        """
+        with self.lock:
+            leases = self._read()
+            workers = {lease["owner"] for key, lease in leases.items() if key.startswith(self.WORKER_PREFIX)}
+            workers.add(self.worker_id)
+            share = math.ceil(len(names) / len(workers)) if names else 0
+
+            mine = [name for name in names if leases.get(prefix + name, {}).get("owner") == self.worker_id]
+            for name in mine[share:]:
+                del leases[prefix + name]
+                with self._held_lock:
+                    self._held.discard(prefix + name)
+            mine = mine[:share]
+
+            for name in names:
+                if len(mine) >= share:
+                    break
+                if prefix + name not in leases:
+                    mine.append(name)
+
+            for name in mine:
+                self._grant(leases, prefix + name)
+            self._write(leases)
+        return set(mine)
+
+    def renew(self):
+        """保持中のリースをすべて延長（他のワーカーに取られたリースは保持一覧から外す）"""
+        with self._held_lock:
+            held = set(self._held)
+        if not held:
+            return
+        with self.lock:
+            leases = self._read()
+            lost = []
+            for key in held:
+                lease = leases.get(key)
+                if lease and lease["owner"] != self.worker_id:
+                    lost.append(key)
+                    continue
+                self._grant(leases, key)
+            self._write(leases)
+        if lost:
+            with self._held_lock:
+                self._held -= set(lost)
+            logger.warning(f"期限切れの間に他のワーカーへ移ったリース: {', '.join(sorted(lost))}")
+
+    def start(self, heartbeat_seconds: float):
+        """ワーカーのリースを取得し、ハートビートのスレッドを開始"""
+        self.acquire(self.worker_key)
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._run_heartbeat, args=(heartbeat_seconds,),
+                                           name="lease-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def stop(self):
+        """ハートビートを止め、保持中のリースをすべて解放"""
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.join(timeout=5)
+            self._heartbeat = None
+        with self._held_lock:
+            held = set(self._held)
+        if held:
+            self.release_many(held)
+
+    def _run_heartbeat(self, heartbeat_seconds: float):
+        while not self._stop.wait(heartbeat_seconds):
+            try:
+                self.renew()
+                # 長時間停止してワーカーのリースが失効した場合は取り直す
+                with self._held_lock:
+                    lost_worker_key = self.worker_key not in self._held
+                if lost_worker_key:
+                    self.acquire(self.worker_key)
+            except Exception as e:
+                logger.warning(f"リースの延長エラー: {e}")
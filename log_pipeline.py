@@ -0,0 +1,67 @@
+import atexit
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+from typing import List, Optional
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _gzip_namer(name: str) -> str:
+    return name + ".gz"
+
+
+def _gzip_rotator(source: str, dest: str):
+    """切り替えたログファイルをgzip圧縮して保存"""
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class CompressedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """サイズでログファイルを切り替え、古いファイルを feedbot.log.1.gz のように圧縮して保持するハンドラー"""
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int, compress: bool = True):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        if compress:
+            self.namer = _gzip_namer
+            self.rotator = _gzip_rotator
+
+
+def start_queue_logging(handlers: List[logging.Handler], level: int):
+    """
+    ルートロガーの出力をキュー経由にし、コンソール・ファイルへの書き込みをバックグラウンドのスレッドで行う
+
+    ログを出力する側はキューに積むだけで戻るため、コンソールやディスクの書き込み待ちが処理を止めない。
+    レベル未満のログはロガーの時点で捨てられ、キューにも積まれない
+    """
+    global _listener
+    stop_queue_logging()
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+
+    log_queue = queue.SimpleQueue()
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_queue_logging():
+    """キューに残ったログを書き出してバックグラウンドのスレッドを止める"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+# 終了時にキューに残ったログを書き出す
+atexit.register(stop_queue_logging)
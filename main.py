@@ -5,11 +5,14 @@ Tsukino Feedbot - AIを活用したフィード要約・Mastodon投稿ボット
 
 import os
 import sys
+import importlib
 import time
 import signal
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import List
+from typing import Dict, List, Optional
 from pathlib import Path
 
 # 設定の読み込みを試行
@@ -23,13 +26,31 @@ except ImportError:
 from storage import DataStorage
 from feed_reader import FeedReader
 from ai_service import create_ai_service_manager
+from ai_chunking import ChunkSummaryCache
+from ai_router import AIRouter
+from usage_ledger import UsageLedger
 from mastodon_service import MastodonService
-from models import FeedItem, FeedSource
+from post_scheduler import PostScheduler
+from quiet_hours import is_quiet_hour
+from scheduler import CycleScheduler
+from config_watcher import ConfigWatcher, read_env_file
+from lease_manager import LeaseManager
+from metrics import (
+    start_metrics_server, FEED_ENTRIES_SEEN, FEED_ENTRIES_NEW, CYCLE_SECONDS, LAST_CYCLE_TIMESTAMP
+)
+from tracing import TRACER, span, current_span, propagate
+from log_pipeline import CompressedRotatingFileHandler, start_queue_logging
+from profiler import run_profile
+from article_priority import ArticleBacklog
+from dedup_index import NearDuplicateIndex, simhash
+from url_canonicalizer import UrlCanonicalizer
+from digest import group_articles, make_digest_id, build_digest_content, format_digest_post
+from models import FeedItem, FeedSource, MastodonAccount
 
 
 def setup_logging():
     """ログ設定を初期化"""
-    log_level = getattr(config, 'LOG_LEVEL', 'INFO')
+    log_level = getattr(config, 'LOG_LEVEL', None) or 'INFO'
     log_to_file = getattr(config, 'LOG_TO_FILE', False)
     
     # ログレベルの設定
@@ -41,38 +62,35 @@ def setup_logging():
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     
-    # ルートロガーの設定
-    root_logger = logging.getLogger()
-    root_logger.setLevel(level)
-    
-    # 既存のハンドラーをクリア
-    for handler in root_logger.handlers[:]:
-        root_logger.removeHandler(handler)
-    
     # コンソールハンドラーの設定（常に追加）
     console_handler = logging.StreamHandler()
     console_handler.setLevel(level)
     console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
+    handlers = [console_handler]
     
     # ファイルハンドラーの設定（設定で有効な場合のみ）
     if log_to_file:
         # logsディレクトリが存在しない場合は作成
         logs_dir = Path('logs')
         logs_dir.mkdir(exist_ok=True)
+        log_filepath = logs_dir / "feedbot.log"
         
-        # ログファイル名（日付付き）
-        log_filename = f"feedbot_{datetime.now(timezone.utc).strftime('%Y%m%d')}.log"
-        log_filepath = logs_dir / log_filename
-        
-        # ファイルハンドラーの作成
-        file_handler = logging.FileHandler(log_filepath, encoding='utf-8')
+        # サイズで切り替え、古いファイルはgzip圧縮して保持
+        file_handler = CompressedRotatingFileHandler(
+            str(log_filepath),
+            max_bytes=getattr(config, 'LOG_MAX_BYTES', 10 * 1024 * 1024),
+            backup_count=getattr(config, 'LOG_BACKUP_COUNT', 7),
+            compress=getattr(config, 'LOG_COMPRESS', True)
+        )
         file_handler.setLevel(level)
         file_handler.setFormatter(formatter)
-        root_logger.addHandler(file_handler)
+        handlers.append(file_handler)
         
         print(f"ログファイル: {log_filepath}")
     
+    # 書き込みはキュー経由でバックグラウンドのスレッドが行う
+    start_queue_logging(handlers, level)
+    
     # 外部ライブラリのログレベル調整
     logging.getLogger('requests').setLevel(logging.WARNING)
     logging.getLogger('urllib3').setLevel(logging.WARNING)
@@ -86,25 +104,216 @@ def setup_logging():
 class FeedBot:
     """フィードボットのメインクラス"""
     
-    def __init__(self):
+    def __init__(self, data_dir: str = "data"):
         self.logger = logging.getLogger(__name__)
-        self.storage = DataStorage()
-        self.feed_reader = FeedReader()
-        self.ai_service = create_ai_service_manager(config.AI_CONFIGS)
-        self.mastodon_service = MastodonService(
-            config.MASTODON_INSTANCE_URL,
-            config.MASTODON_ACCESS_TOKEN
+        # ワーカーモードでは data/ を共有する他のワーカーとフィード・記事をリースで分担
+        self.worker_id = config.WORKER_ID if getattr(config, 'WORKER_MODE', False) else None
+        self.storage = DataStorage(data_dir, worker_id=self.worker_id)
+        self.lease_manager = None
+        if self.worker_id:
+            self.lease_manager = LeaseManager(
+                str(self.storage.data_dir / "leases.json"),
+                self.storage.lock,
+                self.worker_id,
+                ttl_seconds=getattr(config, 'LEASE_TTL_SECONDS', 120)
+            )
+            self.lease_manager.start(getattr(config, 'LEASE_HEARTBEAT_SECONDS', 30))
+            print(f"ワーカーモードで起動しました (ワーカーID: {self.worker_id})")
+        # チェックごとの処理区間をJSON Lines形式で記録（trace_report.py で集計）
+        trace_file = getattr(config, 'TRACE_FILE', None)
+        if trace_file:
+            TRACER.configure(trace_file)
+            print(f"トレース出力: {trace_file}")
+        self.canonicalizer = self._create_canonicalizer()
+        self.feed_reader = FeedReader(self.canonicalizer)
+        self.usage_ledger = UsageLedger(
+            str(self.storage.data_dir / "usage_ledger.jsonl"),
+            retention_days=getattr(config, 'USAGE_LEDGER_RETENTION_DAYS', 30),
+            # ワーカーモードでは他のワーカーの使用額も予算に含める
+            file_lock=self.storage.lock if self.worker_id else None
+        )
+        self.ai_service = create_ai_service_manager(
+            config.AI_CONFIGS,
+            long_doc_threshold=getattr(config, 'LONG_DOC_THRESHOLD_CHARS', None),
+            long_doc_chunk_size=getattr(config, 'LONG_DOC_CHUNK_CHARS', 6000),
+            long_doc_chunk_overlap=getattr(config, 'LONG_DOC_CHUNK_OVERLAP', 200),
+            long_doc_max_workers=getattr(config, 'LONG_DOC_MAX_WORKERS', 4),
+            long_doc_chunk_prompt=getattr(config, 'LONG_DOC_CHUNK_PROMPT_TEMPLATE', None),
+            chunk_cache=ChunkSummaryCache(
+                str(self.storage.data_dir / "chunk_cache.jsonl"),
+                retention_days=getattr(config, 'LONG_DOC_CACHE_DAYS', 3)
+            ),
+            router=AIRouter.from_dicts(getattr(config, 'AI_ROUTING_RULES', None) or []),
+            usage_ledger=self.usage_ledger,
+            daily_budget=getattr(config, 'AI_DAILY_BUDGET', None),
+            budget_soft_limit_ratio=getattr(config, 'AI_BUDGET_SOFT_LIMIT_RATIO', 0.8)
         )
         
+        # 投稿先アカウントごとにMastodonサービスと投稿キューを用意（要約は1回だけ生成して各アカウントに配信）
+        self.accounts = [MastodonAccount(**account) for account in self._load_account_configs()]
+        self.mastodon_services: Dict[str, MastodonService] = {}
+        self.post_schedulers: Dict[str, PostScheduler] = {}
+        for account in self.accounts:
+            service = MastodonService(account.instance_url, account.access_token)
+            self.mastodon_services[account.name] = service
+            self.post_schedulers[account.name] = PostScheduler(
+                service,
+                self.storage,
+                min_interval=self._get_post_interval(),
+                rate_limit_reserve=getattr(config, 'POST_RATE_LIMIT_RESERVE', 5),
+                max_attempts=getattr(config, 'POST_MAX_ATTEMPTS', 5),
+                retry_base_delay=getattr(config, 'POST_RETRY_BASE_DELAY', 60),
+                mode=getattr(config, 'POST_MODE', 'immediate'),
+                schedule_spacing=getattr(config, 'POST_SCHEDULE_SPACING_MINUTES', 10) * 60,
+                quiet_hours=self._quiet_hours_setting(),
+                account=account.name
+            )
+        
+        # フィード横断のほぼ重複記事の検出
+        self.dedup_index = None
+        if getattr(config, 'DEDUP_ENABLED', True):
+            self.dedup_index = NearDuplicateIndex(
+                str(self.storage.data_dir / "dedup_index.json"),
+                retention_days=getattr(config, 'DEDUP_RETENTION_DAYS', 7),
+                max_distance=getattr(config, 'DEDUP_MAX_DISTANCE', 4),
+                file_lock=self.storage.lock if self.worker_id else None
+            )
+        
+        # 投稿結果の反映は複数アカウントのスレッドから行うためロックで保護
+        self._articles_lock = threading.Lock()
+        
         # 中断フラグ（シグナル受信時に設定）
         self.shutdown_requested = False
         
+        # 定期実行のスケジューラー（待機中でもシグナル受信で即座に起床）
+        self.cycle_scheduler = CycleScheduler(config.CHECK_INTERVAL_MINUTES * 60)
+        self._apply_runtime_settings()
+        
+        # 設定ファイルの変更を検出してチェックの合間に反映（SIGHUPで即時反映）
+        self.reload_requested = False
+        self.config_watcher = None
+        if getattr(config, 'CONFIG_RELOAD', True):
+            self.config_watcher = ConfigWatcher([
+                'feeds.json',
+                getattr(config, 'URL_CANONICALIZATION_RULES_FILE', 'url_rules.json'),
+                getattr(config, 'CONFIG_RELOAD_ENV_FILE', '.env')
+            ])
+        
         # 初回起動時にフィードソースを設定から読み込み
         self._initialize_feed_sources()
         
+        # URL正規化ルールが変わった場合は保存済みの記事IDを移行
+        with self.storage.lock:
+            self._migrate_article_ids()
+        
         # シグナルハンドラーの設定
         signal.signal(signal.SIGTERM, self._handle_shutdown_signal)
         signal.signal(signal.SIGINT, self._handle_shutdown_signal)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self._handle_reload_signal)
+    
+    def _create_canonicalizer(self) -> Optional[UrlCanonicalizer]:
+        """URL正規化を作成（ルールファイルの feeds と feeds.json の url_rules をフィード別ルールとして使用）"""
+        if not getattr(config, 'URL_CANONICALIZATION', True):
+            return None
+        rules = getattr(config, 'URL_CANONICALIZATION_RULES', None) or {}
+        feed_rules = dict(rules.get("feeds", {}))
+        for feed_config in config.FEED_URLS:
+            if feed_config.get("url_rules"):
+                feed_rules[feed_config["name"]] = feed_config["url_rules"]
+        return UrlCanonicalizer(rules.get("default"), feed_rules)
+    
+    def _migrate_article_ids(self):
+        """
+        保存済み記事のIDを現在のURL正規化ルールで付け直す
+        
+        同じ記事に正規化される複数の記録は1件にまとめ（投稿済み・処理済みのものを優先）、
+        未送信の投稿待ちキューと重複検出インデックスのIDも合わせて更新する。
+        ワーカーモードでは storage.lock を取得した状態で呼び出す
+        """
+        meta = self.storage.load_meta()
+        signature = self.canonicalizer.signature if self.canonicalizer else "raw"
+        if meta.get("article_id_signature") == signature:
+            return
+        
+        articles = self.storage.load_articles()
+        id_map = {}
+        merged: Dict[str, FeedItem] = {}
+        # 投稿済み・処理済みの記録を優先して残す
+        for article in sorted(articles, key=lambda a: (not a.posted_to_mastodon, not a.processed)):
+            new_id = self.feed_reader.make_article_id(article.url, article.source_feed)
+            if new_id != article.id:
+                id_map[article.id] = new_id
+            if new_id not in merged:
+                article.id = new_id
+                merged[new_id] = article
+        
+        if id_map or len(merged) != len(articles):
+            remaining = list(merged.values())
+            for article in remaining:
+                if article.duplicate_of in id_map:
+                    article.duplicate_of = id_map[article.duplicate_of]
+            self.storage.save_articles(remaining, replace=True)
+            
+            # 送信を試みた投稿は冪等キーを変えないよう元のIDのまま残す
+            for scheduler in self.post_schedulers.values():
+                changed = False
+                rekeyed = {}
+                for post in scheduler.queue:
+                    if post.attempts == 0 and post.article_id in id_map:
+                        rekeyed[post.article_id] = post.article_id = id_map[post.article_id]
+                        changed = True
+                for post in scheduler.queue:
+                    if post.reply_to in rekeyed:
+                        post.reply_to = rekeyed[post.reply_to]
+                        changed = True
+                    if any(article_id in id_map for article_id in post.related_article_ids):
+                        post.related_article_ids = [id_map.get(article_id, article_id) for article_id in post.related_article_ids]
+                        changed = True
+                if changed:
+                    self.storage.save_post_queue(scheduler.queue, scheduler.account)
+            
+            if self.dedup_index:
+                self.dedup_index.rekey(id_map)
+                self.dedup_index.save()
+            
+            print(f"記事IDを移行しました: {len(id_map)}件のID変更、{len(articles) - len(merged)}件の重複記録を統合")
+            self.logger.info(f"記事ID移行: 変更{len(id_map)}件, 統合{len(articles) - len(merged)}件")
+        
+        meta["article_id_signature"] = signature
+        self.storage.save_meta(meta)
+    
+    def _load_account_configs(self) -> List[dict]:
+        """投稿先アカウント設定を取得（未設定の場合はMASTODON_*の単一アカウント）"""
+        accounts = getattr(config, 'MASTODON_ACCOUNTS', None)
+        if accounts:
+            return [
+                {key: account[key] for key in ("name", "instance_url", "access_token", "visibility", "template", "feeds") if key in account}
+                for account in accounts
+            ]
+        return [{
+            "name": "default",
+            "instance_url": config.MASTODON_INSTANCE_URL,
+            "access_token": config.MASTODON_ACCESS_TOKEN,
+            "visibility": config.POST_VISIBILITY,
+            "template": config.POST_TEMPLATE
+        }]
+    
+    @property
+    def pending_post_count(self) -> int:
+        """全アカウントの投稿待ち件数"""
+        return sum(scheduler.pending_count for scheduler in self.post_schedulers.values())
+    
+    def _verify_accounts(self) -> bool:
+        """全アカウントの認証を確認（1つでも認証できれば続行）"""
+        verified = 0
+        for account in self.accounts:
+            if self.mastodon_services[account.name].verify_credentials():
+                verified += 1
+            else:
+                print(f"Mastodon認証に失敗しました: {account.name} ({account.instance_url})")
+                self.logger.warning(f"Mastodon認証失敗: {account.name}")
+        return verified > 0
     
     def _handle_shutdown_signal(self, signum, frame):
         """シャットダウンシグナルを受信したときの処理"""
@@ -112,6 +321,210 @@ class FeedBot:
         print(f"\n{signal_name}を受信しました。安全に停止します...")
         self.logger.warning(f"{signal_name}を受信。処理中の記事を完了後に停止します")
         self.shutdown_requested = True
+        self.cycle_scheduler.wake()
+    
+    def _handle_reload_signal(self, signum, frame):
+        """SIGHUPを受信したときの処理（待機を中断して設定を再読み込み）"""
+        self.reload_requested = True
+        self.cycle_scheduler.wake()
+    
+    def _quiet_hours_setting(self):
+        """投稿禁止時間帯の設定 (開始時, 終了時)（無効の場合はNone）"""
+        return (config.QUIET_HOURS_START, config.QUIET_HOURS_END) if config.ENABLE_QUIET_HOURS else None
+    
+    def _apply_runtime_settings(self):
+        """現在の設定値を起動済みのスケジューラーに反映"""
+        self.cycle_scheduler.interval_seconds = config.CHECK_INTERVAL_MINUTES * 60
+        self.cycle_scheduler.jitter_seconds = getattr(config, 'CHECK_JITTER_SECONDS', 0)
+        self.cycle_scheduler.quiet_hours = self._quiet_hours_setting()
+        self.cycle_scheduler.quiet_interval_seconds = (
+            getattr(config, 'QUIET_HOURS_CHECK_INTERVAL_MINUTES', 60) * 60
+            if getattr(config, 'QUIET_HOURS_PREFETCH', True) else None
+        )
+        for scheduler in self.post_schedulers.values():
+            scheduler.min_interval = self._get_post_interval()
+            scheduler.rate_limit_reserve = getattr(config, 'POST_RATE_LIMIT_RESERVE', 5)
+            scheduler.max_attempts = getattr(config, 'POST_MAX_ATTEMPTS', 5)
+            scheduler.retry_base_delay = getattr(config, 'POST_RETRY_BASE_DELAY', 60)
+            scheduler.schedule_spacing = timedelta(minutes=getattr(config, 'POST_SCHEDULE_SPACING_MINUTES', 10))
+            scheduler.quiet_hours = self._quiet_hours_setting()
+    
+    def _reload_config_if_changed(self):
+        """設定ファイルが変更されているかSIGHUPを受信していれば設定を再読み込み"""
+        if self.config_watcher is None:
+            return
+        changed_files = self.config_watcher.poll()
+        if not changed_files and not self.reload_requested:
+            return
+        self.reload_requested = False
+        self._reload_config(changed_files)
+    
+    def _reload_config(self, changed_files: List[Path]):
+        """
+        設定を再読み込みし、再起動せずに反映
+        
+        環境変数ファイルは RELOADABLE_SETTINGS の項目のみ反映する。
+        AIサービス・Mastodon接続・投稿キュー・キャッシュは作り直さない
+        """
+        if changed_files:
+            print(f"設定ファイルの変更を検出しました: {', '.join(str(path) for path in changed_files)}")
+        else:
+            print("SIGHUPを受信しました。設定を再読み込みします")
+        
+        reloadable = set(getattr(config, 'RELOADABLE_SETTINGS', ()))
+        env_file = getattr(config, 'CONFIG_RELOAD_ENV_FILE', '.env')
+        previous_env = {}
+        restart_required = []
+        if os.path.exists(env_file):
+            try:
+                env_values = read_env_file(env_file)
+            except Exception as e:
+                self.logger.error(f"環境変数ファイルの読み込みエラー: {env_file} - {e}")
+                env_values = {}
+            for key, value in env_values.items():
+                if os.environ.get(key) == value:
+                    continue
+                if key in reloadable:
+                    previous_env[key] = os.environ.get(key)
+                    os.environ[key] = value
+                else:
+                    restart_required.append(key)
+        
+        # 不正な値で読み込みに失敗した場合は元の設定に戻す
+        previous_config = dict(vars(config))
+        try:
+            importlib.reload(config)
+        except Exception as e:
+            for key, value in previous_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+            vars(config).update(previous_config)
+            print(f"設定の再読み込みに失敗したため、変更を反映しませんでした: {e}")
+            self.logger.error(f"設定の再読み込みエラー: {e}")
+            return
+        
+        self._apply_runtime_settings()
+        
+        # URL正規化ルールが変わった場合は記事IDを移行（変わっていなければ何もしない）
+        self.canonicalizer = self._create_canonicalizer()
+        self.feed_reader.canonicalizer = self.canonicalizer
+        with self.storage.lock:
+            self._migrate_article_ids()
+        
+        # フィードソースの追加・削除・変更を差分で反映
+        self._initialize_feed_sources()
+        
+        if previous_env:
+            print(f"設定を反映しました: {', '.join(sorted(previous_env))}")
+        if restart_required:
+            print(f"次の設定の変更は再起動後に反映されます: {', '.join(sorted(restart_required))}")
+        self.logger.info(
+            f"設定を再読み込み: 反映{len(previous_env)}件 {sorted(previous_env)}, 要再起動{len(restart_required)}件 {sorted(restart_required)}"
+        )
+    
+    def _get_post_interval(self) -> float:
+        """投稿間隔を取得（fixed: POST_WAIT固定、ratelimit: 目標間隔＋サーバーのレート制限）"""
+        if getattr(config, 'POST_PACING', 'fixed') == 'ratelimit':
+            return getattr(config, 'POST_MIN_INTERVAL', 5)
+        return getattr(config, 'POST_WAIT', 60)
+    
+    def _interruptible_sleep(self, seconds: float) -> bool:
+        """中断要求で即座に起きる待機（中断された場合はFalse）"""
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            if self.shutdown_requested:
+                break
+            self.cycle_scheduler.sleep(deadline - time.monotonic())
+        if self.shutdown_requested:
+            print("\n待機中に中断要求を受信しました。")
+            self.logger.warning("待機中に中断要求を受信")
+            return False
+        return True
+    
+    def _drain_post_queue(self, articles: List[FeedItem]):
+        """全アカウントの投稿待ちキューを並行して投稿し、結果を記事に反映"""
+        # 投稿禁止時間帯はキューに貯めたまま、終了後のチェックで投稿
+        if self._is_posting_paused():
+            self.logger.debug(f"投稿禁止時間帯のため投稿を保留 (キュー{self.pending_post_count}件)")
+            return
+        
+        articles_by_id = {article.id: article for article in articles}
+        with span("post.drain", pending=self.pending_post_count):
+            if len(self.accounts) == 1:
+                self._drain_account_queue(self.accounts[0], articles_by_id, articles)
+                return
+            
+            # アカウントごとにレート制限が独立しているため、スレッドで並行して待機・投稿
+            with ThreadPoolExecutor(max_workers=len(self.accounts)) as executor:
+                futures = [
+                    executor.submit(propagate(self._drain_account_queue), account, articles_by_id, articles)
+                    for account in self.accounts
+                ]
+                for future in futures:
+                    future.result()
+    
+    def _drain_account_queue(self, account: MastodonAccount, articles_by_id: Dict[str, FeedItem], articles: List[FeedItem]):
+        """1アカウントの投稿待ちキューをレート制限に合わせて投稿（再試行待ちの投稿は次回以降に持ち越し）"""
+        scheduler = self.post_schedulers[account.name]
+        label = f"[{account.name}] " if len(self.accounts) > 1 else ""
+        
+        while scheduler.due_count and not self.shutdown_requested:
+            delay = scheduler.next_delay()
+            if delay > 0:
+                self.logger.info(f"{label}次の投稿まで{delay:.0f}秒待機 (キュー残り{scheduler.pending_count}件)")
+                if not self._interruptible_sleep(delay):
+                    break
+            
+            result = scheduler.post_next()
+            if result is None:
+                break
+            post, outcome = result
+            article = articles_by_id.get(post.article_id)
+            # まとめ投稿は含まれる記事すべてに結果を反映
+            posted_articles = [
+                articles_by_id[article_id]
+                for article_id in [post.article_id, *post.related_article_ids]
+                if article_id in articles_by_id
+            ]
+            if article:
+                title = article.title
+            elif post.fingerprint and posted_articles:
+                title = f"{posted_articles[0].title} (更新)"
+            elif post.related_article_ids:
+                title = f"まとめ投稿 ({len(post.related_article_ids)}件)"
+            else:
+                title = post.article_id
+            
+            if outcome == "posted":
+                if posted_articles:
+                    with self._articles_lock:
+                        for posted_article in posted_articles:
+                            # 記事の更新による投稿・編集は成功した時点で新しい要約と指紋を反映
+                            if post.fingerprint:
+                                posted_article.summary = post.summary
+                                posted_article.fingerprint = post.fingerprint
+                            posted_article.posted_to_mastodon = True
+                            posted_article.account_status_ids[account.name] = post.status_id
+                            if account is self.accounts[0]:
+                                posted_article.status_id = post.status_id
+                                posted_article.scheduled_at = post.scheduled_at
+                        self.storage.save_articles(articles)
+                if post.scheduled_at:
+                    self.logger.info(f"{label}Mastodon予約投稿登録: {title} (ID: {post.article_id}, 予約: {post.scheduled_at.isoformat()})")
+                else:
+                    self.logger.info(f"{label}Mastodon投稿完了: {title} (ID: {post.article_id}, status: {post.status_id})")
+            elif outcome == "retry":
+                self.logger.warning(f"{label}Mastodon投稿失敗、再試行予定: {title} (ID: {post.article_id})")
+            else:
+                if post.fingerprint and posted_articles:
+                    # 記事の更新による投稿を諦めた場合も指紋は反映し、同じ更新の再検出と要約のし直しを繰り返さない
+                    with self._articles_lock:
+                        for posted_article in posted_articles:
+                            posted_article.fingerprint = post.fingerprint
+                        self.storage.save_articles(articles)
+                self.logger.warning(f"{label}Mastodon投稿失敗: {title} (ID: {post.article_id}) - {post.last_error}")
     
     def _is_quiet_hours(self) -> bool:
         """現在が投稿禁止時間帯かどうかを判定"""
@@ -119,17 +532,11 @@ class FeedBot:
             return False
         
         # ローカル時間で判定（設定された時間帯はローカル時間ベース）
-        now = datetime.now()
-        current_hour = now.hour
-        start = config.QUIET_HOURS_START
-        end = config.QUIET_HOURS_END
-        
-        if start <= end:
-            # 日をまたがない場合（例: 9-17）
-            return start <= current_hour < end
-        else:
-            # 日をまたぐ場合（例: 23-7）
-            return current_hour >= start or current_hour < end
+        return is_quiet_hour(datetime.now().hour, config.QUIET_HOURS_START, config.QUIET_HOURS_END)
+    
+    def _is_posting_paused(self) -> bool:
+        """投稿を保留すべきか（予約投稿は投稿禁止時間帯を避けた枠に登録するため保留しない）"""
+        return self._is_quiet_hours() and getattr(config, 'POST_MODE', 'immediate') != 'scheduled'
     
     def _initialize_feed_sources(self):
         """設定からフィードソースを初期化"""
@@ -143,11 +550,15 @@ class FeedBot:
         
         if not existing_sources:
             # 初回初期化：設定からフィードソースを作成
+            # （一括既読化は既存の環境に追加したフィードのみが対象のため、初回のフィードは従来どおりすべて処理する）
             sources = []
             for feed_config in config.FEED_URLS:
                 source = FeedSource(
                     url=feed_config["url"],
-                    name=feed_config["name"]
+                    name=feed_config["name"],
+                    bootstrapped=True,
+                    priority=feed_config.get("priority", 1.0),
+                    update_policy=feed_config.get("update_policy", getattr(config, 'ARTICLE_UPDATE_POLICY', 'ignore'))
                 )
                 sources.append(source)
             
@@ -160,12 +571,33 @@ class FeedBot:
                 if feed_config["url"] not in existing_urls:
                     new_feed = FeedSource(
                         url=feed_config["url"],
-                        name=feed_config["name"]
+                        name=feed_config["name"],
+                        bootstrapped=not getattr(config, 'FEED_BOOTSTRAP', True),
+                        priority=feed_config.get("priority", 1.0),
+                        update_policy=feed_config.get("update_policy", getattr(config, 'ARTICLE_UPDATE_POLICY', 'ignore'))
                     )
                     existing_sources.append(new_feed)
                     new_feeds.append(new_feed)
                     sources_updated = True
             
+            # 既存フィードの名前・優先度・更新時の扱いを設定ファイルに合わせ、設定に戻されたフィードを再び有効化
+            feed_configs = {feed_config["url"]: feed_config for feed_config in config.FEED_URLS}
+            changed_feeds = []
+            for source in existing_sources:
+                feed_config = feed_configs.get(source.url)
+                if not feed_config:
+                    continue
+                settings = (
+                    feed_config["name"],
+                    feed_config.get("priority", 1.0),
+                    feed_config.get("update_policy", getattr(config, 'ARTICLE_UPDATE_POLICY', 'ignore')),
+                    True
+                )
+                if (source.name, source.priority, source.update_policy, source.enabled) != settings:
+                    source.name, source.priority, source.update_policy, source.enabled = settings
+                    changed_feeds.append(source)
+                    sources_updated = True
+            
             # 設定ファイルから削除されたフィードを無効化（削除はしない）
             removed_feeds = []
             for source in existing_sources:
@@ -180,6 +612,10 @@ class FeedBot:
                     print(f"{len(new_feeds)}個の新しいフィードソースを追加しました:")
                     for feed in new_feeds:
                         print(f"  - {feed.name}: {feed.url}")
+                if changed_feeds:
+                    print(f"{len(changed_feeds)}個のフィードソースの設定を更新しました:")
+                    for feed in changed_feeds:
+                        print(f"  - {feed.name}: {feed.url}")
                 if removed_feeds:
                     print(f"{len(removed_feeds)}個のフィードソースを無効化しました:")
                     for feed in removed_feeds:
@@ -187,66 +623,353 @@ class FeedBot:
             else:
                 print("フィードソースの変更はありませんでした")
     
+    def _bootstrap_feed(self, source: FeedSource, feed_items: List[FeedItem],
+                        existing_articles: List[FeedItem], existing_ids: set) -> List[FeedItem]:
+        """
+        フィードの現在のエントリを要約・投稿せずに既読として一括登録
+        
+        保存は1回の一括書き込みで行い、本文は保存しない。
+        FEED_BOOTSTRAP_KEEP_LATEST 件の最新エントリは通常処理に回すため返す
+        """
+        keep_latest = getattr(config, 'FEED_BOOTSTRAP_KEEP_LATEST', 0)
+        unseen = sorted(
+            (item for item in feed_items if item.id not in existing_ids),
+            key=lambda item: item.published,
+            reverse=True
+        )
+        kept, seen = unseen[:keep_latest], unseen[keep_latest:]
+        
+        for item in seen:
+            # 既存エントリと同じ話題の記事を後で重複として検出できるよう指紋だけ登録
+            if self.dedup_index:
+                self.dedup_index.add(item.id, simhash(item.title, item.content))
+            existing_ids.add(item.id)
+        self._skip_articles(seen, "bootstrap", existing_articles)
+        
+        source.bootstrapped = True
+        self.logger.info(f"フィード初期化: {source.name} - 既読登録{len(seen)}件, 通常処理{len(kept)}件")
+        return kept
+    
+    def _process_updated_articles(self, updated_articles: List[tuple], existing_articles: List[FeedItem],
+                                  policies: Dict[str, str], limit: Optional[int] = None) -> int:
+        """
+        内容が更新された既存記事を処理し、要約し直した件数を返す
+        
+        ignore: 指紋のみ更新、resummarize: 要約し直して新たに投稿、edit: 要約し直して投稿済みのステータスを編集
+        投稿・編集は投稿待ちキュー経由で行い（投稿間隔・レート制限・投稿禁止時間帯に従う）、成功した時点で
+        新しい要約と指紋を記事に反映する（キューに入らなかった更新は次回のチェックで再検出し、
+        投稿・編集を諦めた更新は指紋のみ反映する）。
+        limit を指定すると要約し直す件数をその件数までにする（投稿禁止時間帯の先読み）
+        """
+        enqueued = False
+        resummarized = 0
+        for existing, item in updated_articles:
+            policy = policies.get(existing.source_feed, 'ignore')
+            self.logger.info(f"記事更新検出: {item.title} (ID: {existing.id}, 方針: {policy})")
+            
+            # 要約・投稿していない記事は内容の更新だけ反映
+            if policy == 'ignore' or not existing.processed or existing.skip_reason:
+                existing.fingerprint = item.fingerprint
+                continue
+            
+            # 以下は指紋を更新しないことで、処理しなかった更新を次回に再検出させる
+            update_id = f"{existing.id}-{item.fingerprint}"
+            if any(scheduler.is_queued(update_id) for scheduler in self.post_schedulers.values()):
+                self.logger.debug("更新記事の投稿は投稿待ちキューにあります: %s", item.title)
+                continue
+            if self.shutdown_requested or self.ai_service.is_budget_exhausted():
+                continue
+            if limit is not None and resummarized >= limit:
+                self.logger.info(f"投稿禁止時間帯の要約上限により更新記事の処理を延期: {item.title}")
+                continue
+            
+            try:
+                summary = self.ai_service.generate_summary(
+                    item.title, item.content, config.AI_USER_PROMPT_TEMPLATE, source_feed=existing.source_feed
+                )
+            except Exception as e:
+                self.logger.error(f"更新記事の要約生成エラー: {item.title} (ID: {existing.id}) - {e}")
+                continue
+            
+            resummarized += 1
+            existing.title = item.title
+            existing.content = item.content
+            
+            queued = False
+            for account in self.accounts:
+                if not account.handles_feed(existing.source_feed):
+                    continue
+                content = account.template.format(summary=summary, title=existing.title, url=existing.url)
+                status_id = existing.account_status_ids.get(account.name)
+                if not status_id and account is self.accounts[0]:
+                    status_id = existing.status_id
+                
+                # 予約投稿で記録したIDは公開後のステータスIDと異なり編集できないため新規投稿として扱う
+                edit_status_id = status_id if policy == 'edit' and status_id and not existing.scheduled_at else None
+                # 冪等キーが元の投稿と衝突しないよう指紋付きのIDで投稿
+                self.post_schedulers[account.name].enqueue(
+                    update_id, content, account.visibility,
+                    related_article_ids=[existing.id],
+                    edit_status_id=edit_status_id,
+                    summary=summary,
+                    fingerprint=item.fingerprint
+                )
+                queued = True
+            
+            if not queued:
+                # 投稿先のアカウントがないフィードは要約と指紋だけを反映
+                existing.summary = summary
+                existing.fingerprint = item.fingerprint
+            enqueued = enqueued or queued
+        
+        self.storage.save_articles(existing_articles)
+        if enqueued:
+            self._drain_post_queue(existing_articles)
+        return resummarized
+    
+    def _skip_articles(self, articles: List[FeedItem], reason: str, existing_articles: List[FeedItem]):
+        """記事を要約・投稿せずに既読として一括保存（要約しない本文は保存しない）"""
+        if not articles:
+            return
+        now = datetime.now(timezone.utc)
+        for article in articles:
+            article.read_at = now
+            article.skip_reason = reason
+            article.content = ""
+        existing_articles.extend(articles)
+        self.storage.save_articles(existing_articles)
+    
+    def _link_duplicates(self, duplicates: List[FeedItem], existing_articles: List[FeedItem]):
+        """重複記事を元記事の投稿への返信としてキューに追加（元記事が投稿済みのアカウントのみ）"""
+        articles_by_id = {article.id: article for article in existing_articles}
+        template = getattr(config, 'DEDUP_LINK_TEMPLATE', "{title}\n{url}")
+        linked = 0
+        
+        for duplicate in duplicates:
+            original = articles_by_id.get(duplicate.duplicate_of)
+            # 予約投稿中のステータスには返信できない
+            if not original or original.scheduled_at:
+                continue
+            for account in self.accounts:
+                status_id = original.account_status_ids.get(account.name)
+                if not status_id and account is self.accounts[0]:
+                    status_id = original.status_id
+                if not status_id or not account.handles_feed(duplicate.source_feed):
+                    continue
+                content = template.format(title=duplicate.title, url=duplicate.url, feed=duplicate.source_feed)
+                self.post_schedulers[account.name].enqueue(
+                    duplicate.id, content, account.visibility, in_reply_to_id=status_id
+                )
+                linked += 1
+        
+        if linked:
+            self.logger.info(f"重複記事のリンク投稿をキューに追加: {linked}件")
+            self._drain_post_queue(existing_articles)
+    
+    def _claim_article(self, article: FeedItem) -> bool:
+        """
+        ワーカーモードで記事の処理権を取得（他のワーカーが処理中・処理済みの記事はFalse）
+        
+        リースを持つワーカーだけが保存済みかどうかを確認して記録できるため、同じ記事を二重に処理しない
+        """
+        if not self.lease_manager:
+            return True
+        key = f"article:{article.id}"
+        if not self.lease_manager.acquire(key):
+            return False
+        if self.storage.get_article(article.id):
+            self.lease_manager.release(key)
+            return False
+        article.claimed_by = self.worker_id
+        return True
+    
+    def _release_articles(self, articles: List[FeedItem]):
+        """処理を終えた記事のリースを解放（処理中の印を外して保存した後に呼び出す）"""
+        if self.lease_manager and articles:
+            self.lease_manager.release_many(f"article:{article.id}" for article in articles)
+    
+    def _adopt_orphaned_queues(self):
+        """停止したワーカー（とワーカーモード導入前）の投稿待ちキューを引き継ぐ"""
+        live_workers = set(self.lease_manager.live_workers())
+        for account in self.accounts:
+            scheduler = self.post_schedulers[account.name]
+            for worker_id in self.storage.list_worker_post_queues(account.name):
+                if worker_id == self.worker_id or worker_id in live_workers:
+                    continue
+                # ロック中に読み込みと削除を行い、複数のワーカーが同じキューを引き継がないようにする
+                with self.storage.lock:
+                    posts = self.storage.load_post_queue(account.name, worker_id)
+                    adopted = scheduler.adopt(posts)
+                    self.storage.delete_post_queue(account.name, worker_id)
+                if posts:
+                    source = f"ワーカー {worker_id}" if worker_id else "以前の投稿キュー"
+                    self.logger.info(f"投稿待ちキュー引き継ぎ: {source} -> {self.worker_id} ({account.name}) {adopted}件")
+    
+    def _reclaim_orphaned_articles(self, existing_articles: List[FeedItem]):
+        """停止したワーカーが処理中のまま残した記事を引き継いで処理"""
+        orphans = [article for article in existing_articles if article.claimed_by]
+        if not orphans:
+            return
+        queued_ids = set()
+        for scheduler in self.post_schedulers.values():
+            for post in scheduler.queue:
+                queued_ids.add(post.article_id)
+                queued_ids.update(post.related_article_ids)
+        
+        for i, article in enumerate(orphans, 1):
+            if self.shutdown_requested or self.ai_service.is_budget_exhausted():
+                break
+            key = f"article:{article.id}"
+            if not self.lease_manager.acquire(key):
+                continue
+            # 読み込み後に他のワーカーが引き継いで処理を終えていないか確認
+            current = self.storage.get_article(article.id)
+            if not current or current.claimed_by != article.claimed_by:
+                self.lease_manager.release(key)
+                continue
+            
+            self.logger.info(f"処理中の記事を引き継ぎ: {article.title} (ID: {article.id}, 元ワーカー: {article.claimed_by})")
+            if article.id in queued_ids or article.posted_to_mastodon:
+                # 投稿キューへの追加までは済んでいるため要約し直さない
+                article.processed = True
+            else:
+                self._process_single_article(article, i, len(orphans))
+            article.claimed_by = None
+            self.storage.save_articles(existing_articles)
+            self._release_articles([article])
+    
     def check_feeds(self):
         """フィードをチェックして新着記事を処理"""
-        print(f"フィードチェック開始: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}")
         self.logger.info("フィードチェック開始")
         
-        # 投稿禁止時間帯チェック
+        # 投稿禁止時間帯チェック（先読みが有効なら取得と要約のみ少量ずつ行う）
+        prefetch_limit = None
         if self._is_quiet_hours():
-            message = "現在は投稿禁止時間帯です。フィード取得をスキップします。"
-            print(message)
+            if not getattr(config, 'QUIET_HOURS_PREFETCH', True):
+                message = "現在は投稿禁止時間帯です。フィード取得をスキップします。"
+                self.logger.info(message)
+                return
+            prefetch_limit = getattr(config, 'QUIET_HOURS_PREFETCH_LIMIT', 5)
+            message = f"現在は投稿禁止時間帯です。最大{prefetch_limit}件を要約して投稿キューに貯めます。"
             self.logger.info(message)
-            return
         
         # 既存記事の読み込み
         existing_articles = self.storage.load_articles()
         existing_ids = {article.id for article in existing_articles}
+        existing_by_id = {article.id: article for article in existing_articles}
+        
+        # ワーカーモードでは停止したワーカーの投稿待ちキューと処理中の記事を引き継ぐ
+        if self.lease_manager:
+            self._adopt_orphaned_queues()
+            self._reclaim_orphaned_articles(existing_articles)
+        
+        # 前回から残っている投稿待ちキューを先に処理
+        if self.pending_post_count and not self._is_posting_paused():
+            self.logger.info(f"投稿待ちキュー{self.pending_post_count}件を処理します")
+            self._drain_post_queue(existing_articles)
         
-        print(f"既存記事数: {len(existing_articles)}")
-        print(f"既存記事ID数: {len(existing_ids)}")
         self.logger.info(f"既存記事数: {len(existing_articles)}, 既存ID数: {len(existing_ids)}")
         
         # フィードソースの読み込み
         feed_sources = self.storage.load_feed_sources()
         new_articles = []
+        duplicate_articles = []
+        updated_articles = []
+        fingerprints_backfilled = False
         
         self.logger.info(f"{len(feed_sources)}個のフィードソースを処理開始")
         
+        # ワーカーモードでは生存ワーカー数で均等に分けたフィードだけを担当
+        assigned_urls = None
+        if self.lease_manager:
+            if self.dedup_index:
+                self.dedup_index.refresh()
+            enabled_urls = [source.url for source in feed_sources if source.enabled]
+            assigned_urls = self.lease_manager.claim_shard("feed:", enabled_urls)
+            self.logger.info(f"担当フィード: {len(assigned_urls)}/{len(enabled_urls)}件 (ワーカー: {self.worker_id})")
+        
+        # 記事ごとの判定は DEBUG で出力し、INFO ではフィードごとの集計を1行で出力
+        cutoff_date = datetime.now(timezone.utc) - timedelta(days=config.ARTICLE_RETENTION_DAYS)
+        debug_enabled = self.logger.isEnabledFor(logging.DEBUG)
+        
         for source in feed_sources:
             if not source.enabled:
                 continue
+            if assigned_urls is not None and source.url not in assigned_urls:
+                continue
             
-            self.logger.info(f"フィード取得開始: {source.name} ({source.url})")
+            self.logger.debug("フィード取得開始: %s (%s)", source.name, source.url)
             
             # フィードから記事を取得
             feed_items = self.feed_reader.fetch_feed_items(source)
+            FEED_ENTRIES_SEEN.inc(source.name, amount=len(feed_items))
+            fetched_count = len(feed_items)
+            counts = {"new": 0, "read": 0, "updated": 0, "old": 0, "duplicate": 0}
             
-            self.logger.info(f"フィード取得完了: {source.name} - {len(feed_items)}件")
+            # 追加されたばかりのフィードは既存エントリを一括で既読化（最新K件のみ通常処理）
+            if not source.bootstrapped and feed_items:
+                feed_items = self._bootstrap_feed(source, feed_items, existing_articles, existing_ids)
+                counts["read"] += fetched_count - len(feed_items)
             
             # 新着記事のフィルタリング
             for item in feed_items:
-                # 既読チェック（IDが存在する場合はスキップ）
+                # 既読チェック（IDが存在する場合は指紋を比較して更新のみ検出）
                 if item.id in existing_ids:
-                    print(f"既読記事をスキップ: {item.title[:50]}...")
+                    existing = existing_by_id.get(item.id)
+                    if existing and item.fingerprint and existing.fingerprint != item.fingerprint:
+                        if existing.fingerprint:
+                            updated_articles.append((existing, item))
+                            counts["updated"] += 1
+                        else:
+                            # 指紋導入前の記録は現在の内容を基準として記録
+                            existing.fingerprint = item.fingerprint
+                            fingerprints_backfilled = True
+                        continue
+                    counts["read"] += 1
+                    if debug_enabled:
+                        self.logger.debug("既読記事をスキップ: %s", item.title)
                     continue
                 
                 # 日付チェック（指定期間内のみ）
-                cutoff_date = datetime.now(timezone.utc) - timedelta(days=config.ARTICLE_RETENTION_DAYS)
                 # publishedがタイムゾーン情報を持たない場合はUTCとして扱う
                 published_time = item.published
                 if published_time.tzinfo is None:
                     published_time = published_time.replace(tzinfo=timezone.utc)
                 
                 if published_time < cutoff_date:
-                    print(f"古い記事をスキップ: {item.title[:50]}... (公開日: {item.published})")
-                    self.logger.debug(f"古い記事をスキップ: {item.title} (公開日: {item.published})")
+                    counts["old"] += 1
+                    if debug_enabled:
+                        self.logger.debug("古い記事をスキップ: %s (公開日: %s)", item.title, item.published)
                     continue
                 
+                # 他フィードや過去の記事とのほぼ重複をAI処理の前に検出
+                if self.dedup_index:
+                    fingerprint = simhash(item.title, item.content)
+                    # 前回延期された記事は登録済みの自分自身と一致するため除外
+                    original_id = self.dedup_index.find_duplicate(fingerprint, exclude_id=item.id)
+                    if original_id:
+                        item.duplicate_of = original_id
+                        duplicate_articles.append(item)
+                        existing_ids.add(item.id)
+                        counts["duplicate"] += 1
+                        if debug_enabled:
+                            self.logger.debug("ほぼ重複する記事をスキップ: %s (元記事ID: %s)", item.title, original_id)
+                        continue
+                    self.dedup_index.add(item.id, fingerprint)
+                
                 # 新着記事として追加（読み取り日時は処理時に設定）
+                # 複数フィードに同じURLの記事がある場合に二重に処理しないようIDを登録
+                existing_ids.add(item.id)
                 new_articles.append(item)
-                print(f"新着記事として追加: {item.title[:50]}...")
-                self.logger.info(f"新着記事発見: {item.title}")
+                FEED_ENTRIES_NEW.inc(source.name)
+                counts["new"] += 1
+                if debug_enabled:
+                    self.logger.debug("新着記事発見: %s", item.title)
+            
+            self.logger.info(
+                f"フィード {source.name}: {fetched_count}件中 新着{counts['new']}件 / 既読{counts['read']}件 / "
+                f"更新{counts['updated']}件 / 古い{counts['old']}件 / 重複{counts['duplicate']}件"
+            )
             
             # フィードソースの最終チェック時刻を更新
             source.last_checked = datetime.now(timezone.utc)
@@ -254,51 +977,115 @@ class FeedBot:
         # フィードソースの保存
         self.storage.save_feed_sources(feed_sources)
         
-        print(f"{len(new_articles)}件の新着記事を発見")
+        # 更新された既存記事をフィードごとの方針で処理
+        policies = {source.name: source.update_policy for source in feed_sources}
+        resummarized_count = 0
+        if updated_articles:
+            # 要約し直した件数は投稿禁止時間帯の要約上限に含める
+            resummarized_count = self._process_updated_articles(
+                updated_articles, existing_articles, policies, limit=prefetch_limit
+            )
+        elif fingerprints_backfilled:
+            self.storage.save_articles(existing_articles)
+        
+        # 重複記事は要約せずに既読化し、必要に応じて元記事の投稿に返信でリンク
+        if self.dedup_index:
+            self.dedup_index.save()
+        if duplicate_articles:
+            self._skip_articles(duplicate_articles, "duplicate", existing_articles)
+            self.logger.info(f"{len(duplicate_articles)}件の重複記事をスキップしました")
+            if getattr(config, 'DEDUP_LINK_TO_ORIGINAL', False):
+                self._link_duplicates(duplicate_articles, existing_articles)
+        
         self.logger.info(f"{len(new_articles)}件の新着記事を発見")
+        trace = current_span()
+        trace.set_attribute("new_articles", len(new_articles))
+        trace.set_attribute("duplicates", len(duplicate_articles))
+        trace.set_attribute("updated", len(updated_articles))
+        
+        # 新着記事を鮮度とフィードの重みによる優先度順に並べ、既に古すぎる記事は要約せずにスキップ
+        backlog = ArticleBacklog(
+            {source.name: source.priority for source in feed_sources},
+            half_life_hours=getattr(config, 'PRIORITY_HALF_LIFE_HOURS', 24),
+            max_age_hours=getattr(config, 'MAX_ARTICLE_AGE_AT_POST_HOURS', None)
+        )
+        stale_articles = [article for article in new_articles if backlog.is_stale(article)]
+        if stale_articles:
+            self._skip_articles(stale_articles, "stale", existing_articles)
+            self.logger.info(f"古すぎる記事をスキップ: {len(stale_articles)}件")
+        stale_ids = {article.id for article in stale_articles}
+        new_articles = [article for article in new_articles if article.id not in stale_ids]
+        for article in new_articles:
+            backlog.push(article)
+        
+        # 新着記事が多い場合はフィードごとのまとめ投稿で処理
+        digest_threshold = getattr(config, 'DIGEST_THRESHOLD', None)
+        if digest_threshold and len(new_articles) > digest_threshold:
+            digest_limit = None if prefetch_limit is None else max(0, prefetch_limit - resummarized_count)
+            self._process_digest(list(backlog), existing_articles, limit=digest_limit)
+            new_articles = []
         
         # 新着記事を1件ずつ処理して都度保存（中断時の既読化問題を回避）
         if new_articles:
-            print(f"{len(new_articles)}件の新着記事を順次処理します")
             self.logger.info(f"{len(new_articles)}件の新着記事を順次処理開始")
             
-            for i, article in enumerate(new_articles, 1):
+            # 初回要約のモデルロード待ちを避けるため事前にウォームアップ
+            if getattr(config, 'OLLAMA_WARMUP', False):
+                self.ai_service.warm_up()
+            
+            summarized_count = resummarized_count
+            for i, article in enumerate(backlog, 1):
                 # 中断要求チェック（次の記事処理前）
                 if self.shutdown_requested:
                     remaining = len(new_articles) - i + 1
-                    print(f"\n中断要求により処理を停止します。残り{remaining}件の記事は次回処理されます。")
                     self.logger.warning(f"中断要求により停止。残り{remaining}件は未処理")
                     break
                 
-                # 処理直前に read_at を設定（この記事だけを既読化）
-                article.read_at = datetime.now(timezone.utc)
+                # 予算超過時は既読化せずに次回以降へ延期
+                if self.ai_service.is_budget_exhausted():
+                    remaining = len(new_articles) - i + 1
+                    self.logger.warning(f"AI予算超過により延期。残り{remaining}件は未処理")
+                    break
                 
-                # 既存記事に追加して保存（この記事だけ既読化）
-                existing_articles.append(article)
-                self.storage.save_articles(existing_articles)
-                print(f"記事 {i}/{len(new_articles)} を保存しました: {article.title[:50]}...")
-                self.logger.info(f"記事保存完了 ({i}/{len(new_articles)}): {article.title}")
+                # 投稿禁止時間帯はAI処理を分散させるため1回あたりの件数を制限
+                if prefetch_limit is not None and summarized_count >= prefetch_limit:
+                    remaining = len(new_articles) - i + 1
+                    self.logger.info(f"投稿禁止時間帯の要約上限により延期。残り{remaining}件は未処理")
+                    break
                 
-                # AI処理とMastodon投稿（待機なし）
-                self._process_single_article(article, i, len(new_articles), wait=False)
+                # 処理待ちの間に投稿期限を過ぎた記事は要約せずにスキップ
+                if backlog.is_stale(article):
+                    self._skip_articles([article], "stale", existing_articles)
+                    self.logger.info(f"古すぎる記事をスキップ: {article.title}")
+                    continue
                 
-                # 処理結果を反映して再保存
-                self.storage.save_articles(existing_articles)
-                self.logger.info(f"AI処理結果を反映して再保存 ({i}/{len(new_articles)}): {article.title}")
+                # ワーカーモードでは他のワーカーが処理中・処理済みの記事を飛ばす
+                if not self._claim_article(article):
+                    self.logger.info(f"記事 {i}/{len(new_articles)} は他のワーカーが処理しているためスキップ: {article.title}")
+                    continue
                 
-                # 次の記事処理前の待機（最後の記事以外、ループ制御下で実行）
-                if i < len(new_articles):
-                    wait_time = getattr(config, 'POST_WAIT', 60)
-                    print(f"次の記事処理まで{wait_time}秒待機...")
-                    self.logger.debug(f"次の記事処理まで{wait_time}秒待機")
+                with span("article", article_id=article.id, feed=article.source_feed, index=i) as trace:
+                    # 処理直前に read_at を設定（この記事だけを既読化）
+                    article.read_at = datetime.now(timezone.utc)
+                    
+                    # 既存記事に追加して保存（この記事だけ既読化）
+                    existing_articles.append(article)
+                    self.storage.save_articles(existing_articles)
+                    self.logger.info(f"記事保存完了 ({i}/{len(new_articles)}): {article.title}")
+                    
+                    # AI処理と投稿キューへの追加
+                    self._process_single_article(article, i, len(new_articles))
+                    summarized_count += 1
+                    trace.set_attribute("processed", article.processed)
                     
-                    # 待機を1秒ごとに分割して中断チェック
-                    for _ in range(wait_time):
-                        if self.shutdown_requested:
-                            print("\n待機中に中断要求を受信しました。")
-                            self.logger.warning("待機中に中断要求を受信")
-                            break
-                        time.sleep(1)
+                    # 処理結果を反映して再保存
+                    article.claimed_by = None
+                    self.storage.save_articles(existing_articles)
+                    self._release_articles([article])
+                    self.logger.info(f"AI処理結果を反映して再保存 ({i}/{len(new_articles)}): {article.title}")
+                
+                # 投稿間隔とレート制限に合わせて待機してから投稿
+                self._drain_post_queue(existing_articles)
         
         # 古い記事のクリーンアップ（通常のクリーンアップ）
         cleaned_count = self.storage.cleanup_old_articles(config.ARTICLE_RETENTION_DAYS)
@@ -311,12 +1098,10 @@ class FeedBot:
         if read_cleaned_count > 0:
             self.logger.info(f"古い読み取り記録を{read_cleaned_count}件クリーンアップ")
         
-        print("フィードチェック完了")
         self.logger.info("フィードチェック完了")
     
-    def _process_single_article(self, article: FeedItem, current: int, total: int, wait: bool = True):
-        """1件の記事を処理（要約生成とMastodon投稿）"""
-        print(f"記事処理中 ({current}/{total}): {article.title}")
+    def _process_single_article(self, article: FeedItem, current: int, total: int):
+        """1件の記事を処理（要約生成と投稿キューへの追加）"""
         self.logger.info(f"記事処理開始 ({current}/{total}): {article.title}")
         
         # AI要約の生成
@@ -324,13 +1109,12 @@ class FeedBot:
             summary = self.ai_service.generate_summary(
                 article.title,
                 article.content,
-                config.AI_USER_PROMPT_TEMPLATE
+                config.AI_USER_PROMPT_TEMPLATE,
+                source_feed=article.source_feed
             )
             self.logger.info(f"AI要約生成完了: {article.title} (ID: {article.id})")
             self.logger.debug(f"要約内容: {summary}")
         except Exception as e:
-            error_msg = f"AI要約生成エラー ({current}/{total}): {article.title} - {str(e)}"
-            print(error_msg)
             self.logger.error(f"AI要約生成エラー: {article.title} (ID: {article.id}) - {str(e)}", exc_info=True)
             summary = None
         
@@ -338,48 +1122,148 @@ class FeedBot:
             article.summary = summary
             article.processed = True
             
-            # Mastodon投稿の準備
-            post_content = config.POST_TEMPLATE.format(
-                summary=summary,
-                title=article.title,
-                url=article.url
-            )
-            
-            self.logger.debug(f"Mastodon投稿内容: {post_content}")
+            # 対象アカウントごとにテンプレートを適用して投稿キューに追加
+            # （投稿はレート制限に合わせて _drain_post_queue で実行）
+            targets = [account for account in self.accounts if account.handles_feed(article.source_feed)]
+            for account in targets:
+                post_content = account.template.format(
+                    summary=summary,
+                    title=article.title,
+                    url=article.url
+                )
+                self.logger.debug(f"Mastodon投稿内容 ({account.name}): {post_content}")
+                self.post_schedulers[account.name].enqueue(article.id, post_content, account.visibility)
             
-            # Mastodonに投稿
-            if self.mastodon_service.post_toot(post_content, config.POST_VISIBILITY):
-                article.posted_to_mastodon = True
-                success_msg = f"投稿完了 ({current}/{total}): {article.title}"
-                print(success_msg)
-                self.logger.info(f"Mastodon投稿完了: {article.title} (ID: {article.id})")
+            if targets:
+                self.logger.info(f"投稿キュー追加: {article.title} (ID: {article.id}, 投稿先: {', '.join(a.name for a in targets)})")
             else:
-                failure_msg = f"投稿失敗 ({current}/{total}): {article.title}"
-                print(failure_msg)
-                self.logger.warning(f"Mastodon投稿失敗: {article.title} (ID: {article.id})")
-                article.processed = True  # 要約は成功したので処理済みとマーク
+                self.logger.info(f"投稿先アカウントなし: {article.title} (フィード: {article.source_feed})")
         else:
-            failure_msg = f"要約生成失敗 ({current}/{total}): {article.title} - 記事は保存されましたが要約されていません"
-            print(failure_msg)
             self.logger.warning(f"要約生成失敗による記事スキップ: {article.title} (ID: {article.id})")
+    
+    def _process_digest(self, new_articles: List[FeedItem], existing_articles: List[FeedItem],
+                        limit: Optional[int] = None):
+        """
+        新着記事をフィードごとにまとめて1回ずつ要約し、まとめ投稿として投稿キューに追加
+        
+        limit を指定すると要約するグループ数をその数までにする（投稿禁止時間帯の先読み。残りは次回処理）
+        """
+        groups = group_articles(new_articles, getattr(config, 'DIGEST_MAX_ARTICLES', 10))
+        style = getattr(config, 'DIGEST_POST_STYLE', 'single')
+        if style == 'thread' and getattr(config, 'POST_MODE', 'immediate') == 'scheduled':
+            # 予約投稿には返信できないため1件のまとめ投稿にする
+            style = 'single'
+        
+        self.logger.info(f"まとめ投稿モード: {len(new_articles)}件 -> {len(groups)}グループ ({style})")
+        
+        if getattr(config, 'OLLAMA_WARMUP', False):
+            self.ai_service.warm_up()
+        
+        summarized_count = 0
+        for i, (feed, articles) in enumerate(groups, 1):
+            if self.shutdown_requested:
+                self.logger.warning(f"中断要求により停止。残り{len(groups) - i + 1}グループは未処理")
+                break
+            
+            if self.ai_service.is_budget_exhausted():
+                self.logger.warning(f"AI予算超過により延期。残り{len(groups) - i + 1}グループは未処理")
+                break
+            
+            # 投稿禁止時間帯はAI処理を分散させるため1回あたりのグループ数を制限
+            if limit is not None and summarized_count >= limit:
+                self.logger.info(f"投稿禁止時間帯の要約上限により延期。残り{len(groups) - i + 1}グループは未処理")
+                break
+            
+            # ワーカーモードでは他のワーカーが処理中・処理済みの記事を除く
+            articles = [article for article in articles if self._claim_article(article)]
+            if not articles:
+                continue
+            
+            # グループ単位で既読化して保存
+            read_at = datetime.now(timezone.utc)
+            for article in articles:
+                article.read_at = read_at
+            existing_articles.extend(articles)
+            self.storage.save_articles(existing_articles)
+            
+            self.logger.info(f"まとめ処理中 ({i}/{len(groups)}): {feed} {len(articles)}件")
+            summarized_count += 1
+            try:
+                with span("digest", feed=feed, articles=len(articles), style=style):
+                    summary = self.ai_service.generate_summary(
+                        f"{feed}の新着記事{len(articles)}件",
+                        build_digest_content(articles, getattr(config, 'DIGEST_ARTICLE_CHARS', 1500)),
+                        getattr(config, 'DIGEST_PROMPT_TEMPLATE', config.AI_USER_PROMPT_TEMPLATE),
+                        source_feed=feed
+                    )
+            except Exception as e:
+                self.logger.error(f"まとめ要約生成エラー: {feed} - {e}", exc_info=True)
+                summary = None
+            
+            if summary:
+                for article in articles:
+                    article.summary = summary
+                    article.processed = True
+                self._enqueue_digest(feed, articles, summary, style)
+            else:
+                self.logger.warning(f"まとめ要約生成失敗によりスキップ: {feed} {len(articles)}件")
+            
+            for article in articles:
+                article.claimed_by = None
+            self.storage.save_articles(existing_articles)
+            self._release_articles(articles)
+            self._drain_post_queue(existing_articles)
+    
+    def _enqueue_digest(self, feed: str, articles: List[FeedItem], summary: str, style: str):
+        """まとめ投稿を対象アカウントの投稿キューに追加（thread: 要約の後に各記事を返信で連ねる）"""
+        digest_id = make_digest_id(articles)
+        article_ids = [article.id for article in articles]
+        template = getattr(config, 'DIGEST_POST_TEMPLATE', "{summary}\n\n{links}")
+        max_chars = getattr(config, 'DIGEST_MAX_POST_CHARS', 500)
         
-        # 待機処理は呼び出し側で制御（wait=Falseの場合はスキップ）
-        if wait and current < total:
-            wait_time = getattr(config, 'POST_WAIT', 60)
-            print(f"次の記事処理まで{wait_time}秒待機...")
-            self.logger.debug(f"次の記事処理まで{wait_time}秒待機")
-            time.sleep(wait_time)
+        for account in self.accounts:
+            if not account.handles_feed(feed):
+                continue
+            scheduler = self.post_schedulers[account.name]
+            
+            if style == 'thread':
+                head = format_digest_post(template, feed, summary, articles, max_chars, include_links=False)
+                scheduler.enqueue(digest_id, head, account.visibility, related_article_ids=article_ids)
+                parent_id = digest_id
+                for article in articles:
+                    scheduler.enqueue(article.id, f"{article.title}\n{article.url}", account.visibility, reply_to=parent_id)
+                    parent_id = article.id
+            else:
+                content = format_digest_post(template, feed, summary, articles, max_chars)
+                scheduler.enqueue(digest_id, content, account.visibility, related_article_ids=article_ids)
+        
+        self.logger.info(f"まとめ投稿をキューに追加: {feed} {len(articles)}件 ({style})")
     
     def run_once(self):
         """一回だけフィードチェックを実行"""
         print("=== Tsukino Feedbot 単発実行 ===")
         
         # Mastodon認証確認
-        if not self.mastodon_service.verify_credentials():
+        if not self._verify_accounts():
             print("Mastodon認証に失敗しました。設定を確認してください。")
             return
         
-        self.check_feeds()
+        try:
+            self._run_cycle()
+        finally:
+            self.close()
+    
+    def _run_cycle(self):
+        """フィードチェックを1回実行し、所要時間をメトリクスとトレースに記録"""
+        with CYCLE_SECONDS.time(), span("cycle", worker=self.worker_id):
+            self.check_feeds()
+        LAST_CYCLE_TIMESTAMP.set(value=time.time())
+    
+    def close(self):
+        """ワーカーモードのリースを解放（他のワーカーが担当フィードと投稿キューをすぐに引き継げる）"""
+        if self.lease_manager:
+            self.lease_manager.stop()
+            self.logger.info(f"ワーカーのリースを解放しました: {self.worker_id}")
     
     def run_continuous(self):
         """継続的にフィードをチェック"""
@@ -387,25 +1271,53 @@ class FeedBot:
         print(f"チェック間隔: {config.CHECK_INTERVAL_MINUTES}分")
         
         # Mastodon認証確認
-        if not self.mastodon_service.verify_credentials():
+        if not self._verify_accounts():
             print("Mastodon認証に失敗しました。設定を確認してください。")
             return
         
+        if getattr(config, 'OLLAMA_WARMUP', False):
+            self.ai_service.warm_up()
+        
+        # 各処理段階の所要時間・件数をPrometheus形式で公開
+        metrics_port = getattr(config, 'METRICS_PORT', None)
+        if metrics_port:
+            metrics_bind = getattr(config, 'METRICS_BIND', '0.0.0.0')
+            try:
+                start_metrics_server(metrics_port, metrics_bind)
+                print(f"メトリクスを公開しています: http://{metrics_bind}:{metrics_port}/metrics")
+                self.logger.info(f"メトリクスサーバー起動: {metrics_bind}:{metrics_port}")
+            except OSError as e:
+                print(f"メトリクスサーバーを起動できませんでした: {e}")
+                self.logger.error(f"メトリクスサーバー起動エラー: {e}")
+        
         try:
-            while True:
-                # 静音時間帯チェック
-                if self._is_quiet_hours():
-                    print("現在は静音時間帯です。次のチェックまで待機します。")
-                    time.sleep(600)  # 10分待機してから再チェック
-                    continue
+            while not self.shutdown_requested:
+                # 前回のチェック以降に変更された設定を反映
+                self._reload_config_if_changed()
                 
-                self.check_feeds()
+                # 投稿禁止時間帯は先読みが有効な場合のみ実行（無効時は終了時刻を次回の実行時刻とする）
+                if not self._is_quiet_hours() or getattr(config, 'QUIET_HOURS_PREFETCH', True):
+                    self._run_cycle()
                 
-                print(f"次のチェックまで{config.CHECK_INTERVAL_MINUTES}分待機...")
-                time.sleep(config.CHECK_INTERVAL_MINUTES * 60)
+                if self.shutdown_requested:
+                    break
                 
+                # 処理時間によらず周期境界（静音時間帯は終了時刻）に次回を実行
+                next_run = self.cycle_scheduler.next_run_time()
+                print(f"次のチェック: {next_run.strftime('%Y-%m-%d %H:%M:%S')}")
+                self.logger.info(f"次のチェック予定: {next_run.isoformat()}")
+                # SIGHUPで起こされた場合は設定を反映して次回の実行時刻を計算し直す
+                while not self.cycle_scheduler.wait_until(next_run) and not self.shutdown_requested:
+                    if self.reload_requested:
+                        self._reload_config_if_changed()
+                        next_run = self.cycle_scheduler.next_run_time()
+                        print(f"次のチェック: {next_run.strftime('%Y-%m-%d %H:%M:%S')}")
+            
+            print("\n終了が要求されました。")
         except KeyboardInterrupt:
             print("\n終了が要求されました。")
+        finally:
+            self.close()
     
     def show_status(self):
         """現在の状況を表示"""
@@ -422,6 +1334,7 @@ class FeedBot:
         print(f"保存記事数: {len(articles)}")
         print(f"処理済み記事数: {len([a for a in articles if a.processed])}")
         print(f"投稿済み記事数: {len([a for a in articles if a.posted_to_mastodon])}")
+        print(f"スキップ記事数: {len([a for a in articles if a.skip_reason])}")
         print(f"本日読み取り記事数: {len(today_articles)}")
         print(f"過去7日間読み取り記事数: {len(week_articles)}")
         
@@ -439,9 +1352,27 @@ class FeedBot:
         else:
             print("時間帯制限: 無効")
         
+        # ワーカーモードの状況表示
+        if self.lease_manager:
+            workers = self.lease_manager.live_workers()
+            print(f"ワーカーモード: 有効 (このワーカー: {self.worker_id}, 稼働中: {len(workers)}台)")
+            for worker_id in workers:
+                print(f"  - {worker_id}")
+        
         # ウェイト設定の表示
-        post_wait = getattr(config, 'POST_WAIT', 10)
-        print(f"投稿処理間ウェイト: {post_wait}秒")
+        post_pacing = getattr(config, 'POST_PACING', 'fixed')
+        if getattr(config, 'POST_MODE', 'immediate') == 'scheduled':
+            print(f"投稿方式: 予約投稿 (予約枠の間隔 {getattr(config, 'POST_SCHEDULE_SPACING_MINUTES', 10)}分)")
+        else:
+            print(f"投稿ペース: {post_pacing} (投稿間隔 {self._get_post_interval()}秒)")
+        print(f"投稿待ちキュー: {self.pending_post_count}件")
+        if len(self.accounts) > 1:
+            print("投稿先アカウント:")
+            for account in self.accounts:
+                feeds = ', '.join(account.feeds) if account.feeds else "全フィード"
+                print(f"  - {account.name} ({account.instance_url}, {account.visibility}): {feeds} / キュー{self.post_schedulers[account.name].pending_count}件")
+        
+        self._show_usage_status()
         
         print("\nフィードソース:")
         for source in sources:
@@ -450,6 +1381,38 @@ class FeedBot:
             print(f"  - {source.name} ({status}) - 最終チェック: {last_check}")
 
 
+    def _show_usage_status(self):
+        """AI使用量と推定コストを表示"""
+        totals = self.usage_ledger.get_totals()
+        budget = getattr(config, 'AI_DAILY_BUDGET', None)
+        budget_text = f" / 予算 ${budget:.2f}" if budget is not None else ""
+        
+        print("\nAI使用量（本日）:")
+        print(f"  推定コスト: ${totals['cost']:.4f}{budget_text}")
+        print(f"  呼び出し数: {totals['calls']} (エラー: {totals['errors']})")
+        print(f"  トークン: 入力 {totals['input_tokens']} / 出力 {totals['output_tokens']}")
+        if totals['calls']:
+            print(f"  平均レイテンシ: {totals['latency_ms'] / totals['calls'] / 1000:.1f}秒")
+        
+        for label, axis in (("サービス別", "provider"), ("フィード別", "feed")):
+            breakdown = self.usage_ledger.get_breakdown(axis)
+            if not breakdown:
+                continue
+            print(f"  {label}:")
+            for key, values in sorted(breakdown.items(), key=lambda item: -item[1]['cost']):
+                tokens = values['input_tokens'] + values['output_tokens']
+                print(f"    - {key or '不明'}: ${values['cost']:.4f}, {values['calls']}回, {tokens}トークン")
+        
+        week_cost = 0.0
+        week_calls = 0
+        today = datetime.now().astimezone().date()
+        for days_ago in range(7):
+            day_totals = self.usage_ledger.get_totals(day=today - timedelta(days=days_ago))
+            week_cost += day_totals['cost']
+            week_calls += day_totals['calls']
+        print(f"  過去7日間: ${week_cost:.4f}, {week_calls}回 (1日平均 {week_calls / 7:.1f}回)")
+
+
 def main():
     """メイン関数"""
     print("=== Tsukino Feedbot 初期化中 ===")
@@ -480,6 +1443,33 @@ def main():
         print("💡 .env ファイルを確認してください。")
         return
     
+    # Docker環境での入力問題を回避するため、環境変数でモード指定可能にする
+    run_mode = os.getenv("RUN_MODE", "interactive")
+    
+    if run_mode == "profile":
+        # 本番のデータを変更しないよう、データのコピーに対してボットを作成して計測
+        print("⏱️  プロファイルモード")
+        logger.info("プロファイルモード開始")
+        try:
+            report_file = run_profile(
+                lambda data_dir: FeedBot(data_dir=data_dir),
+                output_dir=getattr(config, 'PROFILE_OUTPUT_DIR', 'profiles'),
+                stub_ai=getattr(config, 'PROFILE_STUB_AI', True),
+                stub_mastodon=getattr(config, 'PROFILE_STUB_MASTODON', True),
+                ai_latency=getattr(config, 'PROFILE_STUB_AI_LATENCY_SECONDS', 0.0),
+                feed_cache_dir=getattr(config, 'PROFILE_FEED_CACHE_DIR', None),
+                top_n=getattr(config, 'PROFILE_TOP_N', 30),
+                memory_interval=getattr(config, 'PROFILE_MEMORY_SAMPLE_SECONDS', 1.0),
+                memory_frames=getattr(config, 'PROFILE_MEMORY_FRAMES', 1)
+            )
+        except Exception as e:
+            print(f"❌ プロファイル実行エラー: {e}")
+            logger.error(f"プロファイル実行エラー: {e}", exc_info=True)
+            return
+        print(f"✅ プロファイル結果: {report_file}")
+        logger.info("プロファイルモード完了")
+        return
+    
     try:
         bot = FeedBot()
         logger.info("FeedBot初期化完了")
@@ -492,9 +1482,6 @@ def main():
     print("✅ 初期化完了")
     logger.info("初期化完了")
     
-    # Docker環境での入力問題を回避するため、環境変数でモード指定可能にする
-    run_mode = os.getenv("RUN_MODE", "interactive")
-    
     if run_mode == "once":
         print("🚀 ワンショット実行モード")
         logger.info("ワンショット実行モード開始")
@@ -511,6 +1498,7 @@ def main():
         print("📊 ステータス確認モード")
         logger.info("ステータス確認モード")
         bot.show_status()
+        bot.close()
         return
     elif run_mode == "cleanup":
         print("🧹 クリーンアップモード")
@@ -518,6 +1506,7 @@ def main():
         bot.storage.cleanup_old_articles(config.ARTICLE_RETENTION_DAYS)
         read_record_days = getattr(config, 'READ_RECORD_RETENTION_DAYS', 3)
         bot.storage.cleanup_old_read_records(read_record_days)
+        bot.close()
         print("✅ クリーンアップ完了")
         logger.info("クリーンアップ完了")
         return
@@ -535,6 +1524,7 @@ def main():
     print("   RUN_MODE=daemon  # デーモン実行")
     print("   RUN_MODE=status  # ステータス確認")
     print("   RUN_MODE=cleanup # クリーンアップ")
+    print("   RUN_MODE=profile # プロファイル（データのコピーで1回計測）")
     
     while True:
         try:
@@ -583,6 +1573,8 @@ def main():
         except Exception as e:
             print(f"❌ エラーが発生しました: {e}")
             break
+    
+    bot.close()
 
 
 if __name__ == "__main__":
@@ -1,5 +1,30 @@
-from mastodon import Mastodon
-from typing import Optional
+import logging
+from mastodon import (Mastodon, MastodonAPIError, MastodonNotFoundError, MastodonRatelimitError,
+                      MastodonNetworkError, MastodonServerError)
+from datetime import datetime, timezone
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PostError(Exception):
+    """投稿失敗を表す例外（retryable: 再試行で成功する可能性がある一時的な失敗か）"""
+    
+    def __init__(self, message: str, retryable: bool = False, retry_at: Optional[datetime] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_at = retry_at
+
+
+class ScheduleLimitError(PostError):
+    """予約投稿の件数上限によりMastodonが予約を拒否した（別の日の枠で予約し直せば成功する）"""
+    
+    def __init__(self, message: str):
+        super().__init__(message, retryable=True)
+
+
+class StatusNotFoundError(PostError):
+    """編集しようとした投稿済みのステータスが削除されているなどで見つからない"""
 
 
 class MastodonService:
@@ -7,9 +32,11 @@ class MastodonService:
     
     def __init__(self, instance_url: str, access_token: str):
         try:
+            # レート制限は自前のスケジューラーで制御するため、超過時は待機せず例外にする
             self.mastodon = Mastodon(
                 access_token=access_token,
-                api_base_url=instance_url
+                api_base_url=instance_url,
+                ratelimit_method="throw"
             )
             print(f"Mastodonに接続しました: {instance_url}")
             
@@ -25,11 +52,20 @@ class MastodonService:
             print(f"Mastodon接続エラー: {e}")
             self.mastodon = None
     
-    def post_toot(self, content: str, visibility: str = "public") -> bool:
-        """投稿をMastodonに送信"""
+    def post_status(self, content: str, visibility: str = "public",
+                    idempotency_key: Optional[str] = None,
+                    scheduled_at: Optional[datetime] = None,
+                    in_reply_to_id: Optional[str] = None) -> str:
+        """
+        投稿をMastodonに送信し、ステータスIDを返す
+        
+        idempotency_keyを指定すると、タイムアウト後の再送でもサーバー側で重複投稿が防がれる
+        scheduled_atを指定すると予約投稿として登録し、予約投稿のIDを返す（5分以上先の日時が必要）
+        in_reply_to_idを指定するとその投稿への返信（スレッド）として投稿
+        失敗時は PostError を送出（一時的な失敗は retryable=True）
+        """
         if not self.mastodon:
-            print("Mastodonに接続されていません")
-            return False
+            raise PostError("Mastodonに接続されていません")
         
         # 公開範囲の検証
         valid_visibilities = ["public", "unlisted", "private", "direct"]
@@ -40,20 +76,110 @@ class MastodonService:
         try:
             # バージョンによってメソッド名が異なる場合に対応
             if hasattr(self.mastodon, 'status_post'):
-                result = self.mastodon.status_post(content, visibility=visibility)
-            elif hasattr(self.mastodon, 'toot'):
-                result = self.mastodon.toot(content, visibility=visibility)
+                result = self.mastodon.status_post(
+                    content,
+                    visibility=visibility,
+                    idempotency_key=idempotency_key,
+                    scheduled_at=scheduled_at,
+                    in_reply_to_id=in_reply_to_id
+                )
+            elif hasattr(self.mastodon, 'toot') and scheduled_at is None and in_reply_to_id is None:
+                result = self.mastodon.toot(content)
             else:
-                print("投稿メソッドが見つかりません")
-                return False
-                
-            print(f"投稿完了 ({visibility}): {result['id']}")
-            return True
+                raise PostError("投稿メソッドが見つかりません")
             
+            status_id = str(result['id'])
+            logger.debug("投稿API応答 (%s, 予約: %s): %s", visibility, scheduled_at, status_id)
+            return status_id
+        
+        except PostError:
+            raise
         except Exception as e:
-            print(f"投稿エラー: {e}")
-            print(f"投稿内容: {content[:100]}...")
+            if scheduled_at and self._is_schedule_limit_error(e):
+                raise ScheduleLimitError(f"予約投稿の上限: {e}")
+            raise self._to_post_error(e, "投稿エラー")
+    
+    def edit_status(self, status_id: str, content: str) -> str:
+        """
+        投稿済みのステータスを編集し、ステータスIDを返す
+        
+        失敗時は PostError を送出（一時的な失敗は retryable=True、ステータスが見つからない場合は StatusNotFoundError）
+        """
+        if not self.mastodon:
+            raise PostError("Mastodonに接続されていません")
+        
+        try:
+            result = self.mastodon.status_update(status_id, status=content)
+        except MastodonNotFoundError as e:
+            raise StatusNotFoundError(f"編集する投稿が見つかりません ({status_id}): {e}")
+        except Exception as e:
+            raise self._to_post_error(e, "投稿編集エラー")
+        logger.debug("投稿編集API応答: %s", status_id)
+        return str(result['id']) if result and 'id' in result else status_id
+    
+    @staticmethod
+    def _is_schedule_limit_error(error: Exception) -> bool:
+        """予約投稿の件数上限による検証エラー（422）か判定"""
+        if not isinstance(error, MastodonAPIError) or len(error.args) < 2 or error.args[1] != 422:
             return False
+        message = str(error).lower()
+        return "limit" in message or "上限" in message
+    
+    def _to_post_error(self, error: Exception, label: str) -> PostError:
+        """Mastodon.pyの例外を再試行の可否を付けた PostError に変換"""
+        if isinstance(error, MastodonRatelimitError):
+            rate_limit = self.get_rate_limit()
+            return PostError(f"レート制限: {error}", retryable=True, retry_at=rate_limit["reset"] if rate_limit else None)
+        if isinstance(error, (MastodonNetworkError, MastodonServerError)):
+            return PostError(f"一時的なエラー: {error}", retryable=True)
+        return PostError(f"{label}: {error}")
+    
+    def post_toot(self, content: str, visibility: str = "public",
+                  idempotency_key: Optional[str] = None) -> Optional[str]:
+        """投稿をMastodonに送信（成功時はステータスID、失敗時はNone）"""
+        try:
+            return self.post_status(content, visibility, idempotency_key)
+        except PostError as e:
+            logger.error(f"{e} - 投稿内容: {content[:100]}...")
+            return None
+    
+    def get_rate_limit(self) -> Optional[dict]:
+        """直近のAPI応答のX-RateLimit-*ヘッダーから得たレート制限情報を取得"""
+        if not self.mastodon:
+            return None
+        
+        remaining = getattr(self.mastodon, 'ratelimit_remaining', None)
+        reset = getattr(self.mastodon, 'ratelimit_reset', None)
+        if remaining is None or reset is None:
+            return None
+        
+        return {
+            "limit": getattr(self.mastodon, 'ratelimit_limit', None),
+            "remaining": int(remaining),
+            "reset": datetime.fromtimestamp(reset, timezone.utc)
+        }
+    
+    def get_scheduled_times(self) -> Optional[List[datetime]]:
+        """登録済みの予約投稿の日時一覧を取得（取得できない場合はNone）"""
+        if not self.mastodon:
+            return None
+        
+        try:
+            page = self.mastodon.scheduled_statuses()
+            scheduled = self.mastodon.fetch_remaining(page) if page else []
+        except Exception as e:
+            print(f"予約投稿の取得エラー: {e}")
+            return None
+        
+        times = []
+        for status in scheduled:
+            scheduled_at = status['scheduled_at']
+            if isinstance(scheduled_at, str):
+                scheduled_at = datetime.fromisoformat(scheduled_at.replace('Z', '+00:00'))
+            if scheduled_at.tzinfo is None:
+                scheduled_at = scheduled_at.replace(tzinfo=timezone.utc)
+            times.append(scheduled_at)
+        return sorted(times)
     
     def verify_credentials(self) -> bool:
         """認証情報の確認"""
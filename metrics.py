@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 秒単位の既定バケット（フィード取得・投稿・保存向け）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# AI呼び出し・チェック1回分など長い処理向けのバケット
+LONG_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1800)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class MetricsRegistry:
+    """メトリクスの登録先（Prometheusのテキスト形式で出力）"""
+
+    def __init__(self):
+        self._metrics: List['_Metric'] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: '_Metric'):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        """全メトリクスをテキスト形式で出力"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _Metric:
+    """ラベル付きメトリクスの共通部分"""
+
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional[MetricsRegistry] = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labelvalues: Tuple) -> Tuple[str, ...]:
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name}のラベル数が一致しません: {labelvalues}")
+        return tuple("" if value is None else str(value) for value in labelvalues)
+
+    def _label_text(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(f'{extra[0]}="{extra[1]}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """単調増加するカウンター"""
+
+    metric_type = "counter"
+
+    def inc(self, *labelvalues, amount: float = 1):
+        key = self._key(labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def total(self, **labels) -> float:
+        """指定したラベル値に一致する系列の合計（ラベル指定なしで全系列の合計）"""
+        with self._lock:
+            values = dict(self._values)
+        return sum(
+            value for key, value in values.items()
+            if all(key[self.labelnames.index(name)] == str(expected) for name, expected in labels.items())
+        )
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{self._label_text(key)} {_format_value(value)}" for key, value in sorted(values.items())]
+
+
+class Gauge(_Metric):
+    """現在値を表すゲージ"""
+
+    metric_type = "gauge"
+
+    def set(self, *labelvalues, value: float):
+        key = self._key(labelvalues)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{self._label_text(key)} {_format_value(value)}" for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    """値の分布を累積バケットで集計するヒストグラム"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional[MetricsRegistry] = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, *labelvalues, value: float):
+        key = self._key(labelvalues)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, *labelvalues):
+        """with文のブロックの所要時間（秒）を記録"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(*labelvalues, value=time.perf_counter() - started)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{self._label_text(key, ('le', _format_value(bound)))} {count}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {counts[-1]}")
+        return lines
+
+
+# フィード取得
+FEED_FETCH_SECONDS = Histogram("feedbot_feed_fetch_seconds", "フィードの取得と解析にかかった時間", ["feed"])
+FEED_FETCH_BYTES = Counter("feedbot_feed_fetch_bytes_total", "取得したフィードのバイト数", ["feed"])
+FEED_FETCH_ERRORS = Counter("feedbot_feed_fetch_errors_total", "フィード取得の失敗回数", ["feed"])
+FEED_ENTRIES_SEEN = Counter("feedbot_feed_entries_seen_total", "フィードから取得した記事数", ["feed"])
+FEED_ENTRIES_NEW = Counter("feedbot_feed_entries_new_total", "新着として処理対象になった記事数", ["feed"])
+
+# AI要約
+AI_REQUEST_SECONDS = Histogram("feedbot_ai_request_seconds", "AIサービス呼び出しの所要時間",
+                               ["provider", "outcome"], buckets=LONG_BUCKETS)
+AI_TOKENS = Counter("feedbot_ai_tokens_total", "AIサービスで消費したトークン数", ["provider", "direction"])
+AI_FALLBACKS = Counter("feedbot_ai_fallbacks_total", "次のAIサービスへ切り替えた回数", ["provider", "reason"])
+AI_FAILURES = Counter("feedbot_ai_failures_total", "すべてのAIサービスで要約に失敗した回数")
+
+# 投稿
+POST_SECONDS = Histogram("feedbot_post_seconds", "Mastodonへの投稿リクエストの所要時間", ["account"])
+POST_RESULTS = Counter("feedbot_posts_total", "投稿の結果（posted / retry / failed）", ["account", "outcome"])
+POST_QUEUE_DEPTH = Gauge("feedbot_post_queue_depth", "投稿待ちキューの件数", ["account"])
+
+# 永続化
+STORAGE_SECONDS = Histogram("feedbot_storage_seconds", "データファイルの読み込み・保存の所要時間", ["operation", "target"])
+
+# チェック全体
+CYCLE_SECONDS = Histogram("feedbot_cycle_seconds", "フィードチェック1回分の所要時間", buckets=LONG_BUCKETS)
+LAST_CYCLE_TIMESTAMP = Gauge("feedbot_last_cycle_timestamp_seconds", "最後にフィードチェックを終えたUNIX時刻")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"メトリクス要求: {self.address_string()} {format % args}")
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0", registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    """メトリクスを /metrics で公開するHTTPサーバーをバックグラウンドで起動"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    return server
@@ -1,6 +1,6 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 
 
 @dataclass
@@ -16,6 +16,13 @@ class FeedItem:
     summary: Optional[str] = None
     posted_to_mastodon: bool = False
     read_at: Optional[datetime] = None  # 読み取り日時を追加
+    status_id: Optional[str] = None  # 投稿したMastodonステータスのID
+    scheduled_at: Optional[datetime] = None  # 予約投稿の公開予定日時（予約時のstatus_idは予約投稿のID）
+    account_status_ids: Dict[str, str] = field(default_factory=dict)  # 投稿先アカウント名 -> ステータスID
+    skip_reason: Optional[str] = None  # 要約・投稿せずに既読扱いにした理由（bootstrap / stale / duplicate）
+    duplicate_of: Optional[str] = None  # ほぼ重複と判定した元記事のID
+    fingerprint: Optional[str] = None  # 正規化したタイトル＋本文のハッシュ（更新検出用）
+    claimed_by: Optional[str] = None  # ワーカーモードで処理中のワーカーID（処理完了で解除）
 
 
 @dataclass
@@ -25,3 +32,46 @@ class FeedSource:
     name: str
     enabled: bool = True
     last_checked: Optional[datetime] = None
+    bootstrapped: bool = False  # 追加時の既存エントリの一括既読化が済んでいるか
+    priority: float = 1.0  # 新着記事の処理順の重み（大きいほど優先）
+    update_policy: str = "ignore"  # 既存記事が更新された場合の扱い（ignore / resummarize / edit）
+
+
+@dataclass
+class MastodonAccount:
+    """投稿先Mastodonアカウントの設定"""
+    name: str
+    instance_url: str
+    access_token: str
+    visibility: str = "direct"
+    template: str = ""
+    feeds: Optional[List[str]] = None  # 投稿対象のフィード名（Noneは全フィード）
+    
+    def handles_feed(self, feed_name: str) -> bool:
+        """指定フィードの記事をこのアカウントに投稿するか判定"""
+        return not self.feeds or feed_name in self.feeds
+
+
+@dataclass
+class PendingPost:
+    """投稿待ちキューの要素"""
+    article_id: str
+    content: str
+    visibility: str
+    created_at: datetime
+    attempts: int = 0  # 投稿を試行した回数
+    next_attempt_at: Optional[datetime] = None  # 再試行可能になる日時
+    last_error: Optional[str] = None
+    reply_to: Optional[str] = None  # スレッドの親投稿のarticle_id（同じキュー内）
+    in_reply_to_id: Optional[str] = None  # 親投稿の投稿後に設定される返信先ステータスID
+    related_article_ids: List[str] = field(default_factory=list)  # まとめ投稿に含まれる記事のID
+    status_id: Optional[str] = None  # 投稿成功時に設定されるステータスID
+    scheduled_at: Optional[datetime] = None  # 予約投稿として登録した日時
+    edit_status_id: Optional[str] = None  # 編集する投稿済みステータスのID（指定時は新規投稿せずに編集）
+    summary: Optional[str] = None  # 記事の更新による投稿で、成功時に記事へ反映する要約
+    fingerprint: Optional[str] = None  # 同上の記事の指紋
+    
+    @property
+    def idempotency_key(self) -> str:
+        """記事IDから導出する冪等キー（再送時もサーバー側で重複投稿を防ぐ）"""
+        return f"tsukino-feedbot-{self.article_id}"
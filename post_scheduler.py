@@ -0,0 +1,297 @@
+import time
+import bisect
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from models import PendingPost
+from storage import DataStorage
+from mastodon_service import MastodonService, PostError, ScheduleLimitError, StatusNotFoundError
+from quiet_hours import next_allowed_time
+from metrics import POST_SECONDS, POST_RESULTS, POST_QUEUE_DEPTH
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# 予約投稿の制約（Mastodonは5分以上先の日時のみ受け付け、1日（UTC）25件・合計300件まで）
+SCHEDULE_MIN_LEAD = timedelta(minutes=6)
+SCHEDULE_DAILY_LIMIT = 25
+SCHEDULE_TOTAL_LIMIT = 300
+
+
+class PostScheduler:
+    """投稿待ちキューを永続化し、インスタンスのレート制限に合わせて投稿を送出するクラス"""
+
+    def __init__(self, mastodon_service: MastodonService, storage: DataStorage,
+                 min_interval: float = 60, rate_limit_reserve: int = 5,
+                 max_attempts: int = 5, retry_base_delay: float = 60,
+                 mode: str = "immediate", schedule_spacing: float = 600,
+                 quiet_hours: Optional[Tuple[int, int]] = None, account: Optional[str] = None):
+        """
+        Args:
+            mastodon_service: 投稿に使うMastodonサービス
+            storage: キューの永続化先
+            min_interval: 投稿間の最小間隔（秒、目標レート）
+            rate_limit_reserve: 残り回数がこの値以下になったらリセットまで待機
+            max_attempts: 一時的な失敗を再試行する最大回数（これを超えたら破棄）
+            retry_base_delay: 再試行の初回待機秒数（以降は倍々に延長）
+            mode: immediate（待機して即時投稿）または scheduled（予約投稿として登録し待機しない）
+            schedule_spacing: scheduled時の予約枠の間隔（秒）
+            quiet_hours: scheduled時に予約を避ける時間帯 (開始時, 終了時)（ローカル時間）
+            account: 投稿先アカウント名（キューはアカウントごとに永続化）
+        """
+        self.mastodon_service = mastodon_service
+        self.storage = storage
+        self.min_interval = min_interval
+        self.rate_limit_reserve = rate_limit_reserve
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.mode = mode
+        self.schedule_spacing = timedelta(seconds=schedule_spacing)
+        self.quiet_hours = quiet_hours
+        self.account = account
+        self.queue: List[PendingPost] = storage.load_post_queue(account)
+        self._last_post_at: Optional[float] = None  # time.monotonic() 基準
+
+        POST_QUEUE_DEPTH.set(self.account or "default", value=len(self.queue))
+        if self.queue:
+            logger.info(f"前回の投稿待ちキューを{len(self.queue)}件復元しました ({account or 'default'})")
+
+        # 二重予約を避けるため、登録済みの予約枠を起動時に取得
+        self._booked_slots: Optional[List[datetime]] = None
+        self._full_days = set()  # サーバーが上限に達したと応答した予約日（UTC）
+        if self.mode == "scheduled":
+            self._load_booked_slots()
+
+    @property
+    def pending_count(self) -> int:
+        """投稿待ちの件数"""
+        return len(self.queue)
+
+    @property
+    def due_count(self) -> int:
+        """再試行待ちを除き、今すぐ投稿できる件数"""
+        now = datetime.now(timezone.utc)
+        return sum(1 for post in self.queue if self._is_due(post, now))
+
+    def _save_queue(self):
+        """キューを永続化し、キューの件数のメトリクスを更新"""
+        self.storage.save_post_queue(self.queue, self.account)
+        POST_QUEUE_DEPTH.set(self.account or "default", value=len(self.queue))
+    
+    def adopt(self, posts: List[PendingPost]) -> int:
+        """他のワーカーから引き継いだ投稿をキューに追加して保存（キューにある記事の投稿は重複させない）"""
+        queued = {post.article_id for post in self.queue}
+        adopted = [post for post in posts if post.article_id not in queued]
+        if adopted:
+            self.queue.extend(adopted)
+            self._save_queue()
+        return len(adopted)
+    
+    def is_queued(self, article_id: str) -> bool:
+        """指定したIDの投稿がキューにあるか"""
+        return any(post.article_id == article_id for post in self.queue)
+
+    def enqueue(self, article_id: str, content: str, visibility: str,
+                reply_to: Optional[str] = None, related_article_ids: Optional[List[str]] = None,
+                in_reply_to_id: Optional[str] = None, edit_status_id: Optional[str] = None,
+                summary: Optional[str] = None, fingerprint: Optional[str] = None):
+        """
+        投稿をキューに追加して保存
+
+        reply_to: 返信先となる同じキュー内の投稿のarticle_id、in_reply_to_id: 返信先の投稿済みステータスID、
+        edit_status_id: 新規投稿せずに編集する投稿済みステータスのID、
+        summary / fingerprint: 記事の更新による投稿で、成功時に記事へ反映する要約と指紋
+        """
+        self.queue.append(PendingPost(
+            article_id=article_id,
+            content=content,
+            visibility=visibility,
+            created_at=datetime.now(timezone.utc),
+            reply_to=reply_to,
+            in_reply_to_id=in_reply_to_id,
+            related_article_ids=related_article_ids or [],
+            edit_status_id=edit_status_id,
+            summary=summary,
+            fingerprint=fingerprint
+        ))
+        self._save_queue()
+
+    def next_delay(self) -> float:
+        """次の投稿まで待つべき秒数"""
+        delay = 0.0
+
+        # 目標レートに合わせた投稿間隔（予約投稿では投稿時刻をサーバー側に任せるため待機しない）
+        if self._last_post_at is not None and self.mode != "scheduled":
+            delay = max(delay, self.min_interval - (time.monotonic() - self._last_post_at))
+
+        # インスタンスが残り回数の枯渇を示している場合のみリセットまで待機
+        rate_limit = self.mastodon_service.get_rate_limit()
+        if rate_limit and rate_limit["remaining"] <= self.rate_limit_reserve:
+            until_reset = (rate_limit["reset"] - datetime.now(timezone.utc)).total_seconds()
+            if until_reset > 0:
+                logger.info(f"レート制限の残り{rate_limit['remaining']}回: リセットまで{until_reset:.0f}秒待機")
+                delay = max(delay, until_reset)
+
+        return delay
+
+    def post_next(self) -> Optional[Tuple[PendingPost, str]]:
+        """
+        投稿可能な先頭の投稿を送信
+
+        成功した投稿と恒久的な失敗・再試行上限に達した投稿はキューから取り除き、
+        一時的な失敗はバックオフ後に再試行する（冪等キーにより再送での重複投稿は発生しない）
+
+        Returns:
+            (投稿, 結果)。結果は posted / retry / failed。投稿可能なものがない場合はNone
+        """
+        now = datetime.now(timezone.utc)
+        post = self._next_due(now)
+        if post is None:
+            return None
+
+        post.attempts += 1
+        account = self.account or "default"
+        try:
+            # 編集は予約できないため、予約投稿モードでもその場で反映する
+            scheduled_at = self._plan_slot(now) if self.mode == "scheduled" and not post.edit_status_id else None
+            with POST_SECONDS.time(account), span("post.toot", account=account, article_id=post.article_id,
+                                                  attempt=post.attempts, scheduled=scheduled_at is not None,
+                                                  edit=post.edit_status_id is not None):
+                if post.edit_status_id:
+                    post.status_id = self.mastodon_service.edit_status(post.edit_status_id, post.content)
+                else:
+                    post.status_id = self.mastodon_service.post_status(
+                        post.content, post.visibility,
+                        idempotency_key=post.idempotency_key,
+                        scheduled_at=scheduled_at,
+                        in_reply_to_id=post.in_reply_to_id
+                    )
+            if scheduled_at:
+                post.scheduled_at = scheduled_at
+                bisect.insort(self._booked_slots, scheduled_at)
+            outcome = "posted"
+        except StatusNotFoundError as e:
+            # 編集元の投稿が削除されている場合は新しい投稿として送り直す
+            post.last_error = str(e)
+            post.edit_status_id = None
+            post.next_attempt_at = now
+            logger.warning(f"編集元の投稿が見つからないため新規投稿に切り替えます: {post.article_id}")
+            outcome = "retry"
+        except ScheduleLimitError as e:
+            # 他のクライアントの予約などで上限に達していた日は候補から外し、予約状況を取得し直して翌日以降の枠ですぐに再試行
+            post.last_error = str(e)
+            self._full_days.add(scheduled_at.date())
+            self._booked_slots = None
+            if post.attempts < self.max_attempts:
+                post.next_attempt_at = now
+                logger.warning(f"予約日の上限に達していたため翌日以降に予約し直します: {post.article_id} - {scheduled_at.date()}")
+                outcome = "retry"
+            else:
+                logger.error(f"投稿を破棄 ({post.attempts}回試行): {post.article_id} - {e}")
+                outcome = "failed"
+        except PostError as e:
+            post.last_error = str(e)
+            if e.retryable and post.attempts < self.max_attempts:
+                # レート制限はリセット時刻まで、それ以外は指数バックオフで待機
+                delay = self.retry_base_delay * (2 ** (post.attempts - 1))
+                post.next_attempt_at = max(e.retry_at or now, now + timedelta(seconds=delay))
+                logger.warning(
+                    f"投稿を再試行予定 ({post.attempts}/{self.max_attempts}回目失敗): "
+                    f"{post.article_id} - {e} - {post.next_attempt_at.isoformat()}"
+                )
+                outcome = "retry"
+            else:
+                logger.error(f"投稿を破棄 ({post.attempts}回試行): {post.article_id} - {e}")
+                outcome = "failed"
+        finally:
+            self._last_post_at = time.monotonic()
+
+        POST_RESULTS.inc(account, outcome)
+        if outcome != "retry":
+            self.queue.remove(post)
+            self._resolve_replies(post, outcome)
+        self._save_queue()
+        return post, outcome
+
+    def _resolve_replies(self, parent: PendingPost, outcome: str):
+        """親投稿の結果をスレッドの返信に反映（親が失敗した場合は単独の投稿にする）"""
+        for post in self.queue:
+            if post.reply_to == parent.article_id:
+                if outcome == "posted":
+                    post.in_reply_to_id = parent.status_id
+                else:
+                    post.reply_to = None
+
+    def _next_due(self, now: datetime) -> Optional[PendingPost]:
+        """
+        投稿可能な先頭の投稿を取得
+
+        予約投稿モードでは投稿禁止時間帯もキューを処理するため、その場で反映される編集は時間帯の終了まで延期する
+        """
+        deferred = False
+        try:
+            for post in self.queue:
+                if not self._is_due(post, now):
+                    continue
+                if post.edit_status_id and self.quiet_hours:
+                    allowed = self._skip_quiet_hours(now)
+                    if allowed > now:
+                        post.next_attempt_at = allowed
+                        deferred = True
+                        continue
+                return post
+            return None
+        finally:
+            if deferred:
+                self._save_queue()
+
+    @staticmethod
+    def _is_due(post: PendingPost, now: datetime) -> bool:
+        # スレッドの返信は親投稿のステータスIDが決まるまで待つ
+        if post.reply_to and not post.in_reply_to_id:
+            return False
+        return post.next_attempt_at is None or post.next_attempt_at <= now
+
+    def _load_booked_slots(self) -> bool:
+        """登録済みの予約投稿の日時を取得（失敗時は次回の予約時に再取得）"""
+        booked = self.mastodon_service.get_scheduled_times()
+        if booked is None:
+            logger.warning("登録済みの予約投稿を取得できませんでした")
+            return False
+        self._booked_slots = booked
+        logger.info(f"登録済みの予約投稿: {len(booked)}件")
+        return True
+
+    def _plan_slot(self, now: datetime) -> datetime:
+        """
+        次の予約枠を計算
+
+        既存の予約から schedule_spacing 以上離し、投稿禁止時間帯と1日の上限を避けた最も早い日時を返す
+        """
+        if self._booked_slots is None and not self._load_booked_slots():
+            raise PostError("予約済みの枠が不明なため予約を保留します", retryable=True)
+
+        booked = self._booked_slots = [slot for slot in self._booked_slots if slot > now]
+        self._full_days = {day for day in self._full_days if day >= now.date()}
+        if len(booked) >= SCHEDULE_TOTAL_LIMIT:
+            raise PostError("予約投稿の上限に達しています", retryable=True, retry_at=booked[0])
+
+        candidate = self._skip_quiet_hours(now + SCHEDULE_MIN_LEAD)
+        while True:
+            conflict = next((slot for slot in booked if abs(candidate - slot) < self.schedule_spacing), None)
+            if conflict:
+                candidate = self._skip_quiet_hours(conflict + self.schedule_spacing)
+                continue
+            if (candidate.date() in self._full_days
+                    or sum(1 for slot in booked if slot.date() == candidate.date()) >= SCHEDULE_DAILY_LIMIT):
+                next_day = candidate.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+                candidate = self._skip_quiet_hours(next_day)
+                continue
+            return candidate
+
+    def _skip_quiet_hours(self, moment: datetime) -> datetime:
+        """投稿禁止時間帯であれば終了時刻まで進める（判定はローカル時間）"""
+        if not self.quiet_hours:
+            return moment
+        start, end = self.quiet_hours
+        return next_allowed_time(moment.astimezone(), start, end).astimezone(timezone.utc)
@@ -0,0 +1,320 @@
+import contextlib
+import cProfile
+import hashlib
+import io
+import json
+import logging
+import pstats
+import shutil
+import threading
+import time
+import tracemalloc
+import types
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+import feed_reader
+from ai_base import AIServiceBase
+from tracing import TRACER
+from trace_report import load_spans, build_traces, print_stage_breakdown, print_critical_path
+
+logger = logging.getLogger(__name__)
+
+
+class StubMastodonService:
+    """プロファイル用のMastodonサービス（投稿せずに連番のステータスIDを返す）"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.posted: List[str] = []
+        self._lock = threading.Lock()
+
+    def post_status(self, content: str, visibility: str = "public",
+                    idempotency_key: Optional[str] = None,
+                    scheduled_at: Optional[datetime] = None,
+                    in_reply_to_id: Optional[str] = None) -> str:
+        with self._lock:
+            self.posted.append(content)
+            return f"stub-{self.name}-{len(self.posted)}"
+
+    def edit_status(self, status_id: str, content: str) -> str:
+        return status_id
+
+    def get_rate_limit(self) -> Optional[dict]:
+        return None
+
+    def get_scheduled_times(self) -> Optional[List[datetime]]:
+        return []
+
+    def verify_credentials(self) -> bool:
+        return True
+
+
+@contextlib.contextmanager
+def stub_ai_services(services: List[AIServiceBase], latency: float = 0.0):
+    """
+    AIサービスのHTTP呼び出しをその場で返す要約に置き換える
+
+    ルーティング・予算・フォールバック・使用量台帳の処理はそのまま通るよう、各サービスクラスの
+    generate_summary / agenerate_summary / is_available だけを差し替え、終了時に元に戻す
+    """
+    def make_usage(content: str) -> dict:
+        return {"input_tokens": len(content) // 4, "output_tokens": 120, "total_tokens": len(content) // 4 + 120,
+                "token_limit_reached": False, "token_warning": False}
+
+    def generate_summary(self, title: str, content: str, prompt_template: str) -> str:
+        if latency:
+            time.sleep(latency)
+        self._local.last_usage = make_usage(content)
+        return f"[stub] {title[:80]}"
+
+    async def agenerate_summary(self, title: str, content: str, prompt_template: str, session=None) -> str:
+        import asyncio
+        if latency:
+            await asyncio.sleep(latency)
+        self._local.last_usage = make_usage(content)
+        return f"[stub] {title[:80]}"
+
+    patched = []
+    for cls in {type(service) for service in services}:
+        for name, replacement in (("generate_summary", generate_summary),
+                                  ("agenerate_summary", agenerate_summary),
+                                  ("is_available", lambda self: True),
+                                  ("warm_up", lambda self: True)):
+            patched.append((cls, name, cls.__dict__.get(name)))
+            setattr(cls, name, replacement)
+    try:
+        yield
+    finally:
+        for cls, name, original in reversed(patched):
+            if original is None:
+                delattr(cls, name)
+            else:
+                setattr(cls, name, original)
+
+
+class _CachedResponse:
+    """キャッシュから復元したフィードのHTTP応答"""
+
+    def __init__(self, url: str, content: bytes, headers: Dict[str, str], status_code: int = 200):
+        self.url = url
+        self.content = content
+        self.headers = headers
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        pass
+
+
+@contextlib.contextmanager
+def feed_response_cache(cache_dir: Path):
+    """
+    フィードの取得結果をディレクトリに保存し、次回以降は保存した応答を使う
+
+    同じ入力で繰り返し計測できるよう、FeedReader が使う requests.get だけを差し替える
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    stats = {"hit": 0, "miss": 0}
+
+    def cached_get(url, **kwargs):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        body_file = cache_dir / f"{key}.body"
+        meta_file = cache_dir / f"{key}.json"
+        if body_file.exists() and meta_file.exists():
+            stats["hit"] += 1
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            return _CachedResponse(meta["url"], body_file.read_bytes(), meta["headers"], meta["status_code"])
+
+        stats["miss"] += 1
+        response = requests.get(url, **kwargs)
+        response.raise_for_status()
+        body_file.write_bytes(response.content)
+        with open(meta_file, 'w', encoding='utf-8') as f:
+            json.dump({"url": response.url, "status_code": response.status_code,
+                       "headers": dict(response.headers), "requested_url": url}, f, ensure_ascii=False, indent=2)
+        return response
+
+    original = feed_reader.requests
+    feed_reader.requests = types.SimpleNamespace(get=cached_get, exceptions=requests.exceptions)
+    try:
+        yield stats
+    finally:
+        feed_reader.requests = original
+
+
+class MemorySampler:
+    """
+    tracemalloc のスナップショットを一定間隔で取り、確保箇所ごとの最大使用量を記録するクラス
+
+    終了時点のスナップショットだけでは処理中に解放されたメモリが見えないため、途中の最大値を残す
+    """
+
+    def __init__(self, interval: float = 1.0, frames: int = 1):
+        self.interval = interval
+        self.frames = frames
+        self.peaks: Dict[str, Tuple[int, int]] = {}  # 確保箇所 -> (最大バイト数, その時点の確保回数)
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.sample()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces(self._filters)
+        for stat in snapshot.statistics("traceback" if self.frames > 1 else "lineno"):
+            key = " <- ".join(f"{frame.filename}:{frame.lineno}" for frame in stat.traceback)
+            if stat.size > self.peaks.get(key, (0, 0))[0]:
+                self.peaks[key] = (stat.size, stat.count)
+        self.samples += 1
+
+    def top(self, limit: int) -> List[Tuple[str, int, int]]:
+        ranked = sorted(self.peaks.items(), key=lambda item: item[1][0], reverse=True)
+        return [(site, size, count) for site, (size, count) in ranked[:limit]]
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GiB"
+
+
+def run_profile(bot_factory: Callable[[str], object], data_dir: str = "data", output_dir: str = "profiles",
+                stub_ai: bool = True, stub_mastodon: bool = True, ai_latency: float = 0.0,
+                feed_cache_dir: Optional[str] = None, top_n: int = 30,
+                memory_interval: float = 1.0, memory_frames: int = 1) -> Path:
+    """
+    データのコピーに対してフィードチェックを1回実行し、プロファイル結果をレポートに書き出す
+
+    Args:
+        bot_factory: データディレクトリを受け取って FeedBot を作る関数
+        data_dir: コピー元のデータディレクトリ（本番のデータは変更しない）
+        output_dir: 結果の出力先（profile_<日時>/ に report.txt・cprofile.prof・trace.jsonl を出力）
+        stub_ai: AIサービスの呼び出しをその場で返す要約に置き換える
+        stub_mastodon: Mastodonへの投稿を行わず、投稿間隔の待機もしない
+        ai_latency: AIのスタブが応答するまでの秒数（実際の待ち時間を模擬する場合）
+        feed_cache_dir: 指定時はフィードの応答をここに保存し、次回以降は保存した応答を使う
+        top_n: レポートに載せる関数・確保箇所の件数
+        memory_interval: メモリのスナップショットを取る間隔（秒）
+        memory_frames: 確保箇所として記録する呼び出し履歴の深さ
+
+    Returns:
+        レポートファイルのパス
+    """
+    started_at = datetime.now(timezone.utc)
+    run_dir = Path(output_dir) / f"profile_{started_at.strftime('%Y%m%d_%H%M%S')}"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    work_data_dir = run_dir / "data"
+    if Path(data_dir).exists():
+        shutil.copytree(data_dir, work_data_dir,
+                        ignore=shutil.ignore_patterns("*.lock", "*.tmp", "*.bak", "leases.json"))
+    else:
+        work_data_dir.mkdir()
+    logger.info(f"プロファイル実行: データを {work_data_dir} にコピーしました")
+
+    trace_file = run_dir / "trace.jsonl"
+    previous_trace_path = TRACER.path
+    TRACER.configure(str(trace_file))
+
+    tracemalloc.start(max(1, memory_frames))
+    sampler = MemorySampler(memory_interval, memory_frames)
+    profiler = cProfile.Profile()
+    bot = None
+    stub_services: Dict[str, StubMastodonService] = {}
+    cache_stats = None
+    wall_seconds = 0.0
+    with contextlib.ExitStack() as stack:
+        try:
+            bot = bot_factory(str(work_data_dir))
+            if stub_ai:
+                stack.enter_context(stub_ai_services(bot.ai_service.services, ai_latency))
+            if stub_mastodon:
+                for name, scheduler in bot.post_schedulers.items():
+                    stub_services[name] = StubMastodonService(name)
+                    scheduler.mastodon_service = stub_services[name]
+                    scheduler.min_interval = 0
+                    bot.mastodon_services[name] = stub_services[name]
+            if feed_cache_dir:
+                cache_stats = stack.enter_context(feed_response_cache(Path(feed_cache_dir)))
+
+            tracemalloc.reset_peak()
+            sampler.start()
+            cycle_started = time.perf_counter()
+            profiler.enable()
+            try:
+                bot._run_cycle()
+            finally:
+                profiler.disable()
+                wall_seconds = time.perf_counter() - cycle_started
+                sampler.stop()
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            TRACER.configure(previous_trace_path)
+            if bot is not None:
+                bot.close()
+
+    profiler.dump_stats(str(run_dir / "cprofile.prof"))
+    report_file = run_dir / "report.txt"
+    with open(report_file, 'w', encoding='utf-8') as f:
+        f.write(f"=== Tsukino Feedbot プロファイル ({started_at.strftime('%Y-%m-%d %H:%M:%S UTC')}) ===\n")
+        f.write(f"フィードチェック所要時間: {wall_seconds:.2f}秒\n")
+        f.write(f"AI: {'スタブ' if stub_ai else '実サービス'}"
+                f"{f' (応答 {ai_latency}秒)' if stub_ai and ai_latency else ''} / "
+                f"Mastodon: {'スタブ' if stub_mastodon else '実サービス（実際に投稿されます）'}"
+                f"{f' (投稿{sum(len(s.posted) for s in stub_services.values())}件)' if stub_mastodon else ''}\n")
+        if cache_stats is not None:
+            f.write(f"フィード: キャッシュ {feed_cache_dir} (再利用{cache_stats['hit']}件, 新規取得{cache_stats['miss']}件)\n")
+        f.write(f"メモリ: 最大 {_format_bytes(peak)} / 終了時 {_format_bytes(current)} "
+                f"(スナップショット{sampler.samples}回、取得中は処理が止まるため所要時間がその分伸びます)\n")
+        f.write("cProfile はメインスレッドのみを計測します（チャンク要約・複数アカウント投稿のスレッドは段階別の時間を参照）\n")
+
+        f.write(f"\n■ 累積時間の長い関数 (上位{top_n}件)\n")
+        buffer = io.StringIO()
+        pstats.Stats(profiler, stream=buffer).sort_stats("cumulative").print_stats(top_n)
+        f.write(buffer.getvalue())
+
+        f.write(f"\n■ 関数自身の時間の長い関数 (上位{top_n}件)\n")
+        buffer = io.StringIO()
+        pstats.Stats(profiler, stream=buffer).sort_stats("tottime").print_stats(top_n)
+        f.write(buffer.getvalue())
+
+        f.write(f"\n■ 確保箇所ごとの最大メモリ (上位{top_n}件)\n")
+        for site, size, count in sampler.top(top_n):
+            f.write(f"{_format_bytes(size):>12} {count:>9}個  {site}\n")
+
+        roots = list(build_traces(load_spans(str(trace_file))).values())
+        if roots:
+            buffer = io.StringIO()
+            with contextlib.redirect_stdout(buffer):
+                print_stage_breakdown(roots)
+                print(f"\n■ クリティカルパス")
+                print(f"  {'cycle':<38}{roots[-1].duration:>9.2f}s {1:>7.1%}")
+                print_critical_path(roots[-1], roots[-1].duration or 1.0, depth=3, indent=1)
+            f.write(buffer.getvalue())
+
+    logger.info(f"プロファイル結果を出力しました: {report_file}")
+    return report_file
@@ -0,0 +1,20 @@
+from datetime import datetime, timedelta
+
+
+def is_quiet_hour(hour: int, start: int, end: int) -> bool:
+    """指定時刻（時）が投稿禁止時間帯に含まれるか判定"""
+    if start <= end:
+        # 日をまたがない場合（例: 9-17）
+        return start <= hour < end
+    # 日をまたぐ場合（例: 23-7）
+    return hour >= start or hour < end
+
+
+def next_allowed_time(moment: datetime, start: int, end: int) -> datetime:
+    """投稿禁止時間帯であれば終了時刻まで進めた日時を返す（時間帯の判定はmomentのタイムゾーン基準）"""
+    if not is_quiet_hour(moment.hour, start, end):
+        return moment
+    allowed = moment.replace(hour=end, minute=0, second=0, microsecond=0)
+    if allowed <= moment:
+        allowed += timedelta(days=1)
+    return allowed
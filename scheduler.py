@@ -0,0 +1,87 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from quiet_hours import next_allowed_time
+
+
+class CycleScheduler:
+    """
+    フィードチェックの実行時刻を決めるスケジューラー
+
+    実行は壁時計の周期境界（例: 15分間隔なら毎時0/15/30/45分）に揃えるため、処理時間で周期がずれない。
+    待機は単調時計で行い、wake() で即座に中断できる
+    """
+
+    def __init__(self, interval_seconds: float, jitter_seconds: float = 0,
+                 quiet_hours: Optional[Tuple[int, int]] = None,
+                 quiet_interval_seconds: Optional[float] = None):
+        """
+        Args:
+            interval_seconds: 実行間隔（秒）
+            jitter_seconds: 各実行時刻に加える0〜指定秒のランダムな遅延
+            quiet_hours: 投稿禁止時間帯 (開始時, 終了時)（ローカル時間、終了時刻には必ず実行）
+            quiet_interval_seconds: 投稿禁止時間帯の実行間隔（秒、Noneの場合は時間帯中は実行しない）
+        """
+        self.interval_seconds = interval_seconds
+        self.jitter_seconds = jitter_seconds
+        self.quiet_hours = quiet_hours
+        self.quiet_interval_seconds = quiet_interval_seconds
+        # wake() のたびに世代を進め、待機中のすべてのスレッドを起こす
+        self._condition = threading.Condition()
+        self._generation = 0
+
+    def next_run_time(self, now: Optional[datetime] = None) -> datetime:
+        """次の実行時刻（ローカル時間）"""
+        now = now or datetime.now().astimezone()
+        boundary = self._next_boundary(now, self.interval_seconds)
+
+        if self.quiet_hours:
+            start, end = self.quiet_hours
+            window_end = next_allowed_time(boundary, start, end)
+            if window_end != boundary and self.quiet_interval_seconds:
+                # 時間帯中は低頻度で実行し、終了時刻には必ず実行
+                quiet_boundary = self._next_boundary(now, max(self.interval_seconds, self.quiet_interval_seconds))
+                boundary = min(quiet_boundary, window_end)
+            else:
+                boundary = window_end
+
+        if self.jitter_seconds > 0:
+            boundary += timedelta(seconds=random.uniform(0, self.jitter_seconds))
+        return boundary
+
+    @staticmethod
+    def _next_boundary(now: datetime, interval_seconds: float) -> datetime:
+        """ローカル時刻の0時を基準とした次の周期境界"""
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        elapsed = (now - midnight).total_seconds()
+        return midnight + timedelta(seconds=(elapsed // interval_seconds + 1) * interval_seconds)
+
+    def wait_until(self, run_at: datetime) -> bool:
+        """
+        指定時刻まで待機
+
+        Returns:
+            指定時刻に達した場合はTrue、wake() で中断された場合はFalse
+        """
+        delay = (run_at - datetime.now().astimezone()).total_seconds()
+        return self.sleep(delay)
+
+    def sleep(self, seconds: float) -> bool:
+        """単調時計で指定秒数待機（wake() で中断された場合はFalse）"""
+        deadline = time.monotonic() + max(0.0, seconds)
+        with self._condition:
+            generation = self._generation
+            while self._generation == generation:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return True
+                self._condition.wait(remaining)
+            return False
+
+    def wake(self):
+        """待機中のすべてのスレッドを即座に起こす（シグナルハンドラーから呼び出し可能）"""
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
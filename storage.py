@@ -1,155 +1,442 @@
+import functools
 import json
+import logging
 import os
+import re
+import shutil
+from contextlib import nullcontext
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List, Optional
-from models import FeedItem, FeedSource
+from typing import Dict, List, Optional
+from models import FeedItem, FeedSource, PendingPost
+from lease_manager import FileLock
+from metrics import STORAGE_SECONDS
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+def _timed(operation: str, target: str):
+    """読み込み・保存の所要時間をメトリクスとトレースに記録するデコレーター"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with STORAGE_SECONDS.time(operation, target), span(f"storage.{operation}", target=target):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
 
 
 class DataStorage:
     """JSONファイルでのデータ永続化を管理するクラス"""
     
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", worker_id: Optional[str] = None):
+        """
+        Args:
+            data_dir: データディレクトリ
+            worker_id: ワーカーモードのワーカーID（指定時は複数プロセスでデータディレクトリを共有し、
+                       保存はファイルロックの下で自分が変更したレコードだけをマージする）
+        """
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
         self.feeds_file = self.data_dir / "feeds.json"
         self.articles_file = self.data_dir / "articles.json"
+        self.post_queue_file = self.data_dir / "post_queue.json"
+        self.meta_file = self.data_dir / "meta.json"
+        self.worker_id = worker_id
+        self.lock = FileLock(self.data_dir / "storage.lock") if worker_id else nullcontext()
         
         # 初期ファイルが存在しない場合は空のファイルを作成
-        if not self.articles_file.exists():
-            self.save_articles([])
-        if not self.feeds_file.exists():
-            self.save_feed_sources([])
+        with self.lock:
+            if not self.articles_file.exists():
+                self.save_articles([], replace=True)
+            if not self.feeds_file.exists():
+                self.save_feed_sources([])
+    
+    @property
+    def shared(self) -> bool:
+        """複数のワーカーでデータディレクトリを共有しているか"""
+        return self.worker_id is not None
+    
+    def _read_json(self, path: Path, default):
+        if not path.exists():
+            return default
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _write_json_atomic(self, path: Path, data, indent: Optional[int] = 2):
+        """一時ファイルに書き出してから置き換え（読み込み側が書きかけのファイルを見ない）"""
+        temp_file = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+        os.replace(temp_file, path)
+    
+    @staticmethod
+    def _merge_records(stored: List[dict], records: list, key: str, to_dict) -> List[dict]:
+        """
+        保存済みのレコードに、読み込み後に変更されたレコードだけを上書き・追加
+        
+        読み込み時の内容は各オブジェクトの _saved_state に記録しておき、変わっていないレコードは
+        他のワーカーの更新を上書きしないよう書き込まない
+        """
+        merged = {item[key]: item for item in stored}
+        for record in records:
+            item = to_dict(record)
+            if getattr(record, '_saved_state', None) != item:
+                merged[item[key]] = item
+            record._saved_state = item
+        return list(merged.values())
+    
+    def _feed_source_from_dict(self, item: dict) -> FeedSource:
+        last_checked = None
+        if item.get('last_checked'):
+            last_checked = datetime.fromisoformat(item['last_checked'])
+            # タイムゾーン情報がない場合はUTCとして扱う
+            if last_checked.tzinfo is None:
+                last_checked = last_checked.replace(tzinfo=timezone.utc)
+        
+        source = FeedSource(
+            url=item['url'],
+            name=item['name'],
+            enabled=item.get('enabled', True),
+            last_checked=last_checked,
+            # 項目追加前から稼働しているフィードは初期化済みとして扱う
+            bootstrapped=item.get('bootstrapped', True),
+            priority=item.get('priority', 1.0),
+            update_policy=item.get('update_policy', 'ignore')
+        )
+        if self.shared:
+            source._saved_state = self._feed_source_to_dict(source)
+        return source
+    
+    @staticmethod
+    def _feed_source_to_dict(source: FeedSource) -> dict:
+        item = {
+            'url': source.url,
+            'name': source.name,
+            'enabled': source.enabled,
+            'bootstrapped': source.bootstrapped,
+            'priority': source.priority,
+            'update_policy': source.update_policy
+        }
+        if source.last_checked:
+            item['last_checked'] = source.last_checked.isoformat()
+        return item
     
+    @_timed("load", "feeds")
     def load_feed_sources(self) -> List[FeedSource]:
         """フィードソース一覧を読み込む"""
         if not self.feeds_file.exists():
             return []
         
         try:
-            with open(self.feeds_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            sources = []
-            for item in data:
-                last_checked = None
-                if item.get('last_checked'):
-                    last_checked = datetime.fromisoformat(item['last_checked'])
-                    # タイムゾーン情報がない場合はUTCとして扱う
-                    if last_checked.tzinfo is None:
-                        last_checked = last_checked.replace(tzinfo=timezone.utc)
-                
-                sources.append(FeedSource(
-                    url=item['url'],
-                    name=item['name'],
-                    enabled=item.get('enabled', True),
-                    last_checked=last_checked
-                ))
-            return sources
+            with self.lock:
+                data = self._read_json(self.feeds_file, [])
+            return [self._feed_source_from_dict(item) for item in data]
         except Exception as e:
-            print(f"フィードソース読み込みエラー: {e}")
+            logger.error(f"フィードソース読み込みエラー: {e}")
             return []
     
+    @_timed("save", "feeds")
     def save_feed_sources(self, sources: List[FeedSource]):
-        """フィードソース一覧を保存"""
+        """フィードソース一覧を保存（ワーカーモードでは変更したフィードだけをマージ）"""
         try:
-            data = []
-            for source in sources:
-                item = {
-                    'url': source.url,
-                    'name': source.name,
-                    'enabled': source.enabled
-                }
-                if source.last_checked:
-                    item['last_checked'] = source.last_checked.isoformat()
-                data.append(item)
+            if not self.shared:
+                data = [self._feed_source_to_dict(source) for source in sources]
+                with open(self.feeds_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                return
             
-            with open(self.feeds_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            with self.lock:
+                stored = self._read_json(self.feeds_file, [])
+                data = self._merge_records(stored, sources, 'url', self._feed_source_to_dict)
+                self._write_json_atomic(self.feeds_file, data)
         except Exception as e:
-            print(f"フィードソース保存エラー: {e}")
+            logger.error(f"フィードソース保存エラー: {e}")
     
+    def _article_from_dict(self, item: dict) -> FeedItem:
+        published = datetime.fromisoformat(item['published'])
+        # タイムゾーン情報がない場合はUTCとして扱う
+        if published.tzinfo is None:
+            published = published.replace(tzinfo=timezone.utc)
+        
+        read_at = None
+        if item.get('read_at'):
+            read_at = datetime.fromisoformat(item['read_at'])
+            # タイムゾーン情報がない場合はUTCとして扱う
+            if read_at.tzinfo is None:
+                read_at = read_at.replace(tzinfo=timezone.utc)
+        
+        scheduled_at = None
+        if item.get('scheduled_at'):
+            scheduled_at = datetime.fromisoformat(item['scheduled_at'])
+        
+        article = FeedItem(
+            id=item['id'],
+            title=item['title'],
+            content=item['content'],
+            url=item['url'],
+            published=published,
+            source_feed=item['source_feed'],
+            processed=item.get('processed', False),
+            summary=item.get('summary'),
+            posted_to_mastodon=item.get('posted_to_mastodon', False),
+            read_at=read_at,
+            status_id=item.get('status_id'),
+            scheduled_at=scheduled_at,
+            account_status_ids=item.get('account_status_ids', {}),
+            skip_reason=item.get('skip_reason'),
+            duplicate_of=item.get('duplicate_of'),
+            fingerprint=item.get('fingerprint'),
+            claimed_by=item.get('claimed_by')
+        )
+        if self.shared:
+            article._saved_state = self._article_to_dict(article)
+        return article
+    
+    @staticmethod
+    def _article_to_dict(article: FeedItem) -> dict:
+        item = {
+            'id': article.id,
+            'title': article.title,
+            'content': article.content,
+            'url': article.url,
+            'published': article.published.isoformat(),
+            'source_feed': article.source_feed,
+            'processed': article.processed,
+            'summary': article.summary,
+            'posted_to_mastodon': article.posted_to_mastodon
+        }
+        if article.read_at:
+            item['read_at'] = article.read_at.isoformat()
+        if article.status_id:
+            item['status_id'] = article.status_id
+        if article.scheduled_at:
+            item['scheduled_at'] = article.scheduled_at.isoformat()
+        if article.account_status_ids:
+            item['account_status_ids'] = article.account_status_ids
+        if article.skip_reason:
+            item['skip_reason'] = article.skip_reason
+        if article.duplicate_of:
+            item['duplicate_of'] = article.duplicate_of
+        if article.fingerprint:
+            item['fingerprint'] = article.fingerprint
+        if article.claimed_by:
+            item['claimed_by'] = article.claimed_by
+        return item
+    
+    @_timed("load", "articles")
     def load_articles(self) -> List[FeedItem]:
         """記事一覧を読み込む"""
         if not self.articles_file.exists():
             return []
         
         try:
-            with open(self.articles_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            articles = []
-            for item in data:
-                published = datetime.fromisoformat(item['published'])
-                # タイムゾーン情報がない場合はUTCとして扱う
-                if published.tzinfo is None:
-                    published = published.replace(tzinfo=timezone.utc)
-                
-                read_at = None
-                if item.get('read_at'):
-                    read_at = datetime.fromisoformat(item['read_at'])
-                    # タイムゾーン情報がない場合はUTCとして扱う
-                    if read_at.tzinfo is None:
-                        read_at = read_at.replace(tzinfo=timezone.utc)
-                
-                articles.append(FeedItem(
-                    id=item['id'],
-                    title=item['title'],
-                    content=item['content'],
-                    url=item['url'],
-                    published=published,
-                    source_feed=item['source_feed'],
-                    processed=item.get('processed', False),
-                    summary=item.get('summary'),
-                    posted_to_mastodon=item.get('posted_to_mastodon', False),
-                    read_at=read_at
-                ))
-            return articles
+            with self.lock:
+                data = self._read_json(self.articles_file, [])
+            return [self._article_from_dict(item) for item in data]
         except Exception as e:
-            print(f"記事読み込みエラー: {e}")
+            logger.error(f"記事読み込みエラー: {e}")
             return []
     
-    def save_articles(self, articles: List[FeedItem]):
-        """記事一覧を保存"""
+    def get_article(self, article_id: str) -> Optional[FeedItem]:
+        """保存済みの記事をファイルから読み直して取得（他のワーカーが保存した最新の状態、未保存ならNone）"""
+        try:
+            with self.lock:
+                data = self._read_json(self.articles_file, [])
+            for item in data:
+                if item['id'] == article_id:
+                    return self._article_from_dict(item)
+        except Exception as e:
+            logger.error(f"記事読み込みエラー: {e}")
+        return None
+    
+    @_timed("save", "articles")
+    def save_articles(self, articles: List[FeedItem], replace: bool = False):
+        """
+        記事一覧を保存
+        
+        ワーカーモードでは読み込み後に変更した記事だけを保存済みの一覧にマージする。
+        replace=True はロックを取得したうえで読み込み直した一覧で丸ごと置き換える場合に指定
+        """
+        if self.shared and not replace:
+            try:
+                with self.lock:
+                    stored = self._read_json(self.articles_file, [])
+                    data = self._merge_records(stored, articles, 'id', self._article_to_dict)
+                    self._write_json_atomic(self.articles_file, data)
+                logger.debug("記事データ保存完了: %d件", len(data))
+            except Exception as e:
+                logger.error(f"記事保存エラー: {e}")
+            return
+        
         try:
             data = []
             for article in articles:
-                item = {
-                    'id': article.id,
-                    'title': article.title,
-                    'content': article.content,
-                    'url': article.url,
-                    'published': article.published.isoformat(),
-                    'source_feed': article.source_feed,
-                    'processed': article.processed,
-                    'summary': article.summary,
-                    'posted_to_mastodon': article.posted_to_mastodon
-                }
-                if article.read_at:
-                    item['read_at'] = article.read_at.isoformat()
+                item = self._article_to_dict(article)
+                if self.shared:
+                    article._saved_state = item
                 data.append(item)
             
+            if self.shared:
+                with self.lock:
+                    self._write_json_atomic(self.articles_file, data)
+                logger.debug("記事データ保存完了: %d件", len(data))
+                return
+            
             # バックアップファイルを作成
             if self.articles_file.exists():
                 backup_file = self.articles_file.with_suffix('.json.bak')
-                import shutil
                 shutil.copy2(self.articles_file, backup_file)
             
             with open(self.articles_file, 'w', encoding='utf-8') as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
                 
-            print(f"記事データ保存完了: {len(data)}件")
+            logger.debug("記事データ保存完了: %d件", len(data))
         except Exception as e:
-            print(f"記事保存エラー: {e}")
+            logger.error(f"記事保存エラー: {e}")
             # バックアップから復元を試行
             backup_file = self.articles_file.with_suffix('.json.bak')
-            if backup_file.exists():
-                print("バックアップから復元を試行中...")
-                import shutil
+            if not self.shared and backup_file.exists():
+                logger.warning("バックアップから復元を試行中...")
                 shutil.copy2(backup_file, self.articles_file)
     
+    def load_meta(self) -> dict:
+        """データ形式の移行状況などのメタ情報を読み込む"""
+        if not self.meta_file.exists():
+            return {}
+        try:
+            with open(self.meta_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"メタ情報読み込みエラー: {e}")
+            return {}
+    
+    def save_meta(self, meta: dict):
+        """メタ情報を保存"""
+        try:
+            with self.lock:
+                self._write_json_atomic(self.meta_file, meta)
+        except Exception as e:
+            logger.error(f"メタ情報保存エラー: {e}")
+    
+    def _post_queue_path(self, account: Optional[str] = None, worker_id: Optional[str] = None) -> Path:
+        """
+        投稿先アカウントごとの投稿待ちキューのファイル（既定アカウントは従来のファイル）
+        
+        ワーカーモードではワーカーごとに別のファイルにする（post_queue_{アカウント}.{ワーカーID}.json）。
+        worker_id="" はワーカーモード導入前の共有ファイルを指す
+        """
+        name = "post_queue" if not account or account == "default" else f"post_queue_{account}"
+        if worker_id is None:
+            worker_id = self.worker_id
+        if worker_id:
+            return self.data_dir / f"{name}.{worker_id}.json"
+        return self.data_dir / f"{name}.json"
+    
+    def list_worker_post_queues(self, account: Optional[str] = None) -> List[str]:
+        """投稿待ちキューのファイルが残っているワーカーのIDを返す（ワーカーモード導入前のファイルは空文字）"""
+        name = "post_queue" if not account or account == "default" else f"post_queue_{account}"
+        pattern = re.compile(rf"^{re.escape(name)}\.(.+)\.json$")
+        worker_ids = [""] if (self.data_dir / f"{name}.json").exists() else []
+        for path in self.data_dir.glob(f"{name}.*.json"):
+            match = pattern.match(path.name)
+            if match:
+                worker_ids.append(match.group(1))
+        return sorted(worker_ids)
+    
+    def delete_post_queue(self, account: Optional[str] = None, worker_id: Optional[str] = None):
+        """投稿待ちキューのファイルを削除（引き継ぎ後の他ワーカーのキュー用）"""
+        try:
+            self._post_queue_path(account, worker_id).unlink()
+        except FileNotFoundError:
+            pass
+    
+    @_timed("load", "post_queue")
+    def load_post_queue(self, account: Optional[str] = None, worker_id: Optional[str] = None) -> List[PendingPost]:
+        """投稿待ちキューを読み込む"""
+        queue_file = self._post_queue_path(account, worker_id)
+        if not queue_file.exists():
+            return []
+        
+        try:
+            with open(queue_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            
+            posts = []
+            for item in data:
+                created_at = datetime.fromisoformat(item['created_at'])
+                if created_at.tzinfo is None:
+                    created_at = created_at.replace(tzinfo=timezone.utc)
+                
+                next_attempt_at = None
+                if item.get('next_attempt_at'):
+                    next_attempt_at = datetime.fromisoformat(item['next_attempt_at'])
+                    if next_attempt_at.tzinfo is None:
+                        next_attempt_at = next_attempt_at.replace(tzinfo=timezone.utc)
+                
+                posts.append(PendingPost(
+                    article_id=item['article_id'],
+                    content=item['content'],
+                    visibility=item['visibility'],
+                    created_at=created_at,
+                    attempts=item.get('attempts', 0),
+                    next_attempt_at=next_attempt_at,
+                    last_error=item.get('last_error'),
+                    reply_to=item.get('reply_to'),
+                    in_reply_to_id=item.get('in_reply_to_id'),
+                    related_article_ids=item.get('related_article_ids', []),
+                    edit_status_id=item.get('edit_status_id'),
+                    summary=item.get('summary'),
+                    fingerprint=item.get('fingerprint')
+                ))
+            return posts
+        except Exception as e:
+            logger.error(f"投稿キュー読み込みエラー: {e}")
+            return []
+    
+    @_timed("save", "post_queue")
+    def save_post_queue(self, posts: List[PendingPost], account: Optional[str] = None):
+        """投稿待ちキューを保存（一時ファイル経由で置き換え）"""
+        try:
+            data = []
+            for post in posts:
+                item = {
+                    'article_id': post.article_id,
+                    'content': post.content,
+                    'visibility': post.visibility,
+                    'created_at': post.created_at.isoformat(),
+                    'attempts': post.attempts
+                }
+                if post.next_attempt_at:
+                    item['next_attempt_at'] = post.next_attempt_at.isoformat()
+                if post.last_error:
+                    item['last_error'] = post.last_error
+                if post.reply_to:
+                    item['reply_to'] = post.reply_to
+                if post.in_reply_to_id:
+                    item['in_reply_to_id'] = post.in_reply_to_id
+                if post.related_article_ids:
+                    item['related_article_ids'] = post.related_article_ids
+                if post.edit_status_id:
+                    item['edit_status_id'] = post.edit_status_id
+                if post.summary:
+                    item['summary'] = post.summary
+                if post.fingerprint:
+                    item['fingerprint'] = post.fingerprint
+                data.append(item)
+            
+            self._write_json_atomic(self._post_queue_path(account), data)
+        except Exception as e:
+            logger.error(f"投稿キュー保存エラー: {e}")
+    
+    @_timed("cleanup", "articles")
     def cleanup_old_articles(self, days: int):
         """指定日数より古い記事を削除"""
+        with self.lock:
+            return self._cleanup_old_articles(days)
+    
+    def _cleanup_old_articles(self, days: int):
         articles = self.load_articles()
         cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
         
@@ -175,13 +462,18 @@ class DataStorage:
         
         removed_count = len(articles) - len(filtered_articles)
         if removed_count > 0:
-            self.save_articles(filtered_articles)
-            print(f"{removed_count}件の古い記事を削除しました")
+            self.save_articles(filtered_articles, replace=True)
+            logger.info(f"{removed_count}件の古い記事を削除しました")
         
         return removed_count
     
+    @_timed("cleanup", "read_records")
     def cleanup_old_read_records(self, days: int):
         """指定日数より古い読み取り記録のみを削除（未処理記事は保持）"""
+        with self.lock:
+            return self._cleanup_old_read_records(days)
+    
+    def _cleanup_old_read_records(self, days: int):
         articles = self.load_articles()
         cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
         
@@ -210,7 +502,7 @@ class DataStorage:
         
         removed_count = len(articles) - len(filtered_articles)
         if removed_count > 0:
-            self.save_articles(filtered_articles)
-            print(f"{removed_count}件の古い読み取り記録を削除しました")
+            self.save_articles(filtered_articles, replace=True)
+            logger.info(f"{removed_count}件の古い読み取り記録を削除しました")
         
         return removed_count
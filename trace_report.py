@@ -0,0 +1,223 @@
+"""
+トレースログ（TRACE_FILE）から処理ごとの所要時間の内訳とクリティカルパスを表示するツール
+
+使い方:
+    python trace_report.py [トレースファイル] [--last N] [--trace TRACE_ID] [--depth N]
+"""
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+# 終了時刻の比較で許容する誤差（秒）。開始時刻は壁時計、所要時間は単調時計のため
+EPSILON = 0.002
+
+
+class TraceSpan:
+    """トレースログの1行分のスパン"""
+
+    def __init__(self, data: dict):
+        self.trace_id = data["trace_id"]
+        self.span_id = data["span_id"]
+        self.parent_id = data.get("parent_id")
+        self.name = data["name"]
+        self.start = data["start_ts"]
+        self.duration = data["duration_ms"] / 1000
+        self.status = data.get("status", "ok")
+        self.attributes = data.get("attributes") or {}
+        self.children: List['TraceSpan'] = []
+
+    @property
+    def end(self) -> float:
+        return self.start + self.duration
+
+    @property
+    def self_time(self) -> float:
+        """子スパンを除いた自身の時間（並行する子は重複を除いて差し引く）"""
+        covered = 0.0
+        cursor = self.start
+        for child in sorted(self.children, key=lambda c: c.start):
+            start = max(child.start, cursor)
+            end = min(child.end, self.end)
+            if end > start:
+                covered += end - start
+                cursor = end
+        return max(self.duration - covered, 0.0)
+
+    def label(self) -> str:
+        for key in ("feed", "provider", "account", "target"):
+            if self.attributes.get(key):
+                return f"{self.name} [{self.attributes[key]}]"
+        return self.name
+
+
+def load_spans(path: str) -> List[TraceSpan]:
+    """トレースファイルを読み込む（壊れた行は読み飛ばす）"""
+    spans = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                spans.append(TraceSpan(json.loads(line)))
+            except (ValueError, KeyError) as e:
+                print(f"警告: {line_number}行目を読み飛ばしました ({e})", file=sys.stderr)
+    return spans
+
+
+def build_traces(spans: List[TraceSpan]) -> Dict[str, TraceSpan]:
+    """スパンを親子関係でつなぎ、ルートが cycle のトレースを trace_id ごとに返す（開始順）"""
+    by_id = {span.span_id: span for span in spans}
+    roots = {}
+    for span in spans:
+        parent = by_id.get(span.parent_id) if span.parent_id else None
+        if parent:
+            parent.children.append(span)
+        elif span.parent_id is None and span.name == "cycle":
+            roots[span.trace_id] = span
+    return dict(sorted(roots.items(), key=lambda item: item[1].start))
+
+
+def walk(span: TraceSpan):
+    yield span
+    for child in span.children:
+        yield from walk(child)
+
+
+def critical_path(span: TraceSpan) -> List[TraceSpan]:
+    """
+    終了時刻から逆にたどり、親の終了を直接遅らせた子スパンの列を返す（時刻順）
+
+    直列の処理ではすべての子が、並行する処理（長文のチャンク要約や複数アカウントへの投稿）では
+    最も遅く終わったものが選ばれる
+    """
+    path = []
+    cursor = span.end
+    for child in sorted(span.children, key=lambda c: c.end, reverse=True):
+        if child.end <= cursor + EPSILON:
+            path.append(child)
+            cursor = child.start
+    path.reverse()
+    return path
+
+
+def percentile(values: List[float], ratio: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(ratio * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def print_stage_breakdown(roots: List[TraceSpan]):
+    """処理名ごとの件数・所要時間と、サイクル全体に占める自身の時間の割合"""
+    durations = defaultdict(list)
+    self_times = defaultdict(float)
+    errors = defaultdict(int)
+    for root in roots:
+        for span in walk(root):
+            durations[span.name].append(span.duration)
+            self_times[span.name] += span.self_time
+            if span.status != "ok":
+                errors[span.name] += 1
+    cycle_total = sum(root.duration for root in roots) or 1.0
+
+    print("\n■ 処理ごとの内訳（自身 = 子の処理を除いた時間、割合はサイクル合計に対する自身の時間）")
+    print(f"{'処理名':<20}{'件数':>7}{'エラー':>7}{'合計(s)':>10}{'平均(ms)':>10}{'p95(ms)':>10}{'最大(ms)':>10}{'自身(s)':>10}{'割合':>8}")
+    for name in sorted(durations, key=lambda n: self_times[n], reverse=True):
+        values = durations[name]
+        print(
+            f"{name:<20}{len(values):>7}{errors[name]:>7}{sum(values):>10.2f}"
+            f"{sum(values) / len(values) * 1000:>10.1f}{percentile(values, 0.95) * 1000:>10.1f}"
+            f"{max(values) * 1000:>10.1f}{self_times[name]:>10.2f}{self_times[name] / cycle_total:>8.1%}"
+        )
+
+
+def print_slowest(roots: List[TraceSpan], name: str, attribute: str, title: str, limit: int = 5):
+    """指定した処理を属性ごとに集計し、平均所要時間の長い順に表示"""
+    groups = defaultdict(list)
+    for root in roots:
+        for span in walk(root):
+            if span.name == name and span.attributes.get(attribute) is not None:
+                groups[str(span.attributes[attribute])].append(span.duration)
+    if not groups:
+        return
+    print(f"\n■ {title}")
+    ranked = sorted(groups.items(), key=lambda item: sum(item[1]) / len(item[1]), reverse=True)
+    for key, values in ranked[:limit]:
+        print(f"  {key:<30} 平均 {sum(values) / len(values) * 1000:>9.1f}ms  最大 {max(values) * 1000:>9.1f}ms  ({len(values)}回)")
+
+
+def print_critical_path(span: TraceSpan, total: float, depth: int, indent: int = 0):
+    """クリティカルパスを処理名ごとにまとめて表示し、各グループの最長スパンを掘り下げる"""
+    path = critical_path(span)
+    own = max(span.duration - sum(child.duration for child in path), 0.0)
+    prefix = "  " * (indent + 1)
+
+    groups: Dict[str, List[TraceSpan]] = {}
+    for child in path:
+        groups.setdefault(child.name, []).append(child)
+
+    for name, members in sorted(groups.items(), key=lambda item: sum(s.duration for s in item[1]), reverse=True):
+        group_total = sum(member.duration for member in members)
+        longest = max(members, key=lambda member: member.duration)
+        count = f" ×{len(members)}" if len(members) > 1 else ""
+        print(f"{prefix}{name + count:<{40 - len(prefix)}}{group_total:>9.2f}s {group_total / total:>7.1%}"
+              f"   最長: {longest.label()} {longest.duration:.2f}s")
+        if depth > 1 and longest.children:
+            print_critical_path(longest, total, depth - 1, indent + 1)
+    if path and own > EPSILON:
+        print(f"{prefix}{'(自身・待機)':<{40 - len(prefix)}}{own:>9.2f}s {own / total:>7.1%}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="トレースログから処理時間の内訳とクリティカルパスを表示")
+    parser.add_argument("path", nargs="?", default=os.getenv("TRACE_FILE") or "logs/trace.jsonl",
+                        help="トレースファイル（既定: 環境変数 TRACE_FILE または logs/trace.jsonl）")
+    parser.add_argument("--last", type=int, default=None, help="直近N回のサイクルだけを集計")
+    parser.add_argument("--trace", default=None, help="クリティカルパスを表示するトレースID（既定: 最も時間のかかったサイクル）")
+    parser.add_argument("--depth", type=int, default=3, help="クリティカルパスを掘り下げる階層数")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        print(f"トレースファイルが見つかりません: {args.path}")
+        return 1
+
+    traces = build_traces(load_spans(args.path))
+    roots = list(traces.values())
+    if args.last:
+        roots = roots[-args.last:]
+    if not roots:
+        print("集計できるサイクルがありません（TRACE_FILE を設定してフィードチェックを実行してください）")
+        return 1
+
+    cycle_durations = [root.duration for root in roots]
+    print(f"=== トレース集計: {len(roots)}サイクル ({args.path}) ===")
+    print(f"サイクル所要時間: 平均 {sum(cycle_durations) / len(cycle_durations):.2f}s / "
+          f"p50 {percentile(cycle_durations, 0.5):.2f}s / p95 {percentile(cycle_durations, 0.95):.2f}s / "
+          f"最大 {max(cycle_durations):.2f}s")
+
+    print_stage_breakdown(roots)
+    print_slowest(roots, "feed.fetch", "feed", "取得に時間のかかるフィード")
+    print_slowest(roots, "ai.attempt", "provider", "AIサービスごとの呼び出し時間")
+    print_slowest(roots, "post.toot", "account", "アカウントごとの投稿時間")
+
+    if args.trace:
+        target = traces.get(args.trace)
+        if not target:
+            print(f"\nトレースIDが見つかりません: {args.trace}")
+            return 1
+    else:
+        target = max(roots, key=lambda root: root.duration)
+    print(f"\n■ クリティカルパス (トレースID: {target.trace_id}, "
+          f"所要時間 {target.duration:.2f}s, 新着 {target.attributes.get('new_articles', '-')}件)")
+    print(f"  {'cycle':<38}{target.duration:>9.2f}s {1:>7.1%}")
+    print_critical_path(target, target.duration or 1.0, args.depth, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
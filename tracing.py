@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """トレースの1区間（処理名・開始時刻・所要時間・属性）"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_error(self, error: Any):
+        """呼び出し側で処理した失敗をスパンに記録"""
+        self.status = "error"
+        self.error = str(error)
+
+    def end(self):
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+
+    def to_dict(self) -> dict:
+        data = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": datetime.fromtimestamp(self.start, timezone.utc).isoformat(),
+            "start_ts": round(self.start, 6),
+            "duration_ms": round(self.duration_ms or 0.0, 3),
+            "status": self.status,
+            "pid": os.getpid(),
+            "thread": threading.current_thread().name,
+            "attributes": self.attributes,
+        }
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class _NoopSpan:
+    """トレース無効時に返すスパン（属性の設定は何もしない）"""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def record_error(self, error: Any):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    スパンをJSON Lines形式でファイルに書き出すトレーサー
+
+    スパンは終了時に1行ずつ追記する（子スパンが親より先に出力される）。
+    親子関係は contextvars で引き継ぐため、スレッドプールで実行する処理には propagate() で親を渡す
+    """
+
+    def __init__(self):
+        self.path: Optional[Path] = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._file is not None
+
+    def configure(self, path: Optional[str]):
+        """出力先を設定（Noneまたは空文字で無効化）"""
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+            self.path = Path(path) if path else None
+            if self.path:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8', buffering=1)
+
+    def close(self):
+        self.configure(None)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """with文のブロックをスパンとして記録（例外はステータスに記録して再送出）"""
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+
+        parent = _current_span.get()
+        span = Span(name, parent.trace_id if parent else uuid.uuid4().hex, parent.span_id if parent else None, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+            self._emit(span)
+
+    def _emit(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            if not self._file:
+                return
+            try:
+                self._file.write(line + "\n")
+            except Exception as e:
+                logger.warning(f"トレース書き込みエラー: {e}")
+
+
+TRACER = Tracer()
+
+
+def span(name: str, **attributes):
+    """既定のトレーサーでスパンを開始"""
+    return TRACER.span(name, **attributes)
+
+
+def current_span():
+    """実行中のスパン（ない場合は何もしないスパン）"""
+    return _current_span.get() or _NOOP_SPAN
+
+
+def propagate(func):
+    """呼び出し時点のスパンを親として、別スレッドで func を実行できるようにする"""
+    parent = _current_span.get()
+
+    def wrapper(*args, **kwargs):
+        token = _current_span.set(parent)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_span.reset(token)
+    return wrapper
@@ -0,0 +1,111 @@
+import fnmatch
+import hashlib
+import json
+import re
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# 正規化処理を変更したら上げる（保存済み記事IDの移行判定に使用）
+CANONICALIZATION_VERSION = 1
+
+# 記事の同一性に影響しないトラッキング用クエリパラメータ
+DEFAULT_STRIP_PARAMS = [
+    "utm_*", "fbclid", "gclid", "dclid", "yclid", "msclkid", "igshid",
+    "mc_cid", "mc_eid", "_hsenc", "_hsmi", "ref_src", "ref_url",
+    "amp", "outputType"
+]
+
+DEFAULT_RULE = {
+    "force_https": True,           # http を https に統一
+    "strip_www": False,            # 先頭の www. を除去
+    "strip_trailing_slash": True,  # パス末尾の / を除去
+    "strip_fragment": True,        # #以降を除去
+    "strip_amp": True,             # AMP版のURL（/amp, .amp, AMPキャッシュ）を通常版に戻す
+    "strip_params": DEFAULT_STRIP_PARAMS,
+    "extra_strip_params": [],      # strip_params に追加で除去するパラメータ
+    "keep_params": None            # 指定時はこのパラメータ以外をすべて除去
+}
+
+_AMP_CACHE_HOST = re.compile(r"\.cdn\.ampproject\.org$", re.IGNORECASE)
+_AMP_PATH_SUFFIX = re.compile(r"(/amp/?|\.amp)$", re.IGNORECASE)
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+class UrlCanonicalizer:
+    """記事URLを正規化し、URLの表記ゆれによらない記事IDを生成するクラス"""
+
+    def __init__(self, default_rule: Optional[dict] = None, feed_rules: Optional[Dict[str, dict]] = None):
+        """
+        Args:
+            default_rule: 全フィード共通のルール（DEFAULT_RULE を上書き）
+            feed_rules: フィード名ごとのルール（共通ルールを上書き）
+        """
+        self.default_rule = {**DEFAULT_RULE, **(default_rule or {})}
+        self.feed_rules = {
+            feed: {**self.default_rule, **rule}
+            for feed, rule in (feed_rules or {}).items()
+        }
+
+    @property
+    def signature(self) -> str:
+        """正規化処理とルールの組み合わせを表す値（変化したら記事IDの移行が必要）"""
+        source = json.dumps(
+            {"version": CANONICALIZATION_VERSION, "default": self.default_rule, "feeds": self.feed_rules},
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+    def canonicalize(self, url: str, feed: Optional[str] = None) -> str:
+        """URLを正規化（解析できないURLはそのまま返す）"""
+        rule = self.feed_rules.get(feed, self.default_rule)
+        try:
+            parts = urlsplit(url.strip())
+        except ValueError:
+            return url
+        if not parts.scheme or not parts.netloc:
+            return url
+
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or "").lower()
+        path = parts.path or "/"
+
+        # AMPキャッシュ（https://example-com.cdn.ampproject.org/c/s/example.com/path）を元のURLに戻す
+        if rule["strip_amp"] and _AMP_CACHE_HOST.search(host):
+            match = re.match(r"^/[a-z]/(s/)?([^/]+)(/.*)?$", path)
+            if match:
+                scheme = "https" if match.group(1) else "http"
+                host = match.group(2).lower()
+                path = match.group(3) or "/"
+
+        if rule["force_https"] and scheme == "http":
+            scheme = "https"
+        if rule["strip_www"] and host.startswith("www."):
+            host = host[4:]
+
+        # 既定ポート（変換前後どちらのスキームのものでも）は省略
+        port = parts.port
+        default_ports = (_DEFAULT_PORTS.get(parts.scheme.lower()), _DEFAULT_PORTS.get(scheme))
+        netloc = host if port is None or port in default_ports else f"{host}:{port}"
+
+        if rule["strip_amp"]:
+            path = _AMP_PATH_SUFFIX.sub("", path) or "/"
+        if rule["strip_trailing_slash"] and len(path) > 1:
+            path = path.rstrip("/") or "/"
+
+        query = urlencode(sorted(
+            (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if self._keep_param(key, rule)
+        ))
+        fragment = "" if rule["strip_fragment"] else parts.fragment
+        return urlunsplit((scheme, netloc, path, query, fragment))
+
+    def article_id(self, url: str, feed: Optional[str] = None) -> str:
+        """正規化したURLから記事IDを生成"""
+        return hashlib.md5(self.canonicalize(url, feed).encode()).hexdigest()
+
+    @staticmethod
+    def _keep_param(key: str, rule: dict) -> bool:
+        if rule["keep_params"] is not None:
+            return key in rule["keep_params"]
+        patterns = list(rule["strip_params"]) + list(rule["extra_strip_params"])
+        return not any(fnmatch.fnmatchcase(key, pattern) for pattern in patterns)
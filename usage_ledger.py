@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, date, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UsageRecord:
+    """AI呼び出し1回分の使用記録"""
+    timestamp: datetime
+    provider: str
+    model: Optional[str]
+    feed: Optional[str]
+    input_tokens: int
+    output_tokens: int
+    latency_ms: int
+    outcome: str  # ok / error
+    cost: float
+
+    def to_compact(self) -> dict:
+        """JSON Lines用の短いキーに変換"""
+        return {
+            "t": self.timestamp.isoformat(timespec="seconds"),
+            "p": self.provider,
+            "m": self.model,
+            "f": self.feed,
+            "i": self.input_tokens,
+            "o": self.output_tokens,
+            "l": self.latency_ms,
+            "s": self.outcome,
+            "c": round(self.cost, 6)
+        }
+
+    @classmethod
+    def from_compact(cls, data: dict) -> 'UsageRecord':
+        """短いキーの辞書から復元"""
+        timestamp = datetime.fromisoformat(data["t"])
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return cls(
+            timestamp=timestamp,
+            provider=data["p"],
+            model=data.get("m"),
+            feed=data.get("f"),
+            input_tokens=data.get("i", 0),
+            output_tokens=data.get("o", 0),
+            latency_ms=data.get("l", 0),
+            outcome=data.get("s", "ok"),
+            cost=data.get("c", 0.0)
+        )
+
+    @property
+    def local_date(self) -> date:
+        """集計用のローカル日付（予算はローカル時間の日単位で管理）"""
+        return self.timestamp.astimezone().date()
+
+
+def _empty_totals() -> dict:
+    return {"calls": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0, "latency_ms": 0, "cost": 0.0}
+
+
+class UsageLedger:
+    """
+    AI呼び出しの使用量とコストをJSON Linesで記録し、日別・フィード別に集計するクラス
+
+    file_lock を指定すると台帳を複数のプロセスで共有する（追記と圧縮をロックの下で行い、
+    集計を参照するたびに他のプロセスが追記した分を読み込む）
+    """
+
+    def __init__(self, ledger_file: str = "data/usage_ledger.jsonl", retention_days: int = 30, file_lock=None):
+        self.ledger_file = Path(ledger_file)
+        self.retention_days = retention_days
+        self.shared = file_lock is not None
+        self._lock = threading.RLock()
+        self._file_lock = file_lock if file_lock is not None else self._lock
+        # (日付, 集計軸, キー) -> 合計値
+        self._totals: Dict[tuple, dict] = defaultdict(_empty_totals)
+        # 集計に反映済みの位置（ファイルが置き換えられた場合は inode の変化で検出して読み直す）
+        self._offset = 0
+        self._inode: Optional[int] = None
+        with self._lock, self._file_lock:
+            self._load()
+
+    def record(self, record: UsageRecord):
+        """使用記録を追記し、集計に反映"""
+        with self._lock:
+            try:
+                self.ledger_file.parent.mkdir(parents=True, exist_ok=True)
+                with self._file_lock:
+                    # 他のプロセスの追記を先に取り込み、自分の追記の後ろを読み込み位置にする
+                    self._read_appended()
+                    with open(self.ledger_file, 'ab') as f:
+                        f.write((json.dumps(record.to_compact(), ensure_ascii=False) + "\n").encode("utf-8"))
+                        self._offset = f.tell()
+                    self._inode = self.ledger_file.stat().st_ino
+            except Exception as e:
+                logger.warning(f"使用量台帳の書き込みエラー: {e}")
+            self._add_to_totals(record)
+
+    def get_totals(self, day: Optional[date] = None, by: str = "all", key: Optional[str] = None) -> dict:
+        """指定日の合計を取得（by: all / provider / feed）"""
+        day = day or datetime.now().astimezone().date()
+        with self._lock:
+            self._refresh()
+            return dict(self._totals.get((day, by, key), _empty_totals()))
+
+    def get_breakdown(self, by: str, day: Optional[date] = None) -> Dict[Optional[str], dict]:
+        """指定日の集計軸別の内訳を取得"""
+        day = day or datetime.now().astimezone().date()
+        with self._lock:
+            self._refresh()
+            return {
+                key: dict(totals)
+                for (total_day, total_by, key), totals in self._totals.items()
+                if total_day == day and total_by == by
+            }
+
+    def cost_today(self, provider: Optional[str] = None) -> float:
+        """本日の推定コスト（provider指定時はそのサービス分のみ）"""
+        if provider:
+            return self.get_totals(by="provider", key=provider)["cost"]
+        return self.get_totals()["cost"]
+
+    def _add_to_totals(self, record: UsageRecord):
+        day = record.local_date
+        for axis, key in (("all", None), ("provider", record.provider), ("feed", record.feed)):
+            totals = self._totals[(day, axis, key)]
+            totals["calls"] += 1
+            totals["errors"] += 0 if record.outcome == "ok" else 1
+            totals["input_tokens"] += record.input_tokens
+            totals["output_tokens"] += record.output_tokens
+            totals["latency_ms"] += record.latency_ms
+            totals["cost"] += record.cost
+
+    def _refresh(self):
+        """共有時は他のプロセスが追記した記録を集計に取り込む"""
+        if not self.shared:
+            return
+        try:
+            with self._file_lock:
+                self._read_appended()
+        except Exception as e:
+            logger.warning(f"使用量台帳の読み込みエラー: {e}")
+
+    def _read_appended(self):
+        """前回の読み込み位置以降の記録を集計に反映（ファイルが置き換えられていれば集計を作り直す）"""
+        try:
+            stat = self.ledger_file.stat()
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._totals.clear()
+            self._offset = 0
+            self._inode = stat.st_ino
+        if stat.st_size == self._offset:
+            return
+
+        with open(self.ledger_file, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        # 書き込み途中の最終行は次回に読む
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        for line in data[:end].decode("utf-8", errors="replace").splitlines():
+            try:
+                self._add_to_totals(UsageRecord.from_compact(json.loads(line)))
+            except (ValueError, KeyError, TypeError):
+                continue
+
+    def _load(self):
+        """台帳を読み込んで集計を再構築（保持期間外の記録があれば一時ファイル経由でファイルを詰める）"""
+        if not self.ledger_file.exists():
+            return
+
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+        kept: List[UsageRecord] = []
+        dropped = 0
+        try:
+            with open(self.ledger_file, 'rb') as f:
+                data = f.read()
+            self._inode = self.ledger_file.stat().st_ino
+            self._offset = data.rfind(b"\n") + 1
+            for line in data[:self._offset].decode("utf-8", errors="replace").splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    record = UsageRecord.from_compact(json.loads(line))
+                except (ValueError, KeyError, TypeError):
+                    dropped += 1
+                    continue
+                if record.timestamp < cutoff:
+                    dropped += 1
+                    continue
+                kept.append(record)
+        except Exception as e:
+            logger.warning(f"使用量台帳の読み込みエラー: {e}")
+            return
+
+        for record in kept:
+            self._add_to_totals(record)
+
+        if dropped:
+            temp_file = self.ledger_file.with_name(self.ledger_file.name + ".tmp")
+            try:
+                with open(temp_file, 'wb') as f:
+                    for record in kept:
+                        f.write((json.dumps(record.to_compact(), ensure_ascii=False) + "\n").encode("utf-8"))
+                    size = f.tell()
+                os.replace(temp_file, self.ledger_file)
+                self._offset = size
+                self._inode = self.ledger_file.stat().st_ino
+                logger.info(f"使用量台帳から{dropped}件の古い記録を削除しました")
+            except Exception as e:
+                logger.warning(f"使用量台帳の圧縮エラー: {e}")